@@ -1,20 +1,42 @@
 # app/api/pipelines.py
+import asyncio
+import json
 from typing import List
-from fastapi import APIRouter, BackgroundTasks, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, BackgroundTasks, WebSocket, WebSocketDisconnect, HTTPException, Query, Request
 
 from app.pipelines.models import PipelineInput
-from app.pipelines.lifecycle import manage_pipeline_lifecycle
+from app.pipelines.lifecycle import (
+    list_pipeline_containers,
+    manage_pipeline_lifecycle,
+    stop_and_remove_container,
+)
+from app.pipelines.chaining import plan_chains
+from app.pipelines.metrics import scrape_pipeline_metrics, start_pipeline_profiling
+from app.pipelines.planner import plan_pipeline
+from app.pipelines.reference import delete_table, list_tables, register_table
 from app.pipelines.registry import (
     init_pipeline,
     segment_completed,
     fail_pipeline,
     get_pipeline,
     abort_pipeline,
+    get_archived_runs,
+    get_errors,
+    get_latency,
+    get_profiles,
+    record_costs,
+    record_errors,
+    record_latency,
+    record_profile,
+    record_segment_summary,
+    record_throughput,
 )
+from app.sharding import SHARDED, forward, forward_sync, should_forward
+from app.ws.codec import JSON_ENCODING, SUPPORTED_ENCODINGS
 from app.ws.manager import ConnectionManager
+from app.ws.relay import start_peer_relays
 from shared.events import Event
 from shared.logger import get_logger
-import docker
 
 router = APIRouter()
 manager = ConnectionManager()
@@ -24,42 +46,138 @@ logger = get_logger("API")
 def start_pipeline(
     pipelines: List[PipelineInput],
     background_tasks: BackgroundTasks,
+    request: Request,
+    chaining: bool = False,
+    planned: bool = False,
 ):
     pipeline_id = pipelines[0].pipeline_id
 
+    # In sharded mode the owning shard spawns and monitors the containers
+    if should_forward(request, pipeline_id):
+        return forward_sync(
+            pipeline_id,
+            "POST",
+            f"/start?chaining={str(chaining).lower()}&planned={str(planned).lower()}",
+            json=[p.model_dump() for p in pipelines],
+        )
+
     init_pipeline(
         pipeline_id=pipeline_id,
         total_segments=len(pipelines),
     )
 
-    for segment_idx, pipeline in enumerate(pipelines):
-        background_tasks.add_task(manage_pipeline_lifecycle, pipeline, segment_idx)
+    # The planner decides fusion and replication from measured costs; plain
+    # chaining fuses whatever can be fused; otherwise every segment gets a worker
+    plan = plan_pipeline(pipelines) if planned else None
+    if plan:
+        chains = [worker["segments"] for worker in plan["workers"]]
+        replicas = [worker["replicas"] for worker in plan["workers"]]
+    else:
+        chains = plan_chains(pipelines) if chaining else [[idx] for idx in range(len(pipelines))]
+        replicas = [1] * len(chains)
 
-    return {
+    for (head, *rest), n_replicas in zip(chains, replicas):
+        # A chain runs as long as its longest-running segment
+        runtime = max(pipelines[idx].runtime for idx in (head, *rest))
+        background_tasks.add_task(
+            manage_pipeline_lifecycle,
+            pipelines[head].model_copy(update={"runtime": runtime}),
+            head,
+            [(idx, pipelines[idx]) for idx in rest],
+            n_replicas,
+        )
+
+    response = {
         "status": "accepted",
         "pipeline_id": pipeline_id,
         "segments": len(pipelines),
+        "workers": chains,
     }
+    if plan:
+        response["plan"] = plan
+    return response
+
+
+@router.post("/plan")
+def plan_pipeline_execution(pipelines: List[PipelineInput], request: Request):
+    """
+    Execution plan /start?planned=true would use, with the rationale of every decision
+    """
+    pipeline_id = pipelines[0].pipeline_id
+    # Measured costs live on the shard that owns the pipeline
+    if should_forward(request, pipeline_id):
+        return forward_sync(pipeline_id, "POST", "/plan", json=[p.model_dump() for p in pipelines])
+    return plan_pipeline(pipelines)
 
 # -----------------------------
 # WebSocket stream (UI listens)
 # -----------------------------
 @router.websocket("/ws/stream")
-async def pipeline_ws(websocket: WebSocket):
-    await manager.connect(websocket)
+async def pipeline_ws(
+    websocket: WebSocket,
+    encoding: str = Query(JSON_ENCODING),
+    pipeline_id: str | None = Query(None),
+    scope: str = Query("all"),
+):
+    # Clients opt into compact MessagePack frames with ?encoding=binary
+    # and can restrict the stream to one pipeline with ?pipeline_id=<id>, or later
+    # by sending {"subscribe": "<id>"}. Only subscribed clients make workers emit rows.
+    # scope=local (used by peer shards) skips relaying events of other shards.
+    if encoding not in SUPPORTED_ENCODINGS:
+        await websocket.close(code=1003, reason=f"Unsupported encoding '{encoding}'")
+        return
+
+    await manager.connect(websocket, encoding=encoding, pipeline_id=pipeline_id)
+
+    relays = start_peer_relays(manager, websocket, pipeline_id) if SHARDED and scope != "local" else []
 
     try:
         while True:
-            await websocket.receive_text()
+            try:
+                request = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(request, dict) or "subscribe" not in request:
+                continue
+            pipeline_id = request["subscribe"] or None
+            manager.subscribe(websocket, pipeline_id)
+            if SHARDED and scope != "local":
+                for relay in relays:
+                    relay.cancel()
+                relays = start_peer_relays(manager, websocket, pipeline_id)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+    finally:
+        for relay in relays:
+            relay.cancel()
+
+
+# -----------------------------
+# Worker observation polling
+# -----------------------------
+@router.get("/stream/observed/{pipeline_id}")
+async def pipeline_observed(pipeline_id: str, request: Request):
+    # Polled by workers so they only emit stream events while a client is watching
+    if should_forward(request, pipeline_id):
+        return await forward(pipeline_id, "GET", f"/stream/observed/{pipeline_id}")
+    return {"observed": manager.is_observed(pipeline_id)}
 
 
 # -----------------------------
 # Worker event ingestion
 # -----------------------------
 @router.post("/stream/event")
-async def ingest_event(event: Event):
+async def ingest_event(event: Event, request: Request):
+    if event.pipeline_id and should_forward(request, event.pipeline_id):
+        return await forward(event.pipeline_id, "POST", "/stream/event", json=event.model_dump())
+    return await process_event(event)
+
+
+async def process_event(event: Event):
+    """
+    Applies a worker event to the registry and fans it out to WebSocket clients.
+    Shared by the HTTP endpoint and the Kafka event bus consumer.
+    """
     pipeline_id = event.pipeline_id
     if not pipeline_id:
         return {"ignored": True}
@@ -77,7 +195,7 @@ async def ingest_event(event: Event):
         
         completed_now = False
         if event_type == "segment_completed":
-            completed_now = segment_completed(pipeline_id)
+            completed_now = segment_completed(pipeline_id, event.segment_index)
 
         elif event_type == "failed":
             fail_pipeline(pipeline_id, data)
@@ -97,44 +215,155 @@ async def ingest_event(event: Event):
                 "data": None,
             })
     
+    elif event_category == "metrics":
+        if event_type == "latency" and isinstance(data, dict):
+            record_latency(pipeline_id, event.segment_index, data)
+        elif event_type == "errors" and isinstance(data, dict):
+            record_errors(pipeline_id, event.segment_index, data)
+            await manager.broadcast(event.model_dump())
+        elif event_type == "costs" and isinstance(data, dict):
+            record_costs(pipeline_id, data)
+        elif event_type == "throughput" and isinstance(data, dict):
+            record_throughput(pipeline_id, event.segment_index, data)
+        elif event_type == "segment_summary" and isinstance(data, dict):
+            record_segment_summary(pipeline_id, event.segment_index, data)
+            await manager.broadcast(event.model_dump())
+        elif event_type == "profile" and isinstance(data, dict):
+            record_profile(pipeline_id, event.segment_index, data)
+            await manager.broadcast(event.model_dump())
+
     elif event_category == "stream":
-        await manager.broadcast(event.model_dump())
+        if manager.is_observed(pipeline_id):
+            await manager.broadcast(event.model_dump())
     
     else:
         pass  # Unknown category — ignore
 
     return {"ok": True}
 
-@router.post("/abort/{pipeline_id}")
-async def abort_pipeline_api(pipeline_id: str):
+# -----------------------------
+# Latency tracing
+# -----------------------------
+@router.get("/pipelines/{pipeline_id}/latency")
+async def pipeline_latency(pipeline_id: str, request: Request):
+    # p50/p95/p99 (ms) per segment and stage, plus end-to-end for the whole pipeline
+    if should_forward(request, pipeline_id):
+        return await forward(pipeline_id, "GET", f"/pipelines/{pipeline_id}/latency")
+
+    latency = get_latency(pipeline_id)
+    if latency is None:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return latency
+
+
+# -----------------------------
+# Transformation errors
+# -----------------------------
+@router.get("/pipelines/{pipeline_id}/errors")
+async def pipeline_errors(pipeline_id: str, request: Request):
+    # Error counters per segment, as sampled by the workers under their error policy
+    if should_forward(request, pipeline_id):
+        return await forward(pipeline_id, "GET", f"/pipelines/{pipeline_id}/errors")
+
+    errors = get_errors(pipeline_id)
+    if errors is None:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return errors
+
+
+# -----------------------------
+# Container metrics
+# -----------------------------
+@router.get("/pipelines/{pipeline_id}/metrics")
+async def pipeline_metrics(pipeline_id: str, request: Request):
+    # Rows in/out, per-transformation timings, serialization time, produce errors and rates per container
+    if should_forward(request, pipeline_id):
+        return await forward(pipeline_id, "GET", f"/pipelines/{pipeline_id}/metrics")
+
+    if get_pipeline(pipeline_id) is None:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return {"pipeline_id": pipeline_id, "containers": await scrape_pipeline_metrics(pipeline_id)}
+
+
+# -----------------------------
+# On-demand profiling
+# -----------------------------
+@router.post("/pipelines/{pipeline_id}/profile")
+async def profile_pipeline(pipeline_id: str, request: Request, seconds: float = Query(10, gt=0, le=300)):
+    # Reports arrive as metrics/profile events once the workers are done
+    if should_forward(request, pipeline_id):
+        return await forward(pipeline_id, "POST", f"/pipelines/{pipeline_id}/profile?seconds={seconds}")
+
     state = get_pipeline(pipeline_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    if state["status"] != "running":
+        raise HTTPException(status_code=409, detail="Pipeline is not running")
+    return {"pipeline_id": pipeline_id, "seconds": seconds, "workers": await start_pipeline_profiling(pipeline_id, seconds)}
 
-    if not state:
+
+@router.get("/pipelines/{pipeline_id}/profile")
+async def pipeline_profiles(pipeline_id: str, request: Request):
+    # Latest profiling report per segment
+    if should_forward(request, pipeline_id):
+        return await forward(pipeline_id, "GET", f"/pipelines/{pipeline_id}/profile")
+
+    profiles = get_profiles(pipeline_id)
+    if profiles is None:
         raise HTTPException(status_code=404, detail="Pipeline not found")
+    return profiles
 
-    if state["status"] in ("completed", "failed", "aborted"):
-        return {"status": "ignored", "reason": "pipeline already finished"}
 
-    # register abort
-    changed = abort_pipeline(pipeline_id)
-    if not changed:
-        return {"status": "ignored", "reason": "cannot abort"}
+# -----------------------------
+# Archived run history
+# -----------------------------
+@router.get("/runs")
+def list_archived_runs(pipeline_id: str | None = None, limit: int = Query(100, ge=1, le=1000)):
+    return get_archived_runs(pipeline_id=pipeline_id, limit=limit)
 
-    client = docker.from_env()
 
-    # kill containers (if any) for this pipeline
-    containers = client.containers.list(
-        all=True,
-        filters={"label": f"pipeline_id={pipeline_id}"}
-    )
+# -----------------------------
+# Reference tables
+# -----------------------------
+@router.post("/reference-tables/{name}")
+async def upload_reference_table(name: str, request: Request, key: str, format: str = "csv"):
+    # The raw CSV/Parquet file is the request body; converted once, shared by all workers on the host
+    data = await request.body()
+    try:
+        return await asyncio.to_thread(register_table, name, data, format, key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/reference-tables")
+def list_reference_tables():
+    return list_tables()
+
 
-    for c in containers:
-        try:
-            logger.info(f"[{pipeline_id}] Aborting container {c.name}")
-            c.stop()
-            c.remove()
-        except Exception as e:
-            logger.warning(f"Error aborting container {c.name}: {e}")
+@router.delete("/reference-tables/{name}")
+def delete_reference_table(name: str):
+    try:
+        deleted = delete_table(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Reference table not found")
+    return {"status": "deleted", "name": name}
+
+async def teardown_aborted_pipeline(pipeline_id: str):
+    """
+    Stops all containers of an aborted pipeline concurrently in worker threads,
+    so the blocking Docker SDK never stalls the event loop, then announces the abort.
+    """
+    try:
+        containers = await asyncio.to_thread(list_pipeline_containers, pipeline_id)
+        logger.info(f"[{pipeline_id}] Aborting {len(containers)} container(s)")
+        await asyncio.gather(*(
+            asyncio.to_thread(stop_and_remove_container, c, c.name)
+            for c in containers
+        ))
+    except Exception as e:
+        logger.warning(f"[{pipeline_id}] Error while tearing down aborted pipeline: {e}")
 
     await manager.broadcast({
         "category": "lifecycle",
@@ -143,4 +372,25 @@ async def abort_pipeline_api(pipeline_id: str):
         "data": None,
     })
 
-    return {"status": "aborted"}
\ No newline at end of file
+@router.post("/abort/{pipeline_id}")
+async def abort_pipeline_api(pipeline_id: str, request: Request, background_tasks: BackgroundTasks):
+    if should_forward(request, pipeline_id):
+        return await forward(pipeline_id, "POST", f"/abort/{pipeline_id}")
+
+    state = get_pipeline(pipeline_id)
+
+    if not state:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+
+    if state["status"] in ("completed", "failed", "aborted"):
+        return {"status": "ignored", "reason": "pipeline already finished"}
+
+    # register abort
+    changed = abort_pipeline(pipeline_id)
+    if not changed:
+        return {"status": "ignored", "reason": "cannot abort"}
+
+    # kill containers (if any) after responding; "aborted" is broadcast once they are gone
+    background_tasks.add_task(teardown_aborted_pipeline, pipeline_id)
+
+    return {"status": "aborting"}
\ No newline at end of file
@@ -0,0 +1,158 @@
+# app/events/consumer.py
+import asyncio
+import os
+import threading
+from collections.abc import Awaitable, Callable
+
+from confluent_kafka import Consumer, KafkaError, KafkaException
+from confluent_kafka.admin import AdminClient, NewTopic
+from pydantic import ValidationError
+
+from app.sharding import SHARD_INDEX, SHARDED, is_local
+from shared.events import Event
+from shared.events.emit import BROKER_ADDRESS, EVENTS_TOPIC
+from shared.logger import get_logger
+
+logger = get_logger("EventBusConsumer")
+
+EVENTS_TOPIC_PARTITIONS = int(os.getenv("EVENTS_TOPIC_PARTITIONS", "6"))
+EVENTS_TOPIC_RETENTION_MS = os.getenv("EVENTS_TOPIC_RETENTION_MS", str(24 * 60 * 60 * 1000))
+EVENTS_CONSUMER_GROUP = os.getenv("EVENTS_CONSUMER_GROUP", "pipeline-manager")
+# Delay before the consumer is recreated after a failure, doubling up to the maximum
+EVENTS_RETRY_DELAY = float(os.getenv("EVENTS_RETRY_DELAY", "1"))
+EVENTS_RETRY_MAX_DELAY = float(os.getenv("EVENTS_RETRY_MAX_DELAY", "30"))
+if SHARDED:
+    # Every shard reads the whole topic and keeps only the pipelines it owns
+    EVENTS_CONSUMER_GROUP = f"{EVENTS_CONSUMER_GROUP}-{SHARD_INDEX}"
+
+
+def ensure_events_topic():
+    """
+    Create the events topic if it does not exist yet.
+
+    Events are keyed by pipeline_id, so partitioning keeps every pipeline's events
+    ordered. The topic uses time-based retention rather than compaction, since
+    compaction would keep only the latest event of each pipeline.
+    """
+    admin = AdminClient({"bootstrap.servers": BROKER_ADDRESS})
+    topic = NewTopic(
+        EVENTS_TOPIC,
+        num_partitions=EVENTS_TOPIC_PARTITIONS,
+        replication_factor=1,
+        config={"cleanup.policy": "delete", "retention.ms": EVENTS_TOPIC_RETENTION_MS},
+    )
+    for name, future in admin.create_topics([topic]).items():
+        try:
+            future.result()
+            logger.info(f"Created events topic '{name}'")
+        except KafkaException as e:
+            if e.args[0].code() != KafkaError.TOPIC_ALREADY_EXISTS:
+                raise
+
+
+class EventBusConsumer:
+    def __init__(
+        self,
+        handler: Callable[[Event], Awaitable],
+        loop: asyncio.AbstractEventLoop,
+        batch_size: int = 500,
+        batch_timeout: float = 0.2,
+    ):
+        """
+        Consumes worker events from the events topic in a background thread and
+        hands them to the event loop in batches.
+
+        Offsets are committed only after a batch has been processed, so events
+        produced while the manager is down are delivered once it is back.
+        If the consumer fails, it is recreated with exponential backoff and
+        resumes from the last committed batch.
+
+        An event whose handler raises is logged and skipped, not redelivered
+        (at-most-once per failing event), so one bad event cannot stall the
+        events of every pipeline behind it.
+
+        Parameters
+        ----------
+        handler : Callable[[Event], Awaitable]
+            Coroutine function applied to every event.
+        loop : asyncio.AbstractEventLoop
+            The event loop the handler runs on.
+        batch_size : int
+            Maximum number of events fetched per batch.
+        batch_timeout : float
+            Seconds to wait for a batch to fill.
+        """
+        self.handler = handler
+        self.loop = loop
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self._stop = threading.Event()
+        self._committed = False
+        self._thread = threading.Thread(target=self._run, name="event-bus-consumer", daemon=True)
+
+    def start(self):
+        ensure_events_topic()
+        self._thread.start()
+        logger.info(f"Consuming events from topic '{EVENTS_TOPIC}'")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        delay = EVENTS_RETRY_DELAY
+        while not self._stop.is_set():
+            self._committed = False
+            try:
+                self._consume()
+            except Exception as e:
+                if self._committed:
+                    # It worked for a while, start backing off from scratch
+                    delay = EVENTS_RETRY_DELAY
+                logger.exception(f"Event bus consumer failed, retrying in {delay:g}s: {e}")
+                self._stop.wait(delay)
+                delay = min(delay * 2, EVENTS_RETRY_MAX_DELAY)
+
+    def _consume(self):
+        consumer = Consumer({
+            "bootstrap.servers": BROKER_ADDRESS,
+            "group.id": EVENTS_CONSUMER_GROUP,
+            "enable.auto.commit": False,
+            "auto.offset.reset": "latest",
+        })
+        consumer.subscribe([EVENTS_TOPIC])
+
+        try:
+            while not self._stop.is_set():
+                messages = consumer.consume(num_messages=self.batch_size, timeout=self.batch_timeout)
+                if not messages:
+                    continue
+
+                events = []
+                for msg in messages:
+                    if msg.error():
+                        logger.warning(f"Event bus error: {msg.error()}")
+                        continue
+                    try:
+                        event = Event.model_validate_json(msg.value())
+                    except ValidationError as e:
+                        logger.warning(f"Dropping malformed event: {e}")
+                        continue
+                    if is_local(event.pipeline_id):
+                        events.append(event)
+
+                if events:
+                    future = asyncio.run_coroutine_threadsafe(self._handle_batch(events), self.loop)
+                    future.result()
+
+                consumer.commit(asynchronous=True)
+                self._committed = True
+        finally:
+            consumer.close()
+
+    async def _handle_batch(self, events: list[Event]):
+        for event in events:
+            try:
+                await self.handler(event)
+            except Exception as e:
+                logger.exception(f"Failed to process event: {e}")
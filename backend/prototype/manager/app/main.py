@@ -1,9 +1,62 @@
 # app/main.py
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.pipelines import router as pipeline_router
+from app.api.pipelines import process_event, router as pipeline_router
+from app.pipelines.lifecycle import recover_pipelines
+from app.pipelines.archive import RunArchive
+from app.pipelines.registry import evict_finished_pipelines, open_store
+from app.pipelines.store import RegistryStore
+from shared.events.emit import EVENT_TRANSPORT
+from shared.logger import get_logger
+
+logger = get_logger("Main")
+
+REGISTRY_EVICTION_INTERVAL = float(os.environ.get("REGISTRY_EVICTION_INTERVAL", "60"))
+
+
+async def evict_periodically():
+    while True:
+        await asyncio.sleep(REGISTRY_EVICTION_INTERVAL)
+        try:
+            evicted = evict_finished_pipelines()
+            if evicted:
+                logger.info(f"Archived and evicted {evicted} finished pipeline(s)")
+        except Exception as e:
+            logger.exception(f"Registry eviction failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Rebuild the registry and reattach to containers that survived a restart
+    store = RegistryStore()
+    open_store(store, RunArchive())
+    store.start()
+    recover_pipelines()
+    eviction_task = asyncio.create_task(evict_periodically())
+
+    event_bus = None
+    if EVENT_TRANSPORT == "kafka":
+        # Imported lazily so the HTTP transport does not require a Kafka client
+        from app.events.consumer import EventBusConsumer
+
+        event_bus = EventBusConsumer(process_event, asyncio.get_running_loop())
+        event_bus.start()
+
+    yield
+
+    eviction_task.cancel()
+    if event_bus:
+        # Off the loop: the consumer thread may be waiting on it to process an event
+        await asyncio.to_thread(event_bus.stop)
+
+    store.stop()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,  # ty: ignore[invalid-argument-type]; https://github.com/astral-sh/ty/issues/1635
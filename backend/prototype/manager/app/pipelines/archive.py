@@ -0,0 +1,52 @@
+# app/pipelines/archive.py
+import json
+import os
+import threading
+from collections import deque
+
+REGISTRY_ARCHIVE_PATH = os.environ.get("REGISTRY_ARCHIVE_PATH", "data/runs.jsonl")
+
+
+class RunArchive:
+    def __init__(self, path: str = REGISTRY_ARCHIVE_PATH):
+        """
+        Append-only JSON Lines log of finished pipeline runs.
+
+        Parameters
+        ----------
+        path : str
+            Location of the archive file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, summaries: list[dict]):
+        if not summaries:
+            return
+
+        lines = "".join(json.dumps(s, separators=(",", ":"), default=str) + "\n" for s in summaries)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def query(self, pipeline_id: str | None = None, limit: int = 100) -> list[dict]:
+        """
+        Returns the most recent archived runs (newest first), optionally for one pipeline.
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        matches: deque[dict] = deque(maxlen=limit)
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            for line in f:
+                # Cheap substring check before paying for json.loads
+                if pipeline_id and json.dumps(pipeline_id) not in line:
+                    continue
+                summary = json.loads(line)
+                if pipeline_id and summary.get("pipeline_id") != pipeline_id:
+                    continue
+                matches.append(summary)
+        return list(reversed(matches))
@@ -0,0 +1,38 @@
+# app/pipelines/chaining.py
+from app.pipelines.models import PipelineInput, SegmentMode, StartPosition
+from shared.transforms import is_sketch
+
+
+def can_chain(upstream: PipelineInput, downstream: PipelineInput) -> bool:
+    """
+    True if `downstream` can run in the same worker process as `upstream`,
+    receiving its rows in memory instead of through their shared topic
+    """
+    return (
+        upstream.output_topic == downstream.input_topic
+        and not upstream.durable_output
+        # Rows a sketch holds when the worker stops are produced to its output topic
+        and not (upstream.transformations and is_sketch(upstream.transformations[-1]))
+        # A producer or a consumer-side policy needs the intermediate topic to exist
+        and not downstream.allow_producer
+        and downstream.mode == SegmentMode.STREAM
+        and downstream.start_position == StartPosition.COMMITTED
+        and not (downstream.max_messages or downstream.idle_timeout or downstream.stop_on_upstream_complete)
+        # Chained segments run the way their head does
+        and downstream.execution == upstream.execution
+    )
+
+
+def plan_chains(pipelines: list[PipelineInput]) -> list[list[int]]:
+    """
+    Group consecutive segments into chains that run in one worker each.
+    Every chain is a list of segment indices; its first segment is the head that
+    consumes from Kafka, the others receive rows in memory.
+    """
+    chains = [[0]] if pipelines else []
+    for idx in range(1, len(pipelines)):
+        if can_chain(pipelines[chains[-1][-1]], pipelines[idx]):
+            chains[-1].append(idx)
+        else:
+            chains.append([idx])
+    return chains
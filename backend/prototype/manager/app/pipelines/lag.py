@@ -0,0 +1,30 @@
+# app/pipelines/lag.py
+from confluent_kafka import Consumer, TopicPartition
+
+from shared.events.emit import BROKER_ADDRESS
+
+
+def worker_consumer_group(pipeline_id: str, segment_index: int) -> str:
+    # Must match the consumer group the worker derives from the same values
+    return f"worker_{pipeline_id}_{segment_index}"
+
+
+def consumer_group_lag(group: str, topic: str) -> int:
+    """
+    Messages in `topic` not yet committed by `group`, summed over all partitions
+    """
+    consumer = Consumer({
+        "bootstrap.servers": BROKER_ADDRESS,
+        "group.id": group,
+        "enable.auto.commit": False,
+    })
+    try:
+        partitions = consumer.list_topics(topic, timeout=5).topics[topic].partitions
+        committed = consumer.committed([TopicPartition(topic, p) for p in partitions], timeout=5)
+        lag = 0
+        for tp in committed:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic, tp.partition), timeout=5)
+            lag += high - (tp.offset if tp.offset >= 0 else low)
+        return lag
+    finally:
+        consumer.close()
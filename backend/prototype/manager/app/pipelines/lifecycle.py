@@ -1,12 +1,23 @@
 # app/pipelines/lifecycle.py
 import docker
+import threading
 import time
 import json
 import os
 import traceback
 
-from app.pipelines.models import PipelineInput, PipelineStatus
-from app.pipelines.registry import get_pipeline
+from app.pipelines.lag import consumer_group_lag, worker_consumer_group
+from app.pipelines.models import PipelineInput, PipelineStatus, SegmentMode
+from app.pipelines.reference import WORKER_REFERENCE_DIR, worker_volumes
+from app.pipelines.registry import (
+    fail_pipeline,
+    get_pipeline,
+    get_running_segments,
+    get_upstream_segment,
+    record_segment_summary,
+    register_segment,
+)
+from app.sharding import is_local, own_url
 from shared.logger import get_logger
 from shared.events import emit_event
 
@@ -37,13 +48,191 @@ def stop_and_remove_container(container, name: str | None = None):
     except Exception as e:
         logger.warning(f"Failed to remove container {label}: {e}")
 
-def manage_pipeline_lifecycle(pipeline: PipelineInput, segment_index: int = 0):
+def list_pipeline_containers(pipeline_id: str) -> list:
+    client = docker.from_env()
+    return client.containers.list(
+        all=True,
+        filters={"label": f"pipeline_id={pipeline_id}"}
+    )
+
+def upstream_drained(pipeline: PipelineInput, segment_index: int) -> bool:
+    """
+    True once the segment feeding this one has completed and everything it
+    produced has been consumed and committed by this segment's worker
+    """
+    upstream = get_upstream_segment(pipeline.pipeline_id, pipeline.input_topic)
+    if upstream is None or upstream[0] == segment_index or upstream[1] != "completed":
+        return False
+    try:
+        lag = consumer_group_lag(worker_consumer_group(pipeline.pipeline_id, segment_index), pipeline.input_topic)
+    except Exception as e:
+        logger.warning(f"[{pipeline.pipeline_id}] Could not read lag of segment {segment_index}: {e}")
+        return False
+    return lag == 0
+
+def wait_for_upstream(pipeline: PipelineInput, segment_index: int, poll_interval: float = 2) -> bool:
+    """
+    Block until the segment feeding this one has completed, so a backfill fixes
+    its range over the whole upstream output. Returns False if the pipeline
+    failed or was aborted in the meantime.
+    """
+    waiting = False
+    while True:
+        upstream = get_upstream_segment(pipeline.pipeline_id, pipeline.input_topic)
+        if upstream is None or upstream[0] == segment_index or upstream[1] == "completed":
+            return True
+        if not waiting:
+            logger.info(f"[{pipeline.pipeline_id}] Segment {segment_index} waits for segment {upstream[0]} to complete")
+            waiting = True
+        state = get_pipeline(pipeline.pipeline_id)
+        if state and state["status"] in (PipelineStatus.FAILED, PipelineStatus.ABORTED):
+            return False
+        time.sleep(poll_interval)
+
+def monitor_segment(
+    pipeline: PipelineInput,
+    segment_index: int,
+    worker_container,
+    producer_container,
+    elapsed: float = 0,
+    chained: list[int] | None = None,
+    replica_containers: list | None = None,
+):
+    """
+    Watch a running segment until its runtime is over, then tear it down.
+    A worker that stops itself cleanly (e.g. a finished backfill) or whose drained
+    upstream has completed (stop_on_upstream_complete) completes the segment
+    right away. `elapsed` lets a recovered segment continue where the previous
+    manager stopped.
+    """
+    # -----------------------
+    # Container Monitoring
+    # -----------------------
+    container_runtime = pipeline.runtime
+    poll_interval = min(10, max(1, container_runtime // 10)) # Keep polling interval between 1–10 seconds
+
+    worker_finished = False
+    while elapsed < container_runtime:
+        state = get_pipeline(pipeline.pipeline_id)
+
+        if state and state["status"] == PipelineStatus.ABORTED:
+            logger.info(f"[{pipeline.pipeline_id}] Already Aborted and broadcasted to frontend")
+            return
+
+        # Check worker only if it exists
+        if worker_container:
+            worker_container.reload()
+            worker_status = worker_container.status
+
+            if worker_status == "exited" and worker_container.attrs["State"]["ExitCode"] == 0:
+                logger.info(f"[{pipeline.pipeline_id}] Worker of segment {segment_index} finished its work")
+                worker_finished = True
+                break
+
+            if pipeline.stop_on_upstream_complete and upstream_drained(pipeline, segment_index):
+                logger.info(f"[{pipeline.pipeline_id}] Upstream of segment {segment_index} completed and drained")
+                record_segment_summary(pipeline.pipeline_id, segment_index, {"reason": "upstream_completed"})
+                worker_finished = True
+                break
+
+            if worker_status == "exited":
+                logger.error("Worker exited unexpectedly — failing pipeline")
+
+                if producer_container:
+                    stop_and_remove_container(producer_container, name="producer")
+
+                return
+
+        # Check producer only if it exists
+        if producer_container:
+            producer_container.reload()
+            producer_status = producer_container.status
+
+            if producer_status == "exited":
+                logger.error("Producer exited unexpectedly — failing pipeline")
+
+                if worker_container:
+                    stop_and_remove_container(worker_container, name="worker")
+
+                return
+
+        logger.debug(f"Heartbeat — running {elapsed}s")                        
+        time.sleep(poll_interval)
+        elapsed += poll_interval
+
+    if producer_container:
+        stop_and_remove_container(producer_container, name="producer")
+
+    if not worker_finished:
+        # Give the worker time to drain what the producer sent last
+        time.sleep(5)
+
+    if worker_container:
+        stop_and_remove_container(worker_container, name="worker")
+
+    for replica in replica_containers or []:
+        stop_and_remove_container(replica, name="replica")
+
+    # Segments chained into this worker complete with it
+    for completed_index in [segment_index, *(chained or [])]:
+        emit_event(
+            pipeline_id=pipeline.pipeline_id,
+            segment_index=completed_index,
+            category="lifecycle",
+            type="segment_completed",
+        )
+        logger.info(f"[{pipeline.pipeline_id}] Segment - {completed_index} completed")
+
+def handle_lifecycle_crash(
+    pipeline: PipelineInput,
+    e: Exception,
+    worker_container,
+    producer_container,
+    replica_containers: list | None = None,
+):
+    logger.exception(f"Lifecycle Manager failed: {e}")
+
+    emit_event(
+        pipeline_id=pipeline.pipeline_id,
+        category="lifecycle",
+        type="failed",
+        data={
+            "message": f"Lifecycle Manager crashed:\n\n{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(),
+        },
+    )
+
+    if worker_container:
+        stop_and_remove_container(worker_container, name="worker")
+
+    if producer_container:
+        stop_and_remove_container(producer_container, name="producer")
+
+    for replica in replica_containers or []:
+        stop_and_remove_container(replica, name="replica")
+
+def manage_pipeline_lifecycle(
+    pipeline: PipelineInput,
+    segment_index: int = 0,
+    chained: list[tuple[int, PipelineInput]] | None = None,
+    replicas: int = 1,
+):
+    """
+    Launch and monitor one segment. `chained` segments run in the same worker
+    process, receiving the segment's rows in memory (see app.pipelines.chaining).
+    `replicas` > 1 starts further workers in the same consumer group, splitting
+    the input partitions between them (see app.pipelines.planner).
+    """
+    chained = chained or []
     state = get_pipeline(pipeline.pipeline_id)
     if state and state["status"] in (PipelineStatus.FAILED, PipelineStatus.ABORTED):
         logger.warning(
             f"Pipeline {pipeline.pipeline_id} already FAILED or ABORTED — skipping lifecycle"
         )
         return
+
+    if pipeline.mode == SegmentMode.BACKFILL and not wait_for_upstream(pipeline, segment_index):
+        return
     
     client = docker.from_env()
     
@@ -51,6 +240,14 @@ def manage_pipeline_lifecycle(pipeline: PipelineInput, segment_index: int = 0):
     producer_image_name = os.environ.get("PRODUCER_IMAGE_NAME", "pipeline-orchestrator-producer:0.1.0")
     network_name = os.environ.get("DOCKER_NETWORK_NAME", "pipeline-orchestrator_redpanda_network")
     broker_address = os.environ.get("BROKER_ADDRESS", "redpanda:9092")
+    event_transport = os.environ.get("EVENT_TRANSPORT", "http")
+    events_topic = os.environ.get("EVENTS_TOPIC", "pipeline-events")
+    metrics_port = os.environ.get("PIPELINE_METRICS_PORT", "9100")
+
+    # In sharded mode workers report straight to the shard that owns their pipeline
+    shard_url = own_url()
+    event_endpoint = f"{shard_url}/stream/event" if shard_url else os.getenv("FASTAPI_EVENT_ENDPOINT")
+    observed_endpoint = f"{shard_url}/stream/observed" if shard_url else os.getenv("FASTAPI_OBSERVED_ENDPOINT")
 
     worker_env_vars = {
         "PIPELINE_ID": pipeline.pipeline_id,
@@ -58,12 +255,53 @@ def manage_pipeline_lifecycle(pipeline: PipelineInput, segment_index: int = 0):
         "BROKER_ADDRESS": broker_address, 
         "INPUT_TOPIC": pipeline.input_topic,
         "OUTPUT_TOPIC": pipeline.output_topic,
-        "TRANSFORMATIONS": json.dumps(pipeline.transformations), # Serialize the list of scripts into a JSON string
-        "FASTAPI_EVENT_ENDPOINT": os.getenv("FASTAPI_EVENT_ENDPOINT")
+        "TRANSFORMATIONS": json.dumps(pipeline.transformations), # Serialize the list of scripts and native transforms into a JSON string
+        "FASTAPI_EVENT_ENDPOINT": event_endpoint,
+        "FASTAPI_OBSERVED_ENDPOINT": observed_endpoint,
+        "EVENT_TRANSPORT": event_transport,
+        "EVENTS_TOPIC": events_topic,
+        "METRICS_PORT": metrics_port,
+        "ERROR_POLICY": pipeline.error_policy.value,
+        "DEAD_LETTER_TOPIC": pipeline.dead_letter_topic or f"{pipeline.output_topic}-dlq",
+        "START_POSITION": pipeline.start_position.value,
+        "MODE": pipeline.mode.value,
+        "EXECUTION": pipeline.execution.value,
+        "CACHE_MAX_ENTRIES": str(pipeline.cache_max_entries),
+        "REFERENCE_DATA_DIR": WORKER_REFERENCE_DIR,
     }
+    if pipeline.start_timestamp is not None:
+        worker_env_vars["START_TIMESTAMP"] = str(pipeline.start_timestamp)
+    if pipeline.end_timestamp is not None:
+        worker_env_vars["END_TIMESTAMP"] = str(pipeline.end_timestamp)
+    if pipeline.max_messages:
+        worker_env_vars["MAX_MESSAGES"] = str(pipeline.max_messages)
+    if pipeline.idle_timeout:
+        worker_env_vars["IDLE_TIMEOUT"] = str(pipeline.idle_timeout)
+    if pipeline.pool_workers:
+        worker_env_vars["POOL_WORKERS"] = str(pipeline.pool_workers)
+    if pipeline.max_in_flight:
+        worker_env_vars["MAX_IN_FLIGHT"] = str(pipeline.max_in_flight)
+    if pipeline.cache_ttl:
+        worker_env_vars["CACHE_TTL"] = str(pipeline.cache_ttl)
+    if chained:
+        worker_env_vars["CHAINED_STAGES"] = json.dumps([
+            {
+                "segment_index": idx,
+                "input_topic": segment.input_topic,
+                "output_topic": segment.output_topic,
+                "transformations": segment.transformations,
+                "error_policy": segment.error_policy.value,
+                "dead_letter_topic": segment.dead_letter_topic or f"{segment.output_topic}-dlq",
+            }
+            for idx, segment in chained
+        ])
+
+    # Reference tables, read-only and shared through the host's page cache
+    reference_volumes = worker_volumes()
 
     producer_container = None
     worker_container = None
+    replica_containers = []
 
     try:
         emit_event(
@@ -93,6 +331,10 @@ def manage_pipeline_lifecycle(pipeline: PipelineInput, segment_index: int = 0):
                 "INPUT_TOPIC": pipeline.input_topic,
                 "N_CHANNELS": str(pipeline.n_channels),
                 "FREQUENCY": str(pipeline.frequency),
+                "FASTAPI_EVENT_ENDPOINT": event_endpoint,
+                "EVENT_TRANSPORT": event_transport,
+                "EVENTS_TOPIC": events_topic,
+                "METRICS_PORT": metrics_port,
             }
 
             producer_container = client.containers.run(
@@ -106,6 +348,7 @@ def manage_pipeline_lifecycle(pipeline: PipelineInput, segment_index: int = 0):
                     "pipeline_id": pipeline.pipeline_id,
                     "role": "producer",
                     "segment_index": str(segment_index),
+                    "metrics_port": metrics_port,
                 },
                 auto_remove=False
             )
@@ -118,92 +361,158 @@ def manage_pipeline_lifecycle(pipeline: PipelineInput, segment_index: int = 0):
             detach=True,
             network=network_name,  
             environment=worker_env_vars,
+            volumes=reference_volumes,
             name=f"worker_{pipeline.pipeline_id}_{segment_index}",
             labels={
                 "pipeline_id": pipeline.pipeline_id,
                 "role": "worker",
                 "segment_index": str(segment_index),
+                "chained_segments": ",".join(str(idx) for idx, _ in chained),
+                "metrics_port": metrics_port,
             },
             auto_remove=False 
         )
 
-        logger.info(f"Worker container {worker_container.short_id} started — monitoring")
-
-        # -----------------------
-        # Container Monitoring
-        # -----------------------
-        container_runtime = pipeline.runtime
-        poll_interval = min(10, max(1, container_runtime // 10)) # Keep polling interval between 1–10 seconds
-        elapsed = 0
-
-        while elapsed < container_runtime:
-            state = get_pipeline(pipeline.pipeline_id)
-
-            if state and state["status"] == PipelineStatus.ABORTED:
-                logger.info(f"[{pipeline.pipeline_id}] Already Aborted and broadcasted to frontend")
-                return
-
-            # Check worker only if it exists
-            if worker_container:
-                worker_container.reload()
-                worker_status = worker_container.status
-
-                if worker_status == "exited":
-                    logger.error("Worker exited unexpectedly — failing pipeline")
-
-                    if producer_container:
-                        stop_and_remove_container(producer_container, name="producer")
-
-                    return
-
-            # Check producer only if it exists
-            if producer_container:
-                producer_container.reload()
-                producer_status = producer_container.status
-
-                if producer_status == "exited":
-                    logger.error("Producer exited unexpectedly — failing pipeline")
-
-                    if worker_container:
-                        stop_and_remove_container(worker_container, name="worker")
-
-                    return
+        for replica in range(1, replicas):
+            replica_containers.append(client.containers.run(
+                image=worker_image_name,
+                command=["python", "-m", "app.worker"],
+                detach=True,
+                network=network_name,
+                environment=worker_env_vars,
+                volumes=reference_volumes,
+                name=f"worker_{pipeline.pipeline_id}_{segment_index}_r{replica}",
+                labels={
+                    "pipeline_id": pipeline.pipeline_id,
+                    "role": "replica",
+                    "segment_index": str(segment_index),
+                    "chained_segments": ",".join(str(idx) for idx, _ in chained),
+                    "metrics_port": metrics_port,
+                },
+                auto_remove=False
+            ))
 
-            logger.debug(f"Heartbeat — running {elapsed}s")                        
-            time.sleep(poll_interval)
-            elapsed += poll_interval
+        logger.info(
+            f"Worker container {worker_container.short_id} started"
+            f"{f' with {replicas - 1} replica(s)' if replicas > 1 else ''} — monitoring"
+        )
 
-        if producer_container:
-            stop_and_remove_container(producer_container, name="producer")
+        definition = pipeline.model_dump()
+        if chained:
+            definition["chained"] = [[idx, segment.model_dump()] for idx, segment in chained]
+        register_segment(pipeline.pipeline_id, segment_index, definition, time.time())
+
+        monitor_segment(
+            pipeline,
+            segment_index,
+            worker_container,
+            producer_container,
+            chained=[idx for idx, _ in chained],
+            replica_containers=replica_containers,
+        )
 
-        time.sleep(5)
+    except Exception as e:
+        handle_lifecycle_crash(pipeline, e, worker_container, producer_container, replica_containers)
+
+
+def resume_segment(
+    pipeline: PipelineInput,
+    segment_index: int,
+    worker_container,
+    producer_container,
+    elapsed: float,
+    chained: list[int] | None = None,
+    replica_containers: list | None = None,
+):
+    try:
+        monitor_segment(pipeline, segment_index, worker_container, producer_container, elapsed, chained, replica_containers)
+    except Exception as e:
+        handle_lifecycle_crash(pipeline, e, worker_container, producer_container, replica_containers)
 
-        if worker_container:
-            stop_and_remove_container(worker_container, name="worker")
+def cleanup_containers(containers: list[tuple[str, object]]):
+    for name, container in containers:
+        stop_and_remove_container(container, name=name)
 
-        emit_event(
-            pipeline_id=pipeline.pipeline_id,
-            segment_index=segment_index,
-            category="lifecycle",
-            type="segment_completed",
+def recover_pipelines():
+    """
+    Reattach to the containers of segments that were running before a manager restart.
+    Must be called after the registry has been rebuilt from its store.
+    """
+    try:
+        client = docker.from_env()
+        # One list call for all pipelines; sparse skips inspecting every container
+        containers = client.containers.list(
+            all=True,
+            sparse=True,
+            filters={"label": "pipeline_id"},
         )
-        logger.info(f"[{pipeline.pipeline_id}] Segment - {segment_index} completed")
-
     except Exception as e:
-        logger.exception(f"Lifecycle Manager failed: {e}")
+        logger.warning(f"Pipeline recovery skipped, Docker unavailable: {e}")
+        return
 
-        emit_event(
-            pipeline_id=pipeline.pipeline_id,
-            category="lifecycle",
-            type="failed",
-            data={
-                "message": f"Lifecycle Manager crashed:\n\n{type(e).__name__}: {e}",
-                "traceback": traceback.format_exc(),
-            },
-        )
-        
-        if worker_container:
-            stop_and_remove_container(worker_container, name="worker")
-            
-        if producer_container:
-            stop_and_remove_container(producer_container, name="producer")
\ No newline at end of file
+    by_segment: dict[tuple[str, int], dict] = {}
+    replicas: dict[tuple[str, int], list] = {}
+    for container in containers:
+        labels = container.attrs.get("Labels") or {}
+        key = (labels.get("pipeline_id"), int(labels.get("segment_index", "0")))
+        if labels.get("role") == "replica":
+            replicas.setdefault(key, []).append(container)
+        else:
+            by_segment.setdefault(key, {})[labels.get("role")] = container
+
+    resumed = 0
+    for pipeline_id, segment_index, started_at, definition in get_running_segments():
+        pipeline = PipelineInput(**definition)
+        roles = by_segment.pop((pipeline_id, segment_index), {})
+        worker_container = roles.get("worker")
+        producer_container = roles.get("producer")
+        replica_containers = replicas.pop((pipeline_id, segment_index), [])
+
+        if not worker_container:
+            logger.error(f"[{pipeline_id}] Worker of segment {segment_index} lost during manager restart")
+            fail_pipeline(pipeline_id, {
+                "message": f"[ERROR] Worker of Segment #{segment_index+1} was lost during a manager restart",
+            })
+            if producer_container:
+                by_segment[(pipeline_id, segment_index)] = {"producer": producer_container}
+            if replica_containers:
+                replicas[(pipeline_id, segment_index)] = replica_containers
+            continue
+
+        threading.Thread(
+            target=resume_segment,
+            args=(
+                pipeline,
+                segment_index,
+                worker_container,
+                producer_container,
+                time.time() - started_at,
+                [idx for idx, _ in definition.get("chained", [])],
+                replica_containers,
+            ),
+            name=f"resume_{pipeline_id}_{segment_index}",
+            daemon=True,
+        ).start()
+        resumed += 1
+
+    # Whatever is left belongs to finished or unknown pipelines of this shard
+    orphans = [
+        (role, c)
+        for (pipeline_id, _), roles in by_segment.items()
+        if is_local(pipeline_id)
+        for role, c in roles.items()
+    ] + [
+        ("replica", c)
+        for (pipeline_id, _), containers in replicas.items()
+        if is_local(pipeline_id)
+        for c in containers
+    ]
+    if orphans:
+        threading.Thread(
+            target=cleanup_containers,
+            args=(orphans,),
+            name="orphan-cleanup",
+            daemon=True,
+        ).start()
+
+    logger.info(f"Recovered {resumed} running segment(s), cleaning up {len(orphans)} orphaned container(s)")
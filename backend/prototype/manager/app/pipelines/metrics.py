@@ -0,0 +1,112 @@
+# app/pipelines/metrics.py
+import asyncio
+import re
+
+import httpx
+from shared.logger import get_logger
+
+from app.pipelines.lifecycle import list_pipeline_containers
+
+logger = get_logger("Metrics")
+
+SCRAPE_TIMEOUT = 2.0
+
+# Label values may contain escaped quotes, backslashes and newlines, and any other character
+_LABEL_VALUE = r'"(?:[^"\\]|\\.)*"'
+_SAMPLE = re.compile(
+    r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>(?:[^}"]|' + _LABEL_VALUE + r')*)\})?\s+(?P<value>\S+)$'
+)
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+_ESCAPE = re.compile(r'\\(.)')
+
+
+def _unescape(value: str) -> str:
+    return _ESCAPE.sub(lambda m: "\n" if m[1] == "n" else m[1], value)
+
+
+def parse_metrics(text: str) -> list[dict]:
+    """
+    Parse Prometheus text exposition into [{"name", "labels", "value"}]
+    """
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line.strip())
+        if not match:
+            continue
+        samples.append({
+            "name": match["name"],
+            "labels": {k: _unescape(v) for k, v in _LABEL.findall(match["labels"] or "")},
+            "value": float(match["value"]),
+        })
+    return samples
+
+
+async def _scrape(client: httpx.AsyncClient, container) -> dict:
+    labels = container.labels
+    result = {
+        "container": container.name,
+        "role": labels.get("role"),
+        "segment_index": int(labels.get("segment_index", "0")),
+        "metrics": [],
+    }
+    port = labels.get("metrics_port")
+    if not port:
+        result["error"] = "container exposes no metrics"
+        return result
+
+    try:
+        # Containers share the docker network, so their names resolve as hostnames
+        response = await client.get(f"http://{container.name}:{port}/metrics")
+        response.raise_for_status()
+        result["metrics"] = parse_metrics(response.text)
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to scrape metrics from {container.name}: {e}")
+        result["error"] = str(e)
+    return result
+
+
+async def scrape_pipeline_metrics(pipeline_id: str) -> list[dict]:
+    """
+    Scrape the metrics endpoint of every running container of a pipeline, found by label
+    """
+    containers = await asyncio.to_thread(list_pipeline_containers, pipeline_id)
+    running = [c for c in containers if c.status == "running"]
+
+    async with httpx.AsyncClient(timeout=SCRAPE_TIMEOUT) as client:
+        results = await asyncio.gather(*(_scrape(client, c) for c in running))
+    return sorted(results, key=lambda r: (r["segment_index"], r["role"] or ""))
+
+
+async def _request_profile(client: httpx.AsyncClient, container, seconds: float) -> dict:
+    labels = container.labels
+    result = {"container": container.name, "segment_index": int(labels.get("segment_index", "0"))}
+    try:
+        response = await client.post(
+            f"http://{container.name}:{labels['metrics_port']}/profile",
+            params={"seconds": seconds},
+        )
+        response.raise_for_status()
+        result.update(response.json())
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to start profiling on {container.name}: {e}")
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+async def start_pipeline_profiling(pipeline_id: str, seconds: float) -> list[dict]:
+    """
+    Ask every running worker of a pipeline to profile its transformations for `seconds`.
+    Each worker reports back through a metrics/profile event when done.
+    """
+    containers = await asyncio.to_thread(list_pipeline_containers, pipeline_id)
+    workers = [
+        c for c in containers
+        if c.status == "running" and c.labels.get("role") in ("worker", "replica") and c.labels.get("metrics_port")
+    ]
+
+    async with httpx.AsyncClient(timeout=SCRAPE_TIMEOUT) as client:
+        results = await asyncio.gather(*(_request_profile(client, c, seconds) for c in workers))
+    return sorted(results, key=lambda r: r["segment_index"])
@@ -1,16 +1,100 @@
 # app/pipelines/models.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 from enum import Enum
 
+from shared.transforms import compile_native, is_native, is_sketch, is_window, sketch_spec, window_spec
+
+class ErrorPolicy(str, Enum):
+    FAIL = "fail"  # fail the pipeline on the first failing row
+    SKIP = "skip"  # drop failing rows
+    DLQ = "dlq"  # route failing rows with error metadata to the dead-letter topic
+
+class StartPosition(str, Enum):
+    COMMITTED = "committed"  # resume where the segment's consumer group left off (earliest on first start)
+    LATEST = "latest"  # skip the backlog and start at live data
+    EARLIEST = "earliest"  # reprocess everything retained in the input topic
+    TIMESTAMP = "timestamp"  # start at the first message at or after start_timestamp
+
+class SegmentMode(str, Enum):
+    STREAM = "stream"  # process live data until the runtime is over
+    BACKFILL = "backfill"  # process a fixed range as fast as possible, then stop
+
+class ExecutionMode(str, Enum):
+    INLINE = "inline"  # run transformations on the consumer thread
+    PROCESS_POOL = "process_pool"  # run them in a pool of processes, one per allotted core
+
 class PipelineInput(BaseModel):
     pipeline_id: str
     input_topic: str
     output_topic: str
-    transformations: list[str]
+    # Python scripts, or built-in native transforms given as {"op": ..., ...} (see shared.transforms)
+    transformations: list[str | dict]
     allow_producer: bool = False
     n_channels: int = 10
     frequency: float = 1.0
     runtime: int
+    error_policy: ErrorPolicy = ErrorPolicy.FAIL
+    # Defaults to "<output_topic>-dlq" when the error policy is "dlq"
+    dead_letter_topic: str | None = None
+    start_position: StartPosition = StartPosition.COMMITTED
+    # Milliseconds since epoch, required when start_position is "timestamp"
+    start_timestamp: int | None = None
+    mode: SegmentMode = SegmentMode.STREAM
+    # Backfills end at the first message at or after this timestamp (ms since epoch),
+    # or at the end of the input topic at segment start if unset
+    end_timestamp: int | None = None
+    # Termination policies, each ending the segment before its runtime is over
+    max_messages: int | None = Field(None, ge=1)  # after this many input messages
+    idle_timeout: float | None = Field(None, gt=0)  # after this many seconds without input
+    stop_on_upstream_complete: bool = False  # once the upstream segment completed and its output is fully consumed
+    # With chaining, keep the output topic between this segment and the next
+    # instead of passing rows to the next segment in memory
+    durable_output: bool = False
+    # Applies to this segment and the segments chained into its worker
+    execution: ExecutionMode = ExecutionMode.INLINE
+    pool_workers: int | None = Field(None, ge=1)  # processes of the pool; defaults to the container's cores
+    # Rows transformed concurrently by `async def` transformations; defaults to 64
+    max_in_flight: int | None = Field(None, ge=1)
+    # Result caches of deterministic transformations (scripts declaring a cache_key)
+    cache_max_entries: int = Field(10000, ge=1)
+    cache_ttl: float | None = Field(None, gt=0)  # seconds a cached result stays valid
+
+    @field_validator("transformations")
+    @classmethod
+    def check_native_transforms(cls, transformations):
+        for idx, transformation in enumerate(transformations):
+            if is_native(transformation):
+                try:
+                    if is_window(transformation):
+                        window_spec(transformation)
+                    elif is_sketch(transformation):
+                        sketch_spec(transformation)
+                    else:
+                        compile_native([transformation])
+                except ValueError as e:
+                    raise ValueError(f"Transformation #{idx+1}: {e}")
+        return transformations
+
+    @model_validator(mode="after")
+    def check_start_timestamp(self):
+        if self.start_position == StartPosition.TIMESTAMP and self.start_timestamp is None:
+            raise ValueError("start_timestamp is required when start_position is 'timestamp'")
+        return self
+
+    @field_validator("transformations")
+    @classmethod
+    def check_sketch_last(cls, transformations):
+        # Rows a sketch still holds when the worker stops go straight to the output topic
+        if any(is_sketch(t) for t in transformations[:-1]):
+            raise ValueError("A sketch node must be the last transformation of its segment")
+        return transformations
+
+    @model_validator(mode="after")
+    def check_window_execution(self):
+        # Window and sketch state lives in the inline quixstreams pipeline
+        if self.execution != ExecutionMode.INLINE and any(is_window(t) or is_sketch(t) for t in self.transformations):
+            raise ValueError("Window and sketch nodes require execution 'inline'")
+        return self
 
 class PipelineStatus(str, Enum):
     STARTING = "starting"
@@ -0,0 +1,216 @@
+# app/pipelines/planner.py
+import math
+import os
+
+import docker
+from confluent_kafka.admin import AdminClient
+
+from app.pipelines.chaining import can_chain
+from app.pipelines.models import PipelineInput, SegmentMode, StartPosition
+from app.pipelines.registry import get_cost_history
+from shared.events.emit import BROKER_ADDRESS
+from shared.logger import get_logger
+from shared.transforms import plan_stage, step_fingerprint
+
+logger = get_logger("Planner")
+
+# Assumed per-row cost of a transformation that has never been measured
+PLANNER_DEFAULT_COST_MS = float(os.environ.get("PLANNER_DEFAULT_COST_MS", "0.1"))
+# Assumed input rate of a segment fed by a topic the planner knows nothing about
+PLANNER_DEFAULT_RATE = float(os.environ.get("PLANNER_DEFAULT_RATE", "10"))
+# A worker is one Python process, i.e. at most one busy core; plan for headroom below it
+PLANNER_TARGET_UTILIZATION = float(os.environ.get("PLANNER_TARGET_UTILIZATION", "0.7"))
+# Segments busier than this get a worker of their own
+PLANNER_ISOLATE_UTILIZATION = float(os.environ.get("PLANNER_ISOLATE_UTILIZATION", "0.5"))
+
+
+class CostModel:
+    def __init__(self, history: list[dict]):
+        """
+        Mean per-row cost of transformation scripts, measured in previous runs.
+
+        Parameters
+        ----------
+        history : list[dict]
+            Per-run {fingerprint: {"calls", "seconds"}} as kept in the run summaries.
+        """
+        self.totals: dict[str, list[float]] = {}
+        for costs in history:
+            for fingerprint, cost in costs.items():
+                total = self.totals.setdefault(fingerprint, [0, 0.0])
+                total[0] += cost.get("calls", 0)
+                total[1] += cost.get("seconds", 0.0)
+
+    def cost_ms(self, step) -> tuple[float, bool]:
+        """
+        Returns (ms per call, measured) of a script or of fused native nodes
+        """
+        calls, seconds = self.totals.get(step_fingerprint(step), (0, 0.0))
+        if calls:
+            return seconds * 1000 / calls, True
+        return PLANNER_DEFAULT_COST_MS, False
+
+
+def host_cpus() -> int:
+    configured = os.environ.get("PLANNER_HOST_CPUS")
+    if configured:
+        return int(configured)
+    try:
+        return int(docker.from_env().info()["NCPU"])
+    except Exception:
+        return os.cpu_count() or 1
+
+
+def topic_partitions(topics: set[str]) -> dict[str, int]:
+    """
+    Partition counts of the topics that already exist; replicas beyond it would idle
+    """
+    try:
+        metadata = AdminClient({"bootstrap.servers": BROKER_ADDRESS}).list_topics(timeout=2)
+    except Exception as e:
+        logger.warning(f"Could not read topic metadata: {e}")
+        return {}
+    return {name: len(t.partitions) for name, t in metadata.topics.items() if name in topics}
+
+
+def replicable(segment: PipelineInput) -> bool:
+    return (
+        segment.mode == SegmentMode.STREAM
+        and not segment.max_messages
+        and not segment.idle_timeout
+        and not segment.stop_on_upstream_complete
+        # Every replica would reposition the shared consumer group when it starts
+        and segment.start_position == StartPosition.COMMITTED
+    )
+
+
+def estimate_segments(pipelines: list[PipelineInput], costs: CostModel) -> list[dict]:
+    """
+    Expected input rate, per-row cost and CPU utilization of every segment
+    """
+    estimates = []
+    for idx, segment in enumerate(pipelines):
+        upstream = next((e for e in reversed(estimates) if e["output_topic"] == segment.input_topic), None)
+        if segment.allow_producer:
+            rate, rate_source = segment.frequency, "producer frequency"
+        elif upstream:
+            rate, rate_source = upstream["rate"], f"output of segment {upstream['segment_index']}"
+        else:
+            rate, rate_source = PLANNER_DEFAULT_RATE, "assumed (external input)"
+
+        transformations = []
+        for position, step in plan_stage(segment.transformations):
+            cost, measured = costs.cost_ms(step)
+            transformations.append({"transformation": position + 1, "cost_ms": round(cost, 4), "measured": measured})
+        cost_ms = sum(t["cost_ms"] for t in transformations)
+
+        estimates.append({
+            "segment_index": idx,
+            "output_topic": segment.output_topic,
+            "rate": rate,
+            "rate_source": rate_source,
+            "cost_ms": round(cost_ms, 4),
+            "utilization": round(rate * cost_ms / 1000, 4),
+            "transformations": transformations,
+        })
+    return estimates
+
+
+def plan_pipeline(pipelines: list[PipelineInput]) -> dict:
+    """
+    Decide which segments to fuse into one worker, which to isolate and how many
+    replicas each worker gets, from measured costs and the host's capacity.
+
+    Segments are fused (see app.pipelines.chaining) while the combined worker stays
+    under the target utilization. Segments above the isolation threshold get their
+    own worker, and workers needing more than the target get replicas in the same
+    consumer group, bounded by host cores and input partitions.
+    """
+    costs = CostModel(get_cost_history())
+    cpus = host_cpus()
+    estimates = estimate_segments(pipelines, costs)
+    partitions = topic_partitions({segment.input_topic for segment in pipelines})
+
+    chains: list[list[int]] = []
+    for idx, estimate in enumerate(estimates):
+        if chains:
+            previous = chains[-1]
+            combined = sum(estimates[i]["utilization"] for i in previous) + estimate["utilization"]
+            if (
+                can_chain(pipelines[previous[-1]], pipelines[idx])
+                and estimate["utilization"] <= PLANNER_ISOLATE_UTILIZATION
+                and max(estimates[i]["utilization"] for i in previous) <= PLANNER_ISOLATE_UTILIZATION
+                and combined <= PLANNER_TARGET_UTILIZATION
+            ):
+                previous.append(idx)
+                continue
+        chains.append([idx])
+
+    workers = []
+    for chain in chains:
+        head = pipelines[chain[0]]
+        utilization = sum(estimates[i]["utilization"] for i in chain)
+        replicas = max(1, math.ceil(utilization / PLANNER_TARGET_UTILIZATION))
+        rationale = []
+
+        if len(chain) > 1:
+            decision = "fused"
+            rationale.append(
+                f"segments {chain} pass rows in memory; combined load {utilization:.2f} cores "
+                f"stays below the {PLANNER_TARGET_UTILIZATION} target"
+            )
+        elif estimates[chain[0]]["utilization"] > PLANNER_ISOLATE_UTILIZATION:
+            decision = "isolated"
+            rationale.append(
+                f"load {utilization:.2f} cores exceeds the {PLANNER_ISOLATE_UTILIZATION} isolation threshold"
+            )
+        else:
+            decision = "single"
+            previous = chain[0] - 1
+            if previous < 0:
+                rationale.append(f"load {utilization:.2f} cores fits one worker")
+            elif not can_chain(pipelines[previous], head):
+                rationale.append(
+                    f"cannot share a process with segment {previous} (different topic, durable output, "
+                    "sketch output, producer or non-default start/stop settings)"
+                )
+            else:
+                rationale.append(
+                    f"fusing with segment {previous} would exceed the {PLANNER_TARGET_UTILIZATION} target"
+                )
+
+        if replicas > 1 and not replicable(head):
+            rationale.append(
+                f"would need {replicas} replicas, but bounded segments (backfill, message count, idle timeout) "
+                "stop on what one consumer has seen, and segments with a start position reposition "
+                "the whole consumer group, so they run as a single worker"
+            )
+            replicas = 1
+        elif replicas > 1:
+            bound = min(cpus, partitions.get(head.input_topic, replicas))
+            if bound < replicas:
+                rationale.append(
+                    f"needs {replicas} replicas but is capped at {bound} "
+                    f"({cpus} host cores, {partitions.get(head.input_topic, 'unknown')} input partitions)"
+                )
+                replicas = max(1, bound)
+            if replicas > 1:
+                decision = "replicated"
+                rationale.append(f"{replicas} replicas share the input partitions of '{head.input_topic}'")
+
+        workers.append({
+            "segments": chain,
+            "decision": decision,
+            "replicas": replicas,
+            "utilization": round(utilization, 4),
+            "rationale": "; ".join(rationale),
+        })
+
+    total = sum(worker["utilization"] for worker in workers)
+    return {
+        "host_cpus": cpus,
+        "total_utilization": round(total, 4),
+        "fits_host": total <= cpus * PLANNER_TARGET_UTILIZATION,
+        "workers": workers,
+        "segments": [{k: v for k, v in e.items() if k != "output_topic"} for e in estimates],
+    }
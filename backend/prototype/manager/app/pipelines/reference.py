@@ -0,0 +1,97 @@
+# app/pipelines/reference.py
+import csv
+import io
+import os
+
+from shared.logger import get_logger
+from shared.reference import FILE_SUFFIX, read_header, table_path, write_table
+
+logger = get_logger("ReferenceTables")
+
+# Where the manager writes converted tables
+REFERENCE_DATA_DIR = os.environ.get("REFERENCE_DATA_DIR", "data/reference")
+# Docker volume (or host directory) backing REFERENCE_DATA_DIR, mounted read-only into workers
+REFERENCE_VOLUME = os.environ.get("REFERENCE_VOLUME")
+WORKER_REFERENCE_DIR = "/reference"
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+
+
+def _coerce(value: str):
+    if value == "":
+        return None
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_csv(data: bytes) -> list[dict]:
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    return [{column: _coerce(value) for column, value in row.items()} for row in reader]
+
+
+def parse_parquet(data: bytes) -> list[dict]:
+    try:
+        # Optional, only needed to register Parquet tables
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet tables require pyarrow to be installed in the manager")
+    return pq.read_table(io.BytesIO(data)).to_pylist()
+
+
+def register_table(name: str, data: bytes, fmt: str, key: str) -> dict:
+    """
+    Convert an uploaded CSV/Parquet file into an indexed, memory-mappable table,
+    replacing a table of the same name
+    """
+    if fmt == FORMAT_CSV:
+        rows = parse_csv(data)
+    elif fmt == FORMAT_PARQUET:
+        rows = parse_parquet(data)
+    else:
+        raise ValueError(f"Unsupported format '{fmt}', expected '{FORMAT_CSV}' or '{FORMAT_PARQUET}'")
+
+    os.makedirs(REFERENCE_DATA_DIR, exist_ok=True)
+    header = write_table(table_path(name, REFERENCE_DATA_DIR), name, key, rows)
+    logger.info(f"Registered reference table '{name}' ({header['rows']} rows, key={key})")
+    return header
+
+
+def list_tables() -> list[dict]:
+    if not os.path.isdir(REFERENCE_DATA_DIR):
+        return []
+    tables = []
+    for filename in sorted(os.listdir(REFERENCE_DATA_DIR)):
+        if not filename.endswith(FILE_SUFFIX):
+            continue
+        path = os.path.join(REFERENCE_DATA_DIR, filename)
+        try:
+            tables.append({**read_header(path), "size_bytes": os.path.getsize(path)})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable reference table {filename}: {e}")
+    return tables
+
+
+def delete_table(name: str) -> bool:
+    """
+    Workers that already opened the table keep reading their mapping of it
+    """
+    path = table_path(name, REFERENCE_DATA_DIR)
+    if not os.path.exists(path):
+        return False
+    os.remove(path)
+    logger.info(f"Deleted reference table '{name}'")
+    return True
+
+
+def worker_volumes() -> dict:
+    """
+    Volume spec giving workers read-only access to the tables
+    """
+    if not REFERENCE_VOLUME:
+        return {}
+    return {REFERENCE_VOLUME: {"bind": WORKER_REFERENCE_DIR, "mode": "ro"}}
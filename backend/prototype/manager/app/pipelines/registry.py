@@ -1,9 +1,21 @@
 # app/pipelines/registry.py
+import json
+import os
 from typing import Dict
 from threading import Lock
 from datetime import datetime
 from zoneinfo import ZoneInfo
+from app.pipelines.archive import RunArchive
 from app.pipelines.models import PipelineStatus
+from app.pipelines.store import RegistryStore
+from app.sharding import is_local
+from shared.metrics import LATENCY_STAGES, LatencyHistogram
+
+TERMINAL_STATUSES = (PipelineStatus.COMPLETED, PipelineStatus.FAILED, PipelineStatus.ABORTED)
+
+# Finished pipelines are kept in memory for at most this long / this many
+REGISTRY_FINISHED_TTL = float(os.environ.get("REGISTRY_FINISHED_TTL", "3600"))
+REGISTRY_MAX_FINISHED = int(os.environ.get("REGISTRY_MAX_FINISHED", "200"))
 
 
 class PipelineState:
@@ -14,8 +26,109 @@ class PipelineState:
         self.status = PipelineStatus.STARTING
         self.message = "Pipeline initialized"
         self.created_at = datetime.now(ZoneInfo("Europe/Berlin"))
+        self.finished_at: datetime | None = None
+        # Rows entering the first segment and leaving the last one, from the workers' counters
+        self.rows_in = 0
+        self.rows_out = 0
+        # segment_index -> worker hostname -> latest cumulative throughput report of the worker
+        self.throughput: dict[int, dict[str, dict]] = {}
+        # segment_index -> stage -> cumulative latency histogram reported by the worker
+        self.latency: dict[int, dict[str, LatencyHistogram]] = {}
+        # segment_index -> latest sampled transformation error counters of the segment's worker
+        self.errors: dict[int, dict] = {}
+        # segment_index -> summary reported by a worker that stopped itself (e.g. a finished backfill)
+        self.segment_summaries: dict[int, dict] = {}
+        # worker hostname -> cumulative {label: {"script", "calls", "seconds"}} of its transformations
+        self.costs: dict[str, dict] = {}
+        # segment_index -> latest on-demand profiling report of the segment's worker
+        self.profiles: dict[int, dict] = {}
         self.lock = Lock()
         self._completion_emitted = False
+        # segment_index -> {"status", "started_at", "definition"}, used for crash recovery
+        self.segments: dict[int, dict] = {}
+
+    def to_record(self) -> tuple:
+        return (
+            self.pipeline_id,
+            self.status.value,
+            self.completed_segments,
+            self.total_segments,
+            json.dumps(self.message),
+            self.created_at.isoformat(),
+            self.finished_at.isoformat() if self.finished_at else None,
+            self.rows_in,
+            self.rows_out,
+        )
+
+    def finish(self, status: PipelineStatus, message):
+        self.status = status
+        self.message = message
+        self.finished_at = datetime.now(ZoneInfo("Europe/Berlin"))
+
+    def latency_summary(self) -> dict:
+        segments = {
+            idx: {stage: h.summary() for stage, h in stages.items()}
+            for idx, stages in sorted(self.latency.items())
+        }
+        # Rows carry their origin across segments, so the last segment's
+        # end-to-end latency is the latency of the whole pipeline
+        pipeline = segments[max(segments)]["end_to_end"] if segments else None
+        return {"pipeline": pipeline, "segments": segments}
+
+    def to_summary(self) -> dict:
+        """
+        Final run summary written to the archive before eviction
+        """
+        end = self.finished_at or datetime.now(ZoneInfo("Europe/Berlin"))
+        duration = (end - self.created_at).total_seconds()
+        return {
+            "pipeline_id": self.pipeline_id,
+            "status": self.status.value,
+            "message": self.message,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": end.isoformat(),
+            "duration_s": round(duration, 3),
+            "completed_segments": self.completed_segments,
+            "total_segments": self.total_segments,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_out_per_s": round(self.rows_out / duration, 3) if duration > 0 else None,
+            "latency_ms": self.latency_summary(),
+            "errors": self.error_summary(),
+            "segment_summaries": dict(sorted(self.segment_summaries.items())),
+            "transformation_costs": self.cost_summary(),
+        }
+
+    def cost_summary(self) -> dict:
+        """
+        Measured calls and time per transformation script (by fingerprint), over all workers
+        """
+        by_script: dict[str, dict] = {}
+        for transformations in self.costs.values():
+            for cost in transformations.values():
+                if not cost.get("script"):
+                    continue
+                total = by_script.setdefault(cost["script"], {"calls": 0, "seconds": 0.0})
+                total["calls"] += cost.get("calls", 0)
+                total["seconds"] += cost.get("seconds", 0.0)
+        return by_script
+
+    def error_summary(self) -> dict:
+        return {
+            "total": sum(report.get("total", 0) for report in self.errors.values()),
+            "dead_lettered": sum(report.get("dead_lettered", 0) for report in self.errors.values()),
+            "segments": dict(sorted(self.errors.items())),
+        }
+
+    def segment_record(self, segment_index: int) -> tuple:
+        segment = self.segments[segment_index]
+        return (
+            self.pipeline_id,
+            segment_index,
+            segment["status"],
+            segment["started_at"],
+            json.dumps(segment["definition"]),
+        )
 
     def to_dict(self):
         return {
@@ -28,6 +141,54 @@ class PipelineState:
 
 
 PIPELINES: Dict[str, PipelineState] = {}
+STORE: RegistryStore | None = None
+ARCHIVE: RunArchive | None = None
+
+
+def _persist(pipeline: PipelineState, segment_index: int | None = None):
+    if STORE is None:
+        return
+    STORE.schedule_pipeline(pipeline.to_record())
+    if segment_index is not None and segment_index in pipeline.segments:
+        STORE.schedule_segment(pipeline.segment_record(segment_index))
+
+
+def open_store(store: RegistryStore, archive: RunArchive | None = None):
+    """
+    Attach the persistent store (and run archive) and rebuild PIPELINES from it.
+    Returns the number of pipelines loaded.
+    """
+    global STORE, ARCHIVE
+    STORE = store
+    ARCHIVE = archive
+
+    pipelines, segments = store.load()
+    # The store may be shared by several manager shards; only load our own pipelines
+    pipelines = [row for row in pipelines if is_local(row[0])]
+    for (
+        pipeline_id, status, completed, total, message, created_at, finished_at, rows_in, rows_out,
+    ) in pipelines:
+        pipeline = PipelineState(pipeline_id=pipeline_id, total_segments=total)
+        pipeline.status = PipelineStatus(status)
+        pipeline.completed_segments = completed
+        pipeline.message = json.loads(message)
+        pipeline.created_at = datetime.fromisoformat(created_at)
+        pipeline.finished_at = datetime.fromisoformat(finished_at) if finished_at else None
+        pipeline.rows_in = rows_in
+        pipeline.rows_out = rows_out
+        pipeline._completion_emitted = pipeline.status == PipelineStatus.COMPLETED
+        PIPELINES[pipeline_id] = pipeline
+
+    for pipeline_id, segment_index, status, started_at, definition in segments:
+        pipeline = PIPELINES.get(pipeline_id)
+        if pipeline:
+            pipeline.segments[segment_index] = {
+                "status": status,
+                "started_at": started_at,
+                "definition": definition,
+            }
+
+    return len(pipelines)
 
 
 def init_pipeline(pipeline_id: str, total_segments: int):
@@ -38,10 +199,61 @@ def init_pipeline(pipeline_id: str, total_segments: int):
         pipeline_id=pipeline_id,
         total_segments=total_segments,
     )
+    _persist(PIPELINES[pipeline_id])
     return PIPELINES[pipeline_id]
 
 
-def segment_completed(pipeline_id: str) -> bool:
+def register_segment(pipeline_id: str, segment_index: int, definition: dict, started_at: float):
+    """
+    Remember a launched segment so its containers can be reattached after a restart
+    """
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline:
+        return
+
+    with pipeline.lock:
+        pipeline.segments[segment_index] = {
+            "status": "running",
+            "started_at": started_at,
+            "definition": definition,
+        }
+        _persist(pipeline, segment_index)
+
+
+def get_running_segments() -> list[tuple[str, int, float, dict]]:
+    """
+    Returns (pipeline_id, segment_index, started_at, definition) of every segment
+    that was still running in a non-terminal pipeline
+    """
+    running = []
+    for pipeline in list(PIPELINES.values()):
+        if pipeline.status in TERMINAL_STATUSES:
+            continue
+        for segment_index, segment in pipeline.segments.items():
+            if segment["status"] == "running":
+                running.append((pipeline.pipeline_id, segment_index, segment["started_at"], segment["definition"]))
+    return running
+
+
+def get_upstream_segment(pipeline_id: str, input_topic: str) -> tuple[int, str] | None:
+    """
+    (segment_index, status) of the segment producing to `input_topic`, if registered
+    """
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline:
+        return None
+    for segment_index, segment in list(pipeline.segments.items()):
+        definition = segment["definition"]
+        # A chain is registered under its head but produces the output of its tail
+        chained = definition.get("chained")
+        if chained:
+            segment_index, definition = chained[-1]
+        if definition.get("output_topic") == input_topic:
+            return segment_index, segment["status"]
+    return None
+
+
+def segment_completed(pipeline_id: str, segment_index: int | None = None) -> bool:
     """
     Returns True ONLY if pipeline transitions to COMPLETED
     """
@@ -55,10 +267,15 @@ def segment_completed(pipeline_id: str) -> bool:
 
         pipeline.status = PipelineStatus.RUNNING
         pipeline.completed_segments += 1
+        if segment_index in pipeline.segments:
+            pipeline.segments[segment_index]["status"] = "completed"
 
         if pipeline.completed_segments >= pipeline.total_segments:
-            pipeline.status = PipelineStatus.COMPLETED
-            pipeline.message = "Pipeline completed"
+            pipeline.finish(PipelineStatus.COMPLETED, "Pipeline completed")
+
+        _persist(pipeline, segment_index)
+
+        if pipeline.status == PipelineStatus.COMPLETED:
             if not pipeline._completion_emitted:
                 pipeline._completion_emitted = True
                 return True
@@ -75,8 +292,8 @@ def fail_pipeline(pipeline_id: str, message: str):
         if pipeline.status in (PipelineStatus.COMPLETED, PipelineStatus.FAILED, PipelineStatus.ABORTED):
             return
 
-        pipeline.status = PipelineStatus.FAILED
-        pipeline.message = message
+        pipeline.finish(PipelineStatus.FAILED, message)
+        _persist(pipeline)
 
 def abort_pipeline(pipeline_id: str, message: str = "User aborted pipeline"):
     pipeline = PIPELINES.get(pipeline_id)
@@ -91,11 +308,148 @@ def abort_pipeline(pipeline_id: str, message: str = "User aborted pipeline"):
         ):
             return False
 
-        pipeline.status = PipelineStatus.ABORTED
-        pipeline.message = message
+        pipeline.finish(PipelineStatus.ABORTED, message)
+        _persist(pipeline)
 
     return True
 
 def get_pipeline(pipeline_id: str):
     pipeline = PIPELINES.get(pipeline_id)
     return pipeline.to_dict() if pipeline else None
+
+
+def record_throughput(pipeline_id: str, segment_index: int | None, report: dict):
+    """
+    Keep a worker's cumulative row counters; the newest report per worker wins.
+    The pipeline counts the rows its first segment consumed and its last one produced.
+    """
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline or segment_index is None or not report.get("worker"):
+        return
+    pipeline.throughput.setdefault(segment_index, {})[report["worker"]] = report
+
+    last_segment = pipeline.total_segments - 1
+    pipeline.rows_in = sum(r.get("rows_in", 0) for r in pipeline.throughput.get(0, {}).values())
+    pipeline.rows_out = sum(
+        r.get("rows_out", 0)
+        for idx, reports in pipeline.throughput.items()
+        for r in reports.values()
+        # A worker running chained segments reports the rows leaving the last of them
+        if r.get("last_segment", idx) == last_segment
+    )
+
+
+def record_latency(pipeline_id: str, segment_index: int | None, report: dict):
+    """
+    Merge a worker's interval latency report into the segment's cumulative histograms
+    """
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline or segment_index is None:
+        return
+
+    stages = pipeline.latency.setdefault(
+        segment_index, {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+    )
+    for stage, data in (report.get("stages") or {}).items():
+        if stage in stages:
+            stages[stage].merge(LatencyHistogram.from_dict(data.get("buckets", {})))
+
+
+def record_costs(pipeline_id: str, report: dict):
+    """
+    Keep a worker's cumulative transformation costs; the newest report per worker wins
+    """
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline or not report.get("worker"):
+        return
+    pipeline.costs[report["worker"]] = report.get("transformations") or {}
+
+
+def get_latency(pipeline_id: str) -> dict | None:
+    pipeline = PIPELINES.get(pipeline_id)
+    return pipeline.latency_summary() if pipeline else None
+
+
+def record_errors(pipeline_id: str, segment_index: int | None, report: dict):
+    """
+    Keep a worker's latest error counters; they are cumulative, so the newest report wins
+    """
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline or segment_index is None:
+        return
+    pipeline.errors[segment_index] = report
+
+
+def record_segment_summary(pipeline_id: str, segment_index: int | None, summary: dict):
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline or segment_index is None:
+        return
+    pipeline.segment_summaries[segment_index] = summary
+
+
+def get_errors(pipeline_id: str) -> dict | None:
+    pipeline = PIPELINES.get(pipeline_id)
+    return pipeline.error_summary() if pipeline else None
+
+
+def record_profile(pipeline_id: str, segment_index: int | None, report: dict):
+    pipeline = PIPELINES.get(pipeline_id)
+    if not pipeline or segment_index is None:
+        return
+    pipeline.profiles[segment_index] = report
+
+
+def get_profiles(pipeline_id: str) -> dict | None:
+    pipeline = PIPELINES.get(pipeline_id)
+    return dict(sorted(pipeline.profiles.items())) if pipeline else None
+
+
+def evict_finished_pipelines(
+    ttl: float = REGISTRY_FINISHED_TTL,
+    max_finished: int = REGISTRY_MAX_FINISHED,
+) -> int:
+    """
+    Archive and drop finished pipelines that are older than `ttl` seconds,
+    and the oldest ones beyond `max_finished`. Returns the number evicted.
+    """
+    now = datetime.now(ZoneInfo("Europe/Berlin"))
+    finished = sorted(
+        (p for p in list(PIPELINES.values()) if p.status in TERMINAL_STATUSES),
+        key=lambda p: p.finished_at or p.created_at,
+    )
+    overflow = max(0, len(finished) - max_finished)
+
+    evicted = []
+    for idx, pipeline in enumerate(finished):
+        finished_at = pipeline.finished_at or pipeline.created_at
+        if idx < overflow or (now - finished_at).total_seconds() > ttl:
+            evicted.append(pipeline)
+
+    if not evicted:
+        return 0
+
+    if ARCHIVE is not None:
+        ARCHIVE.append([p.to_summary() for p in evicted])
+
+    for pipeline in evicted:
+        PIPELINES.pop(pipeline.pipeline_id, None)
+        if STORE is not None:
+            STORE.schedule_delete(pipeline.pipeline_id)
+
+    return len(evicted)
+
+
+def get_cost_history(limit: int = 500) -> list[dict]:
+    """
+    Measured transformation costs of live and archived runs, newest first
+    """
+    history = [pipeline.cost_summary() for pipeline in list(PIPELINES.values())]
+    if ARCHIVE:
+        history += [run.get("transformation_costs") or {} for run in ARCHIVE.query(limit=limit)]
+    return [costs for costs in history if costs]
+
+
+def get_archived_runs(pipeline_id: str | None = None, limit: int = 100) -> list[dict]:
+    if ARCHIVE is None:
+        return []
+    return ARCHIVE.query(pipeline_id=pipeline_id, limit=limit)
@@ -0,0 +1,174 @@
+# app/pipelines/store.py
+import json
+import os
+import sqlite3
+import threading
+
+from shared.logger import get_logger
+
+logger = get_logger("RegistryStore")
+
+REGISTRY_DB_PATH = os.environ.get("REGISTRY_DB_PATH", "data/registry.db")
+REGISTRY_FLUSH_INTERVAL = float(os.environ.get("REGISTRY_FLUSH_INTERVAL", "0.5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipelines (
+    pipeline_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    completed_segments INTEGER NOT NULL,
+    total_segments INTEGER NOT NULL,
+    message TEXT,
+    created_at TEXT NOT NULL,
+    finished_at TEXT,
+    rows_in INTEGER NOT NULL DEFAULT 0,
+    rows_out INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS segments (
+    pipeline_id TEXT NOT NULL,
+    segment_index INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    definition TEXT NOT NULL,
+    PRIMARY KEY (pipeline_id, segment_index)
+);
+"""
+# Columns added after a table was first released, added to existing databases on startup
+MIGRATIONS = {
+    "pipelines": [
+        ("finished_at", "TEXT"),
+        ("rows_in", "INTEGER NOT NULL DEFAULT 0"),
+        ("rows_out", "INTEGER NOT NULL DEFAULT 0"),
+    ],
+}
+
+
+def migrate(conn: sqlite3.Connection):
+    for table, columns in MIGRATIONS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns:
+            if name in existing:
+                continue
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                logger.info(f"Migrated registry: added {table}.{name}")
+            except sqlite3.OperationalError as e:
+                # Another shard added it in the meantime
+                if "duplicate column" not in str(e):
+                    raise
+    conn.commit()
+
+
+class RegistryStore:
+    def __init__(self, path: str = REGISTRY_DB_PATH, flush_interval: float = REGISTRY_FLUSH_INTERVAL):
+        """
+        SQLite (WAL mode) persistence for the pipeline registry.
+
+        Writes are write-behind: callers only record the latest snapshot of a
+        pipeline or segment in memory, and a background thread flushes all
+        pending snapshots in one transaction every `flush_interval` seconds.
+
+        Parameters
+        ----------
+        path : str
+            Location of the SQLite database file.
+        flush_interval : float
+            Seconds between two flushes.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Sharded managers share the database, so wait for the other writers' locks
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        migrate(self.conn)
+
+        self.flush_interval = flush_interval
+        self._pending_pipelines: dict[str, tuple] = {}
+        self._pending_segments: dict[tuple[str, int], tuple] = {}
+        self._pending_deletes: set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # -----------------------------
+    # Write-behind
+    # -----------------------------
+    def schedule_pipeline(self, record: tuple):
+        with self._pending_lock:
+            self._pending_pipelines[record[0]] = record
+            self._pending_deletes.discard(record[0])
+
+    def schedule_segment(self, record: tuple):
+        with self._pending_lock:
+            self._pending_segments[(record[0], record[1])] = record
+
+    def schedule_delete(self, pipeline_id: str):
+        with self._pending_lock:
+            self._pending_deletes.add(pipeline_id)
+
+    def flush(self):
+        with self._pending_lock:
+            pipelines = list(self._pending_pipelines.values())
+            segments = list(self._pending_segments.values())
+            deletes = [(pipeline_id,) for pipeline_id in self._pending_deletes]
+            self._pending_pipelines.clear()
+            self._pending_segments.clear()
+            self._pending_deletes.clear()
+
+        if not pipelines and not segments and not deletes:
+            return
+
+        with self._db_lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pipelines "
+                "(pipeline_id, status, completed_segments, total_segments, message, created_at, "
+                "finished_at, rows_in, rows_out) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                pipelines,
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO segments "
+                "(pipeline_id, segment_index, status, started_at, definition) "
+                "VALUES (?, ?, ?, ?, ?)",
+                segments,
+            )
+            self.conn.executemany("DELETE FROM pipelines WHERE pipeline_id = ?", deletes)
+            self.conn.executemany("DELETE FROM segments WHERE pipeline_id = ?", deletes)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="registry-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception(f"Failed to flush registry: {e}")
+
+    # -----------------------------
+    # Recovery
+    # -----------------------------
+    def load(self) -> tuple[list[tuple], list[tuple]]:
+        """
+        Returns all persisted pipeline rows and segment rows.
+        """
+        with self._db_lock:
+            pipelines = self.conn.execute(
+                "SELECT pipeline_id, status, completed_segments, total_segments, message, created_at, "
+                "finished_at, rows_in, rows_out FROM pipelines"
+            ).fetchall()
+            segments = self.conn.execute(
+                "SELECT pipeline_id, segment_index, status, started_at, definition FROM segments"
+            ).fetchall()
+        return pipelines, [(*row[:4], json.loads(row[4])) for row in segments]
@@ -0,0 +1,62 @@
+# app/serve.py
+import os
+import signal
+import subprocess
+import sys
+
+from shared.logger import get_logger
+
+logger = get_logger("Serve")
+
+UVICORN_ARGS = ["app.main:app", "--host", "0.0.0.0", "--ws-per-message-deflate", "true"]
+
+
+def main():
+    """
+    Start the manager.
+
+    With MANAGER_SHARDS > 1, one uvicorn process per shard is started on consecutive
+    ports from MANAGER_PORT. Each shard owns the pipelines that hash to it and
+    forwards everything else, so any port can be used by clients.
+    """
+    shards = int(os.environ.get("MANAGER_SHARDS", "1"))
+    base_port = int(os.environ.get("MANAGER_PORT", "8000"))
+    uvicorn = [sys.executable, "-m", "uvicorn", *UVICORN_ARGS]
+
+    if shards <= 1:
+        os.execv(sys.executable, [*uvicorn, "--port", str(base_port)])
+
+    host = os.environ.get("MANAGER_SHARD_HOST", "backend")
+    shard_urls = ",".join(f"http://{host}:{base_port + idx}" for idx in range(shards))
+    logger.info(f"Starting {shards} manager shards: {shard_urls}")
+
+    processes = [
+        subprocess.Popen(
+            [*uvicorn, "--port", str(base_port + idx)],
+            env={**os.environ, "SHARD_INDEX": str(idx), "MANAGER_SHARD_URLS": shard_urls},
+        )
+        for idx in range(shards)
+    ]
+
+    def terminate(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+
+    # If any shard dies, take the others down so the container restarts as a whole
+    exit_code = 0
+    try:
+        os.wait()
+    except ChildProcessError:
+        pass
+    finally:
+        terminate(None, None)
+        for process in processes:
+            exit_code = max(exit_code, process.wait())
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# app/sharding.py
+import bisect
+import hashlib
+import os
+
+import httpx
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+# Comma-separated base URLs of all manager shards, e.g. "http://backend:8000,http://backend:8001".
+# Empty (the default) runs the manager as a single, unsharded process.
+SHARD_URLS = [url.strip().rstrip("/") for url in os.environ.get("MANAGER_SHARD_URLS", "").split(",") if url.strip()]
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", "0"))
+SHARDED = len(SHARD_URLS) > 1
+
+# Set on forwarded requests so a misconfigured ring can never bounce a request forever
+FORWARDED_HEADER = "X-Shard-Forwarded"
+
+VIRTUAL_NODES = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, shards: list[str], virtual_nodes: int = VIRTUAL_NODES):
+        """
+        Consistent hash ring mapping pipeline ids to shard indices.
+
+        Parameters
+        ----------
+        shards : list[str]
+            Shard identifiers (their base URLs).
+        virtual_nodes : int
+            Points per shard on the ring, smoothing the distribution.
+        """
+        points = sorted(
+            (_hash(f"{shard}#{v}"), idx)
+            for idx, shard in enumerate(shards)
+            for v in range(virtual_nodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [idx for _, idx in points]
+
+    def owner(self, key: str) -> int:
+        pos = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._shards[pos]
+
+
+RING = HashRing(SHARD_URLS) if SHARDED else None
+
+
+def owner_index(pipeline_id: str) -> int:
+    return RING.owner(pipeline_id) if RING else SHARD_INDEX
+
+
+def is_local(pipeline_id: str) -> bool:
+    """
+    True if this process owns the pipeline (always True when unsharded)
+    """
+    return owner_index(pipeline_id) == SHARD_INDEX
+
+
+def should_forward(request: Request, pipeline_id: str) -> bool:
+    """
+    True if the request has to be handled by another shard
+    """
+    return SHARDED and not is_local(pipeline_id) and FORWARDED_HEADER not in request.headers
+
+
+def owner_url(pipeline_id: str) -> str:
+    return SHARD_URLS[owner_index(pipeline_id)]
+
+
+def own_url() -> str | None:
+    return SHARD_URLS[SHARD_INDEX] if SHARDED else None
+
+
+def peer_urls() -> list[str]:
+    return [url for idx, url in enumerate(SHARD_URLS) if idx != SHARD_INDEX]
+
+
+def _to_response(response: httpx.Response) -> Response:
+    try:
+        content = response.json()
+    except ValueError:
+        # e.g. a plain-text 500 from the peer's server, relay it as it is
+        return Response(
+            status_code=response.status_code,
+            content=response.content,
+            media_type=response.headers.get("content-type"),
+        )
+    return JSONResponse(status_code=response.status_code, content=content)
+
+
+def _unreachable(pipeline_id: str, e: httpx.TransportError) -> HTTPException:
+    return HTTPException(
+        status_code=502,
+        detail=f"Shard {owner_index(pipeline_id)} ({owner_url(pipeline_id)}) owning pipeline {pipeline_id} is unreachable: {e}",
+    )
+
+
+def forward_sync(pipeline_id: str, method: str, path: str, json=None) -> Response:
+    try:
+        response = httpx.request(
+            method,
+            f"{owner_url(pipeline_id)}{path}",
+            json=json,
+            headers={FORWARDED_HEADER: "1"},
+            timeout=10,
+        )
+    except httpx.TransportError as e:
+        raise _unreachable(pipeline_id, e) from e
+    return _to_response(response)
+
+
+_async_client: httpx.AsyncClient | None = None
+
+
+async def forward(pipeline_id: str, method: str, path: str, json=None) -> Response:
+    global _async_client
+    if _async_client is None:
+        # Shared so forwarded requests reuse keep-alive connections to peer shards
+        _async_client = httpx.AsyncClient(timeout=10)
+
+    try:
+        response = await _async_client.request(
+            method,
+            f"{owner_url(pipeline_id)}{path}",
+            json=json,
+            headers={FORWARDED_HEADER: "1"},
+        )
+    except httpx.TransportError as e:
+        raise _unreachable(pipeline_id, e) from e
+    return _to_response(response)
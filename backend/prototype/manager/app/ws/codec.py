@@ -0,0 +1,82 @@
+# app/ws/codec.py
+import struct
+
+import msgpack
+
+# Encodings a client can request via `/ws/stream?encoding=...`
+JSON_ENCODING = "json"
+BINARY_ENCODING = "binary"
+SUPPORTED_ENCODINGS = (JSON_ENCODING, BINARY_ENCODING)
+# Row layouts remembered per connection; beyond it the dictionary starts over
+MAX_SCHEMAS = 256
+
+
+def _is_float_value(value) -> bool:
+    # ints (and bools, a subclass of int) travel as MessagePack values, keeping
+    # their type and precision beyond 2^53
+    return isinstance(value, float)
+
+
+class BinaryStreamEncoder:
+    """
+    Per-connection encoder for the opt-in binary protocol on `/ws/stream`.
+
+    Every frame is MessagePack. Lifecycle (and any non-row) messages are sent
+    as plain maps, identical in shape to the JSON protocol. Stream rows are
+    sent as compact arrays against a per-connection key dictionary:
+
+    - the first time a row layout is seen, a schema map is sent:
+      ``{"category": "schema", "id": <int>, "float_keys": [...], "other_keys": [...]}``
+    - every row with that layout is then sent as:
+      ``[<schema id>, pipeline_id, segment_index, type, topic, <float64 LE bytes>, [other values]]``
+
+    so channel names are transferred once per subscription instead of once
+    per row, and float channels travel as a packed float array.
+
+    At most MAX_SCHEMAS layouts are kept per connection. Beyond that, ids are
+    reused from 0. A schema map is always sent before its id is used again,
+    so clients simply replace the schema they keep for that id.
+    """
+
+    def __init__(self):
+        self.schemas: dict[tuple, int] = {}
+
+    def encode(self, message: dict) -> list[bytes]:
+        data = message.get("data")
+        if message.get("category") != "stream" or not isinstance(data, dict):
+            return [msgpack.packb(message, default=str)]
+
+        float_keys = []
+        other_keys = []
+        for key, value in data.items():
+            if _is_float_value(value):
+                float_keys.append(key)
+            else:
+                other_keys.append(key)
+
+        frames = []
+        layout = (tuple(float_keys), tuple(other_keys))
+        schema_id = self.schemas.get(layout)
+        if schema_id is None:
+            if len(self.schemas) >= MAX_SCHEMAS:
+                self.schemas.clear()
+            schema_id = len(self.schemas)
+            self.schemas[layout] = schema_id
+            frames.append(msgpack.packb({
+                "category": "schema",
+                "id": schema_id,
+                "float_keys": float_keys,
+                "other_keys": other_keys,
+            }))
+
+        floats = struct.pack(f"<{len(float_keys)}d", *(data[k] for k in float_keys))
+        frames.append(msgpack.packb([
+            schema_id,
+            message.get("pipeline_id"),
+            message.get("segment_index"),
+            message.get("type"),
+            message.get("topic"),
+            floats,
+            [data[k] for k in other_keys],
+        ], default=str))
+        return frames
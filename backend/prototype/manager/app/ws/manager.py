@@ -1,30 +1,90 @@
 # app/ws/manager.py
+import json
+
 from fastapi import WebSocket
 from shared.logger import get_logger
 
+from app.ws.codec import BINARY_ENCODING, JSON_ENCODING, BinaryStreamEncoder
+
 logger = get_logger("WSConnectionManager")
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: list[WebSocket] = []
+        # Connections that opted into the binary protocol, with their key dictionary
+        self.binary_encoders: dict[WebSocket, BinaryStreamEncoder] = {}
+        # Connections restricted to a single pipeline (unlisted connections watch all)
+        self.subscriptions: dict[WebSocket, str] = {}
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(
+        self,
+        websocket: WebSocket,
+        encoding: str = JSON_ENCODING,
+        pipeline_id: str | None = None,
+    ):
         await websocket.accept()
         self.active_connections.append(websocket)
+        if encoding == BINARY_ENCODING:
+            self.binary_encoders[websocket] = BinaryStreamEncoder()
+        if pipeline_id:
+            self.subscriptions[websocket] = pipeline_id
+
+    def subscribe(self, websocket: WebSocket, pipeline_id: str | None):
+        """
+        Restrict a connection to one pipeline, or to all of them with None
+        """
+        if pipeline_id:
+            self.subscriptions[websocket] = pipeline_id
+        else:
+            self.subscriptions.pop(websocket, None)
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self.binary_encoders.pop(websocket, None)
+        self.subscriptions.pop(websocket, None)
+
+    def is_observed(self, pipeline_id: str) -> bool:
+        """
+        Returns True if at least one connected client subscribed to this pipeline.
+
+        Connections watching all pipelines (including relays for such clients)
+        do not count, otherwise every pipeline would always be observed; they
+        receive the stream rows of pipelines someone else subscribed to.
+        """
+        return pipeline_id in self.subscriptions.values()
+
+    async def send(self, websocket: WebSocket, message: dict, json_text: str | None = None) -> str | None:
+        """
+        Send one message to one connection in its negotiated encoding.
+        Returns the JSON text used, so callers can reuse it for other JSON clients.
+        """
+        encoder = self.binary_encoders.get(websocket)
+        if encoder:
+            for frame in encoder.encode(message):
+                await websocket.send_bytes(frame)
+            return json_text
+
+        if json_text is None:
+            json_text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        await websocket.send_text(json_text)
+        return json_text
 
     async def broadcast(self, message: dict):
         to_remove = []
+        # Serialize once for all JSON clients instead of once per connection
+        json_text = None
+        pipeline_id = message.get("pipeline_id")
         for ws in list(self.active_connections):
+            subscribed_to = self.subscriptions.get(ws)
+            if subscribed_to is not None and subscribed_to != pipeline_id:
+                continue
             try:
-                await ws.send_json(message)
+                json_text = await self.send(ws, message, json_text)
 
             except Exception as e:
                 logger.exception(f"Unexpected WebSocket error: {e}")
                 to_remove.append(ws)
 
         for ws in to_remove:
-            self.disconnect(ws)
\ No newline at end of file
+            self.disconnect(ws)
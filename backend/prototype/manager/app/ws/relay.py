@@ -0,0 +1,57 @@
+# app/ws/relay.py
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import websockets
+from fastapi import WebSocket
+from shared.logger import get_logger
+
+from app.sharding import owner_url, peer_urls
+from app.ws.manager import ConnectionManager
+
+logger = get_logger("WSRelay")
+
+RECONNECT_DELAY = 1.0
+
+
+def start_peer_relays(
+    manager: ConnectionManager,
+    websocket: WebSocket,
+    pipeline_id: str | None,
+) -> list[asyncio.Task]:
+    """
+    In sharded mode, pipe events owned by other shards to a locally connected client.
+
+    A client watching one pipeline gets a relay from that pipeline's owner only
+    (none if it is owned locally); a client watching everything gets one relay per peer.
+    """
+    if pipeline_id:
+        peers = [url for url in peer_urls() if url == owner_url(pipeline_id)]
+    else:
+        peers = peer_urls()
+
+    return [
+        asyncio.create_task(_relay(manager, websocket, peer, pipeline_id))
+        for peer in peers
+    ]
+
+
+async def _relay(manager: ConnectionManager, websocket: WebSocket, peer_url: str, pipeline_id: str | None):
+    # Relays always speak JSON and ask only for the peer's own events;
+    # the local connection re-encodes them for the client
+    params = {"scope": "local"}
+    if pipeline_id:
+        params["pipeline_id"] = pipeline_id
+    url = f"{peer_url.replace('http', 'ws', 1)}/ws/stream?{urlencode(params)}"
+
+    while True:
+        try:
+            async with websockets.connect(url) as peer:
+                async for raw in peer:
+                    await manager.send(websocket, json.loads(raw))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Relay from {peer_url} interrupted: {e}")
+        await asyncio.sleep(RECONNECT_DELAY)
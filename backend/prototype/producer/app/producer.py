@@ -9,6 +9,7 @@ from quixstreams.models.messages import KafkaMessage
 
 from shared.logger import get_logger
 from shared.events import emit_event
+from shared.metrics import MetricsRegistry, RateMeter, origin_header, start_metrics_server
 import os
 import traceback
 
@@ -31,6 +32,14 @@ class Producer:
         frequency : float
             The frequency (in Hz) at which to produce messages.
         """
+        # Metrics served on an internal port and scraped by the manager
+        self.metrics = MetricsRegistry("pipeline_producer")
+        self.metrics.counter("rows_out_total", "Rows produced to the topic")
+        self.metrics.counter("serialization_seconds_total", "Cumulative time spent serializing rows")
+        self.metrics.counter("produce_errors_total", "Errors raised while producing to the topic")
+        self.rate = RateMeter()
+        self.metrics.gauge("rows_out_per_second", "Current output rate", self.rate.rate)
+
         # Initialize the Quix Application with the specified broker address
         self.app = Application(broker_address=broker_address)
 
@@ -56,6 +65,8 @@ class Producer:
         # Log the production details
         self._log_details()
 
+        start_metrics_server(self.metrics)
+
         self._produce()
 
     def _produce(self) -> None:
@@ -82,24 +93,34 @@ class Producer:
         Produce a Kafka message with the given timestamp.
         """
         # Generate current UTC timestamp in ISO format
-        iso_timestamp = datetime.now(timezone.utc).isoformat()
+        origin_ns = time.time_ns()
+        iso_timestamp = datetime.fromtimestamp(origin_ns / 1e9, timezone.utc).isoformat()
 
         # Generate Kafka message
         message = self._generate_kafka_message(timestamp=iso_timestamp)
 
-        # Produce the message to the topic
-        self.producer.produce(
-            topic=self.topic.name,
-            value=message.value,
-            key=message.key
-        )
+        # Produce the message to the topic, stamped with its origin time for latency tracing
+        try:
+            self.producer.produce(
+                topic=self.topic.name,
+                value=message.value,
+                key=message.key,
+                headers=[origin_header(origin_ns)],
+            )
+        except Exception:
+            self.metrics.inc("produce_errors_total")
+            raise
+        self.metrics.inc("rows_out_total")
+        self.rate.mark()
 
     def _generate_kafka_message(self, timestamp: str) -> KafkaMessage:
         """
         Generate a Kafka message with the specified timestamp and key.
         """
         value = self._generate_value(timestamp=timestamp)
+        start = time.perf_counter()
         kafkaMessage = self.topic.serialize(key="DefaultKey", value=value)
+        self.metrics.inc("serialization_seconds_total", time.perf_counter() - start)
 
         return kafkaMessage
 
@@ -1,4 +1,5 @@
 from .models import Event
 from .emit import emit_event
+from .observe import ObservationPoller
 
-__all__ = ["Event", "emit_event"]
+__all__ = ["Event", "emit_event", "ObservationPoller"]
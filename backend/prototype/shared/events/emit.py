@@ -1,3 +1,4 @@
+import atexit
 import os
 import requests
 from .models import Event
@@ -7,6 +8,36 @@ logger = get_logger("EventEmitter")
 
 FASTAPI_EVENT_ENDPOINT = os.getenv("FASTAPI_EVENT_ENDPOINT", "http://backend:8000/stream/event")
 
+# "http" posts every event to the backend, "kafka" produces it to EVENTS_TOPIC
+EVENT_TRANSPORT = os.getenv("EVENT_TRANSPORT", "http")
+EVENTS_TOPIC = os.getenv("EVENTS_TOPIC", "pipeline-events")
+BROKER_ADDRESS = os.getenv("BROKER_ADDRESS", "redpanda:9092")
+
+_kafka_producer = None
+
+
+def _get_kafka_producer():
+    """
+    Lazily create the process-wide Kafka producer used for events.
+    """
+    global _kafka_producer
+    if _kafka_producer is None:
+        from confluent_kafka import Producer
+
+        _kafka_producer = Producer({
+            "bootstrap.servers": BROKER_ADDRESS,
+            "linger.ms": 20,
+            "compression.type": "lz4",
+        })
+        # Deliver buffered events (e.g. a final "failed") before the process exits
+        atexit.register(_kafka_producer.flush, 5)
+    return _kafka_producer
+
+
+def _delivery_report(err, msg):
+    if err is not None:
+        logger.error(f"Failed to deliver event to '{msg.topic()}': {err}")
+
 
 def emit_event(**kwargs):
     """
@@ -16,10 +47,21 @@ def emit_event(**kwargs):
     event = Event(**kwargs)
 
     try:
-        requests.post(
-            FASTAPI_EVENT_ENDPOINT,
-            json=event.model_json_schema() and event.model_dump(),
-            timeout=0.3,
-        )
+        if EVENT_TRANSPORT == "kafka":
+            producer = _get_kafka_producer()
+            # Keyed by pipeline so all events of a pipeline stay ordered in one partition
+            producer.produce(
+                EVENTS_TOPIC,
+                key=event.pipeline_id,
+                value=event.model_dump_json(),
+                on_delivery=_delivery_report,
+            )
+            producer.poll(0)
+        else:
+            requests.post(
+                FASTAPI_EVENT_ENDPOINT,
+                json=event.model_json_schema() and event.model_dump(),
+                timeout=0.3,
+            )
     except Exception as e:
-        logger.exception(f"Failed to emit event: {e}")
\ No newline at end of file
+        logger.exception(f"Failed to emit event: {e}")
@@ -0,0 +1,60 @@
+import os
+import threading
+
+import requests
+
+from shared.logger import get_logger
+
+logger = get_logger("ObservationPoller")
+
+FASTAPI_OBSERVED_ENDPOINT = os.getenv("FASTAPI_OBSERVED_ENDPOINT", "http://backend:8000/stream/observed")
+OBSERVED_POLL_INTERVAL = float(os.getenv("OBSERVED_POLL_INTERVAL", "1.0"))
+
+
+class ObservationPoller:
+    def __init__(self, pipeline_id: str, interval: float = OBSERVED_POLL_INTERVAL):
+        """
+        Polls the backend in the background to find out whether any client
+        currently watches the stream events of a pipeline.
+
+        Parameters
+        ----------
+        pipeline_id : str
+            The pipeline whose observation state is polled.
+        interval : float
+            Seconds between two polls.
+        """
+        self.url = f"{FASTAPI_OBSERVED_ENDPOINT}/{pipeline_id}"
+        self.interval = interval
+        # Fail open: until the backend says otherwise, behave as before and emit
+        self.observed = True
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="observation-poller", daemon=True)
+
+    def start(self) -> "ObservationPoller":
+        """
+        Poll once synchronously, then keep polling in a daemon thread.
+        """
+        self._poll()
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._poll()
+
+    def _poll(self) -> None:
+        try:
+            response = requests.get(self.url, timeout=0.3)
+            response.raise_for_status()
+            observed = bool(response.json().get("observed", True))
+        except Exception as e:
+            logger.warning(f"Failed to poll observation state: {e}")
+            observed = True
+
+        if observed != self.observed:
+            logger.info(f"Stream telemetry {'enabled' if observed else 'paused'} (observed={observed})")
+        self.observed = observed
@@ -0,0 +1,20 @@
+from .costs import script_fingerprint
+from .exporter import METRICS_PORT, MetricsRegistry, RateMeter, start_metrics_server
+from .histogram import LatencyHistogram
+from .profiler import SamplingProfiler
+from .tracing import LATENCY_STAGES, ORIGIN_HEADER, LatencyTracker, origin_header, read_origin_ns
+
+__all__ = [
+    "METRICS_PORT",
+    "MetricsRegistry",
+    "RateMeter",
+    "start_metrics_server",
+    "LatencyHistogram",
+    "SamplingProfiler",
+    "LatencyTracker",
+    "LATENCY_STAGES",
+    "ORIGIN_HEADER",
+    "origin_header",
+    "read_origin_ns",
+    "script_fingerprint",
+]
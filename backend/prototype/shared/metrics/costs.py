@@ -0,0 +1,9 @@
+import hashlib
+
+
+def script_fingerprint(script: str) -> str:
+    """
+    Stable identifier of a transformation script, used to match measured costs
+    of the same script across pipelines and runs
+    """
+    return hashlib.sha1(script.strip().encode()).hexdigest()[:16]
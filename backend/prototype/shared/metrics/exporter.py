@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from shared.logger import get_logger
+
+logger = get_logger("MetricsExporter")
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+
+class RateMeter:
+    def __init__(self, window: int = 10):
+        """
+        Events per second over a sliding window of whole seconds.
+
+        Parameters
+        ----------
+        window : int
+            Number of completed seconds the rate is averaged over.
+        """
+        self.window = window
+        self._counts = [0] * (window + 1)
+        self._seconds = [0] * (window + 1)
+
+    def mark(self, n: int = 1) -> None:
+        second = int(time.monotonic())
+        slot = second % len(self._counts)
+        if self._seconds[slot] != second:
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += n
+
+    def rate(self) -> float:
+        # Only count completed seconds, so the current partial second does not drag the rate down
+        current = int(time.monotonic())
+        total = sum(
+            count
+            for count, second in zip(self._counts, self._seconds)
+            if current - self.window <= second < current
+        )
+        return total / self.window
+
+
+def escape_label_value(value) -> str:
+    # Backslashes, quotes and newlines would otherwise break the text exposition format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str):
+        """
+        Minimal in-process metrics registry rendered in the Prometheus text format.
+
+        Parameters
+        ----------
+        namespace : str
+            Prefix of all metric names, e.g. "pipeline_worker".
+        """
+        self.namespace = namespace
+        self._meta: dict[str, tuple[str, str]] = {}
+        self._values: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, Callable[[], float]] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._meta[name] = ("counter", help_text)
+        self._values.setdefault(name, {})
+
+    def gauge(self, name: str, help_text: str, func: Callable[[], float]) -> None:
+        self._meta[name] = ("gauge", help_text)
+        self._gauges[name] = func
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        series = self._values[name]
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def snapshot(self, name: str) -> dict[tuple, float]:
+        """
+        Current value of every label set of a counter
+        """
+        return dict(self._values[name])
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text) in self._meta.items():
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == "gauge":
+                lines.append(f"{full_name} {self._gauges[name]()}")
+                continue
+            for labels, value in list(self._values[name].items()):
+                label_str = ",".join(f'{k}="{escape_label_value(v)}"' for k, v in labels)
+                lines.append(f"{full_name}{{{label_str}}} {value}" if label_str else f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(
+    registry: MetricsRegistry,
+    port: int = METRICS_PORT,
+    actions: dict[str, Callable[[dict], dict]] | None = None,
+) -> ThreadingHTTPServer:
+    """
+    Serve `registry` on http://0.0.0.0:<port>/metrics from a daemon thread.
+
+    `actions` maps further paths to control hooks, invoked on POST with the query
+    parameters and answered with their JSON result.
+    """
+    actions = actions or {}
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            action = actions.get(url.path)
+            if action is None:
+                self.send_error(404)
+                return
+            try:
+                status, result = 202, action(dict(parse_qsl(url.query)))
+            except ValueError as e:
+                status, result = 400, {"error": str(e)}
+            body = json.dumps(result).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes are frequent; keep them out of the container logs
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on port {port}")
+    return server
@@ -0,0 +1,67 @@
+import math
+
+# Bucket boundaries grow by 5%, so reported percentiles are within ~5% of the true value
+GROWTH = 1.05
+MIN_LATENCY_MS = 0.01
+_LOG_GROWTH = math.log(GROWTH)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: dict[int, int] | None = None):
+        """
+        Log-bucketed latency histogram with bounded memory.
+
+        Histograms are mergeable by summing bucket counts, which lets the manager
+        aggregate the histograms reported by individual workers.
+
+        Parameters
+        ----------
+        buckets : dict[int, int] | None
+            Initial bucket counts, e.g. from `to_dict()` of another histogram.
+        """
+        self.buckets: dict[int, int] = dict(buckets or {})
+        self.count = sum(self.buckets.values())
+
+    def record(self, latency_ms: float, count: int = 1) -> None:
+        if latency_ms <= MIN_LATENCY_MS:
+            idx = 0
+        else:
+            idx = int(math.log(latency_ms / MIN_LATENCY_MS) / _LOG_GROWTH) + 1
+        self.buckets[idx] = self.buckets.get(idx, 0) + count
+        self.count += count
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for idx, n in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + n
+        self.count += other.count
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Returns the upper bound (in ms) of the bucket holding the q-th percentile.
+        """
+        if not self.count:
+            return None
+
+        rank = q / 100 * self.count
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                return round(MIN_LATENCY_MS * GROWTH ** idx, 3)
+        return round(MIN_LATENCY_MS * GROWTH ** max(self.buckets), 3)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+    def to_dict(self) -> dict:
+        # JSON object keys must be strings
+        return {str(idx): n for idx, n in self.buckets.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        return cls({int(idx): n for idx, n in data.items()})
@@ -0,0 +1,103 @@
+import sys
+import threading
+from collections import Counter
+from collections.abc import Callable
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, include: Callable[[str], bool], interval: float = 0.005):
+        """
+        Statistical profiler sampling the stack of one thread from a background thread.
+
+        Only frames whose filename passes `include` are attributed, so the report
+        covers user code without the cost of tracing every call.
+
+        Parameters
+        ----------
+        thread_id : int
+            Ident of the thread to sample.
+        include : Callable[[str], bool]
+            Selects the code files to report on.
+        interval : float
+            Seconds between samples.
+        """
+        self.thread_id = thread_id
+        self.include = include
+        self.interval = interval
+        self.samples = 0
+        self.self_lines: Counter = Counter()
+        self.self_functions: Counter = Counter()
+        self.total_functions: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.samples += 1
+
+            innermost = True
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                if self.include(code.co_filename):
+                    function = (code.co_filename, code.co_name)
+                    if innermost:
+                        self.self_lines[(code.co_filename, code.co_name, frame.f_lineno)] += 1
+                        self.self_functions[function] += 1
+                        innermost = False
+                    # Recursive functions count once per sample
+                    if function not in seen:
+                        self.total_functions[function] += 1
+                        seen.add(function)
+                frame = frame.f_back
+
+    def report(self, sources: dict[str, list[str]] | None = None, top: int = 20) -> dict:
+        """
+        Hot spots as share of all samples; `sources` maps filenames to their lines.
+        """
+        sources = sources or {}
+        samples = max(self.samples, 1)
+
+        def pct(count: int) -> float:
+            return round(100 * count / samples, 2)
+
+        def source_line(filename: str, lineno: int) -> str | None:
+            lines = sources.get(filename)
+            return lines[lineno - 1].strip() if lines and 0 < lineno <= len(lines) else None
+
+        return {
+            "samples": self.samples,
+            "sample_interval_ms": self.interval * 1000,
+            "in_user_code_pct": pct(sum(self.self_functions.values())),
+            "functions": [
+                {
+                    "file": filename,
+                    "function": name,
+                    "self_pct": pct(self.self_functions[(filename, name)]),
+                    "total_pct": pct(count),
+                }
+                for (filename, name), count in self.total_functions.most_common(top)
+            ],
+            "lines": [
+                {
+                    "file": filename,
+                    "function": name,
+                    "line": lineno,
+                    "source": source_line(filename, lineno),
+                    "self_pct": pct(count),
+                }
+                for (filename, name, lineno), count in self.self_lines.most_common(top)
+            ],
+        }
+
@@ -0,0 +1,123 @@
+import time
+
+from .histogram import LatencyHistogram
+
+# Kafka header carrying the wall-clock time (ns since epoch) a row entered the pipeline
+ORIGIN_HEADER = "x-origin-ts-ns"
+
+LATENCY_STAGES = ("queue", "transform", "produce", "end_to_end")
+
+
+def origin_header(origin_ns: int) -> tuple[str, bytes]:
+    return ORIGIN_HEADER, str(origin_ns).encode()
+
+
+def read_origin_ns(headers, fallback_timestamp_ms: int | None = None) -> int | None:
+    """
+    Returns the origin timestamp from the message headers, falling back to the
+    Kafka message timestamp for rows that were not produced by our producer.
+    """
+    for name, value in headers or ():
+        if name == ORIGIN_HEADER:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                break
+    if fallback_timestamp_ms:
+        return fallback_timestamp_ms * 1_000_000
+    return None
+
+
+class LatencyTracker:
+    def __init__(self, report_interval: float):
+        """
+        Per-segment latency histograms for the stages a row passes in a worker:
+
+        - queue: origin -> received by this worker
+        - transform: received -> all transformations applied
+        - produce: transformations applied -> handed to the producer
+        - end_to_end: origin -> handed to the producer
+
+        Durations inside the worker use the monotonic clock. Only the comparison
+        with the origin timestamp uses wall-clock time, since that is the one clock
+        shared between containers; negative skews are clamped to 0.
+
+        Parameters
+        ----------
+        report_interval : float
+            Seconds between two reports.
+        """
+        self.report_interval = report_interval
+        self.histograms = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+        self._last_report = time.monotonic()
+
+        # State of the row currently flowing through the (synchronous) pipeline, or
+        # of the batch of rows the batched runners received together
+        self._origins: list[int | None] = []
+        self._received_wall_ns = 0
+        self._received = 0
+        self._transformed = 0
+
+    @property
+    def current_origin_ns(self) -> int:
+        """
+        Origin of the current row, or the time it was received if it had none
+        """
+        origin_ns = self._origins[0] if self._origins else None
+        return origin_ns if origin_ns is not None else self._received_wall_ns
+
+    def on_receive(self, origin_ns: int | None) -> None:
+        self.on_receive_batch([origin_ns])
+
+    def on_receive_batch(self, origins: list[int | None]) -> None:
+        """
+        Start a batch of rows received together, by their origin timestamps.
+        Every row of the batch is recorded, the transform and produce durations
+        of the batch once per row.
+        """
+        self._origins = origins
+        self._received_wall_ns = time.time_ns()
+        self._received = time.perf_counter_ns()
+        for origin_ns in origins:
+            if origin_ns is not None:
+                self.histograms["queue"].record(max(0, self._received_wall_ns - origin_ns) / 1e6)
+
+    def on_transformed(self, remaining: list[int | None] | None = None) -> None:
+        """
+        `remaining` are the origins of the rows of a batch left after the
+        transformations, if they dropped some
+        """
+        if remaining is not None:
+            self._origins = remaining
+        self._transformed = time.perf_counter_ns()
+        if self._origins:
+            self.histograms["transform"].record((self._transformed - self._received) / 1e6, len(self._origins))
+
+    def on_produced(self) -> None:
+        produced = time.perf_counter_ns()
+        if self._origins:
+            self.histograms["produce"].record((produced - self._transformed) / 1e6, len(self._origins))
+        # received wall time + monotonic time spent inside the worker
+        produced_wall_ns = self._received_wall_ns + (produced - self._received)
+        for origin_ns in self._origins:
+            if origin_ns is not None:
+                self.histograms["end_to_end"].record(max(0, produced_wall_ns - origin_ns) / 1e6)
+
+    def report_due(self) -> bool:
+        return time.monotonic() - self._last_report >= self.report_interval
+
+    def flush(self) -> dict:
+        """
+        Returns the histograms collected since the last report and starts a new interval.
+        """
+        now = time.monotonic()
+        report = {
+            "interval_s": round(now - self._last_report, 3),
+            "stages": {
+                stage: {**h.summary(), "buckets": h.to_dict()}
+                for stage, h in self.histograms.items()
+            },
+        }
+        self.histograms = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+        self._last_report = now
+        return report
@@ -0,0 +1,13 @@
+from .lookup import REFERENCE_DATA_DIR, TABLE_NAME, reference_table, table_path
+from .table import FILE_SUFFIX, ReferenceTable, read_header, write_table
+
+__all__ = [
+    "REFERENCE_DATA_DIR",
+    "TABLE_NAME",
+    "reference_table",
+    "table_path",
+    "FILE_SUFFIX",
+    "ReferenceTable",
+    "read_header",
+    "write_table",
+]
@@ -0,0 +1,43 @@
+import os
+import re
+import threading
+
+from .table import FILE_SUFFIX, ReferenceTable
+
+# Where the manager keeps converted tables; mounted read-only into workers
+REFERENCE_DATA_DIR = os.getenv("REFERENCE_DATA_DIR", "/reference")
+
+TABLE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_tables: dict[str, ReferenceTable] = {}
+_lock = threading.Lock()
+
+
+def table_path(name: str, directory: str = REFERENCE_DATA_DIR) -> str:
+    if not TABLE_NAME.match(name):
+        raise ValueError(f"Invalid reference table name '{name}'")
+    return os.path.join(directory, f"{name}{FILE_SUFFIX}")
+
+
+def reference_table(name: str) -> ReferenceTable:
+    """
+    The registered reference table `name`, opened once per process.
+
+    Usable from transformation scripts:
+
+        from shared.reference import reference_table
+
+        stations = reference_table("stations")
+
+        def enrich(row):
+            station = stations.get(row["station_id"], {})
+            return {**row, "city": station.get("city")}
+    """
+    with _lock:
+        table = _tables.get(name)
+        if table is None:
+            path = table_path(name)
+            if not os.path.exists(path):
+                raise KeyError(f"Reference table '{name}' is not registered")
+            table = _tables[name] = ReferenceTable(path)
+        return table
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from collections.abc import Iterable
+
+# File layout:
+#   MAGIC | header length (u32) | header (JSON)
+#   index: one (key hash u64, record offset u64, record length u32) per row, sorted by hash
+#   records: one JSON object per row
+MAGIC = b"RTBL\x01"
+FILE_SUFFIX = ".rtbl"
+_LENGTH = struct.Struct("<I")
+_ENTRY = struct.Struct("<QQI")
+
+
+def key_text(key) -> str:
+    """
+    Keys are compared as strings, with integral floats written as integers,
+    so a 5.0 from a JSON row finds the row stored under 5 and the other way round
+    """
+    if isinstance(key, float) and key.is_integer():
+        key = int(key)
+    return str(key)
+
+
+def key_hash(key) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key_text(key).encode(), digest_size=8).digest(), "little")
+
+
+def write_table(path: str, name: str, key: str, rows: Iterable[dict]) -> dict:
+    """
+    Convert rows into an indexed table file at `path`; later rows win on duplicate keys.
+    Written to a temporary file first, so readers never see a partial table.
+    """
+    records: dict[str, bytes] = {}
+    columns: dict[str, None] = {}
+    for row in rows:
+        if key not in row:
+            raise ValueError(f"Row without key column '{key}': {row}")
+        columns.update(dict.fromkeys(row))
+        records[key_text(row[key])] = json.dumps(row, separators=(",", ":"), default=str).encode()
+
+    header = json.dumps({
+        "name": name,
+        "key": key,
+        "columns": list(columns),
+        "rows": len(records),
+        "created_at": time.time(),
+    }).encode()
+    data_start = len(MAGIC) + _LENGTH.size + len(header) + _ENTRY.size * len(records)
+
+    index = []
+    offset = data_start
+    for row_key, record in records.items():
+        index.append((key_hash(row_key), offset, len(record)))
+        offset += len(record)
+    index.sort(key=lambda entry: entry[0])
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        for entry in index:
+            f.write(_ENTRY.pack(*entry))
+        for record in records.values():
+            f.write(record)
+    os.replace(tmp_path, path)
+    return json.loads(header)
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a reference table")
+        (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+        return json.loads(f.read(length))
+
+
+class ReferenceTable:
+    def __init__(self, path: str):
+        """
+        Read-only key lookups in a table file, memory-mapped so every process
+        reading the same file shares its pages through the page cache.
+
+        Parameters
+        ----------
+        path : str
+            Location of a file written by write_table.
+        """
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a reference table")
+        (length,) = _LENGTH.unpack_from(self._map, len(MAGIC))
+        header_start = len(MAGIC) + _LENGTH.size
+        self.header = json.loads(self._map[header_start:header_start + length])
+        self.name = self.header["name"]
+        self.key = self.header["key"]
+        self.columns = self.header["columns"]
+        self._rows = self.header["rows"]
+        self._index_start = header_start + length
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _entry(self, position: int) -> tuple[int, int, int]:
+        return _ENTRY.unpack_from(self._map, self._index_start + position * _ENTRY.size)
+
+    def get(self, key, default=None):
+        """
+        The row stored under `key` (compared as by key_text), or `default`
+        """
+        key = key_text(key)
+        wanted = key_hash(key)
+        low, high = 0, self._rows
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < wanted:
+                low = middle + 1
+            else:
+                high = middle
+
+        # Walk the (rare) entries sharing the hash
+        while low < self._rows:
+            hashed, offset, length = self._entry(low)
+            if hashed != wanted:
+                break
+            row = json.loads(self._map[offset:offset + length])
+            if key_text(row.get(self.key)) == key:
+                return row
+            low += 1
+        return default
+
+    def __getitem__(self, key) -> dict:
+        row = self.get(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def close(self) -> None:
+        self._map.close()
@@ -0,0 +1,6 @@
+from .countmin import CountMinSketch
+from .hashing import stable_hash
+from .hyperloglog import HyperLogLog
+from .tdigest import TDigest
+
+__all__ = ["CountMinSketch", "HyperLogLog", "TDigest", "stable_hash"]
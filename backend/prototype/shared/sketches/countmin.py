@@ -0,0 +1,104 @@
+import base64
+from array import array
+
+from .hashing import stable_hash
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 272, depth: int = 5, top_k: int = 10, table: bytes | None = None, candidates: list | None = None):
+        """
+        Approximate counts of values in a depth x width table of counters, plus
+        the top_k most frequent values seen (heavy hitters). Counts are never
+        underestimated; with N values counted, overestimates exceed
+        e * N / width with probability at most e^-depth.
+
+        Sketches of the same dimensions are mergeable by adding their tables.
+
+        Parameters
+        ----------
+        width : int
+            Counters per row.
+        depth : int
+            Rows, each using a different hash of the value.
+        top_k : int
+            Heavy hitters to keep track of.
+        table : bytes | None
+            Initial counters, e.g. from `to_dict()` of another sketch.
+        candidates : list | None
+            Initial [value, count] heavy hitters, e.g. from `to_dict()` of another sketch.
+        """
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.table = array("Q", bytes(8 * width * depth) if table is None else table)
+        # str(value) -> [value, estimated count] of the current heavy hitters
+        self.candidates: dict[str, list] = {str(value): [value, n] for value, n in candidates or []}
+        self.total = sum(self.table[:width])
+        # Lower bound of the smallest heavy hitter count, values below it are not candidates
+        self._floor = 0
+
+    def _cells(self, value, hashed: int | None = None) -> list[int]:
+        if hashed is None:
+            hashed = stable_hash(value)
+        # Double hashing: row i uses h1 + i * h2
+        h1, h2 = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def estimate(self, value) -> int:
+        return min(self.table[cell] for cell in self._cells(value))
+
+    def record(self, value, count: int = 1, hashed: int | None = None) -> None:
+        """
+        `hashed` may pass in stable_hash(value) when already computed
+        """
+        cells = self._cells(value, hashed)
+        for cell in cells:
+            self.table[cell] += count
+        self.total += count
+        self._offer(value, min(self.table[cell] for cell in cells))
+
+    def _offer(self, value, estimate: int) -> None:
+        if len(self.candidates) >= self.top_k and estimate <= self._floor:
+            return
+        key = str(value)
+        if key in self.candidates or len(self.candidates) < self.top_k:
+            self.candidates[key] = [value, estimate]
+            return
+        smallest = min(self.candidates, key=lambda k: self.candidates[k][1])
+        self._floor = self.candidates[smallest][1]
+        if estimate > self._floor:
+            del self.candidates[smallest]
+            self.candidates[key] = [value, estimate]
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches of different dimensions")
+        for cell, n in enumerate(other.table):
+            self.table[cell] += n
+        self.total += other.total
+
+        # Re-estimate every candidate against the merged counters
+        values = {key: value for key, (value, _) in {**self.candidates, **other.candidates}.items()}
+        self.candidates = {}
+        self._floor = 0
+        for value in values.values():
+            self._offer(value, self.estimate(value))
+
+    def heavy_hitters(self) -> list[list]:
+        """
+        [value, estimated count] of the most frequent values, most frequent first
+        """
+        return sorted(self.candidates.values(), key=lambda candidate: candidate[1], reverse=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "top_k": self.top_k,
+            "table": base64.b64encode(self.table.tobytes()).decode(),
+            "candidates": self.heavy_hitters(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CountMinSketch":
+        return cls(data["width"], data["depth"], data["top_k"], base64.b64decode(data["table"]), data["candidates"])
@@ -0,0 +1,9 @@
+import hashlib
+
+
+def stable_hash(value) -> int:
+    """
+    64-bit hash of a value's string form. Stable across processes, unlike hash(),
+    so sketches built by different replicas can be merged.
+    """
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little")
@@ -0,0 +1,63 @@
+import base64
+import math
+
+from .hashing import stable_hash
+
+_MASK = (1 << 64) - 1
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = 12, registers: bytes | None = None):
+        """
+        Approximate count of distinct values in 2^precision one-byte registers,
+        with a standard error of about 1.04 / sqrt(2^precision).
+
+        Sketches of the same precision are mergeable by taking the maximum of
+        each register.
+
+        Parameters
+        ----------
+        precision : int
+            log2 of the number of registers, between 4 and 16.
+        registers : bytes | None
+            Initial registers, e.g. from `to_dict()` of another sketch.
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(registers or bytes(1 << precision))
+
+    def record(self, value, hashed: int | None = None) -> None:
+        """
+        `hashed` may pass in stable_hash(value) when already computed
+        """
+        if hashed is None:
+            hashed = stable_hash(value)
+        idx = hashed >> (64 - self.precision)
+        # Position of the first 1 bit among the remaining bits
+        rest = (hashed << self.precision) & _MASK
+        rank = 64 - self.precision + 1 if rest == 0 else 64 - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers).decode()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        return cls(data["precision"], base64.b64decode(data["registers"]))
@@ -0,0 +1,115 @@
+import bisect
+import math
+
+
+class TDigest:
+    def __init__(self, compression: int = 100, centroids: list[list[float]] | None = None):
+        """
+        Merging t-digest: approximate quantiles from at most compression / 2
+        centroids, most precise at the tails. Values are buffered and merged into
+        the centroids in batches, so memory stays bounded whatever the throughput.
+
+        Digests are mergeable by merging their centroids, which lets the
+        digests of several replicas be combined into one.
+
+        Parameters
+        ----------
+        compression : int
+            Accuracy/size trade-off, bounding the number of centroids.
+        centroids : list[list[float]] | None
+            Initial [mean, weight] centroids, e.g. from `to_dict()` of another digest.
+        """
+        self.compression = compression
+        self.centroids: list[list[float]] = [list(c) for c in centroids or []]
+        self._buffer: list[float] = []
+        self.count = sum(weight for _, weight in self.centroids)
+        self.min = min((mean for mean, _ in self.centroids), default=None)
+        self.max = max((mean for mean, _ in self.centroids), default=None)
+
+    def record(self, value: float) -> None:
+        self._buffer.append(value)
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> None:
+        other._compress()
+        self._compress(other.centroids)
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def _compress(self, incoming: list[list[float]] = ()) -> None:
+        if not self._buffer and not incoming:
+            return
+        items = sorted(self.centroids + [[value, 1] for value in self._buffer] + [list(c) for c in incoming])
+        self._buffer.clear()
+        total = sum(weight for _, weight in items)
+
+        merged = [items[0]]
+        seen = 0.0
+        limit = self._q_limit(0.0)
+        for mean, weight in items[1:]:
+            last = merged[-1]
+            proposed = last[1] + weight
+            if (seen + proposed) / total <= limit:
+                last[0] += (mean - last[0]) * weight / proposed
+                last[1] = proposed
+            else:
+                seen += last[1]
+                limit = self._q_limit(seen / total)
+                merged.append([mean, weight])
+        self.centroids = merged
+
+    def _q_limit(self, q: float) -> float:
+        # Arcsine scale function: a centroid spans one unit of k(q) = c / 2pi * asin(2q - 1),
+        # so centroids near the median may be large while the ones at the tails stay small
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Approximate q-th percentile (0-100), interpolated between centroids
+        """
+        self._compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        rank = q / 100 * self.count
+        # Each centroid's mean sits at the middle of the ranks it covers
+        centers = []
+        seen = 0.0
+        for _, weight in self.centroids:
+            centers.append(seen + weight / 2)
+            seen += weight
+        if rank <= centers[0]:
+            first_mean = self.centroids[0][0]
+            return self.min + (first_mean - self.min) * rank / centers[0] if centers[0] else first_mean
+        if rank >= centers[-1]:
+            last_mean = self.centroids[-1][0]
+            tail = self.count - centers[-1]
+            return last_mean + (self.max - last_mean) * (rank - centers[-1]) / tail if tail else last_mean
+
+        i = bisect.bisect_right(centers, rank) - 1
+        low, high = self.centroids[i][0], self.centroids[i + 1][0]
+        return low + (high - low) * (rank - centers[i]) / (centers[i + 1] - centers[i])
+
+    def to_dict(self) -> dict:
+        self._compress()
+        return {"compression": self.compression, "centroids": self.centroids, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TDigest":
+        digest = cls(data["compression"], data["centroids"])
+        # Exact bounds, the centroid means only approximate them
+        digest.min, digest.max = data.get("min", digest.min), data.get("max", digest.max)
+        return digest
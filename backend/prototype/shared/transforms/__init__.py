@@ -0,0 +1,22 @@
+from .native import OPS, UNITS, compile_native, is_native, plan_stage, step_fingerprint
+from .sketches import OP_SKETCH, SKETCHES, is_sketch, sketch_spec
+from .windows import OP_WINDOW, STATS, WINDOW_TYPES, is_window, percentile_of, window_spec
+
+__all__ = [
+    "OPS",
+    "UNITS",
+    "compile_native",
+    "is_native",
+    "plan_stage",
+    "step_fingerprint",
+    "OP_SKETCH",
+    "SKETCHES",
+    "is_sketch",
+    "sketch_spec",
+    "OP_WINDOW",
+    "STATS",
+    "WINDOW_TYPES",
+    "is_window",
+    "percentile_of",
+    "window_spec",
+]
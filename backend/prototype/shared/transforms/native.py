@@ -0,0 +1,195 @@
+import json
+from collections.abc import Callable
+
+from shared.metrics import script_fingerprint
+
+from .sketches import OP_SKETCH, is_sketch
+from .windows import OP_WINDOW, is_window
+
+# Linear conversions into the base unit of each dimension: base = value * scale + offset
+UNITS: dict[str, tuple[str, float, float]] = {
+    # temperature (base: kelvin)
+    "kelvin": ("temperature", 1.0, 0.0),
+    "celsius": ("temperature", 1.0, 273.15),
+    "fahrenheit": ("temperature", 5 / 9, 273.15 - 32 * 5 / 9),
+    # length (base: metre)
+    "m": ("length", 1.0, 0.0),
+    "km": ("length", 1000.0, 0.0),
+    "cm": ("length", 0.01, 0.0),
+    "mm": ("length", 0.001, 0.0),
+    "mi": ("length", 1609.344, 0.0),
+    "ft": ("length", 0.3048, 0.0),
+    "in": ("length", 0.0254, 0.0),
+    # mass (base: kilogram)
+    "kg": ("mass", 1.0, 0.0),
+    "g": ("mass", 0.001, 0.0),
+    "lb": ("mass", 0.45359237, 0.0),
+    # speed (base: metre per second)
+    "m/s": ("speed", 1.0, 0.0),
+    "km/h": ("speed", 1 / 3.6, 0.0),
+    "mph": ("speed", 0.44704, 0.0),
+    # pressure (base: pascal)
+    "pa": ("pressure", 1.0, 0.0),
+    "hpa": ("pressure", 100.0, 0.0),
+    "kpa": ("pressure", 1000.0, 0.0),
+    "bar": ("pressure", 100000.0, 0.0),
+    "psi": ("pressure", 6894.757293168, 0.0),
+}
+
+OP_SCALE = "scale"  # {"op": "scale", "fields": [...], "factor": 1.0, "offset": 0.0}
+OP_CONVERT = "convert"  # {"op": "convert", "fields": [...], "from": "celsius", "to": "kelvin"}
+OP_RENAME = "rename"  # {"op": "rename", "fields": {"old": "new"}}
+OP_DROP = "drop"  # {"op": "drop", "fields": [...]}
+OP_FILTER = "filter"  # {"op": "filter", "field": "x", "min": ..., "max": ...}, drops rows outside [min, max]
+OPS = (OP_SCALE, OP_CONVERT, OP_RENAME, OP_DROP, OP_FILTER)
+
+
+def is_native(transformation) -> bool:
+    return isinstance(transformation, dict)
+
+
+def _fields(node: dict) -> list[str]:
+    fields = node.get("fields")
+    if isinstance(fields, str):
+        return [fields]
+    if not isinstance(fields, list) or not fields or not all(isinstance(f, str) for f in fields):
+        raise ValueError(f"'{node['op']}' needs 'fields', a non-empty list of field names")
+    return fields
+
+
+def _number(node: dict, name: str, default: float | None = None) -> float | None:
+    value = node.get(name, default)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise ValueError(f"'{node['op']}' needs '{name}' to be a number")
+    return value
+
+
+def _affine(node: dict) -> tuple[float, float]:
+    """
+    (factor, offset) of a scale or convert node
+    """
+    if node["op"] == OP_SCALE:
+        return _number(node, "factor", 1), _number(node, "offset", 0)
+
+    source, target = str(node.get("from", "")).lower(), str(node.get("to", "")).lower()
+    if source not in UNITS or target not in UNITS:
+        raise ValueError(f"'convert' supports the units {', '.join(UNITS)}")
+    (source_dimension, source_scale, source_offset) = UNITS[source]
+    (target_dimension, target_scale, target_offset) = UNITS[target]
+    if source_dimension != target_dimension:
+        raise ValueError(f"Cannot convert {source_dimension} ({source}) to {target_dimension} ({target})")
+    return source_scale / target_scale, (source_offset - target_offset) / target_scale
+
+
+def compile_native(nodes: list[dict]) -> Callable[[dict], dict | None]:
+    """
+    Compile consecutive native nodes into one function of the row, returning None
+    for filtered rows. Raises ValueError for invalid nodes.
+
+    Consecutive scale/convert nodes are folded into a single multiply-add per
+    field, so a chain of them costs one pass over the row.
+    """
+    steps: list[Callable[[dict], bool]] = []
+    # field -> (factor, offset) of the scale/convert nodes since the last other node
+    pending: dict[str, tuple[float, float]] = {}
+
+    def flush_affine():
+        if not pending:
+            return
+        affine = list(pending.items())
+        pending.clear()
+
+        def apply_affine(row):
+            for field, (factor, offset) in affine:
+                value = row.get(field)
+                if value is not None:
+                    row[field] = value * factor + offset
+            return True
+        steps.append(apply_affine)
+
+    for node in nodes:
+        op = node.get("op") if isinstance(node, dict) else None
+        if op not in OPS:
+            raise ValueError(f"Unknown native transform {node!r}, expected an object with 'op' in {', '.join((*OPS, OP_WINDOW, OP_SKETCH))}")
+
+        if op in (OP_SCALE, OP_CONVERT):
+            factor, offset = _affine(node)
+            for field in _fields(node):
+                # Applying (f1, o1) then (f2, o2) equals (f1 * f2, o1 * f2 + o2)
+                previous_factor, previous_offset = pending.get(field, (1, 0))
+                pending[field] = (previous_factor * factor, previous_offset * factor + offset)
+            continue
+
+        flush_affine()
+        if op == OP_RENAME:
+            mapping = node.get("fields")
+            if not isinstance(mapping, dict) or not mapping:
+                raise ValueError("'rename' needs 'fields', an object mapping old to new names")
+            renames = list(mapping.items())
+
+            def apply_rename(row, renames=renames):
+                for old, new in renames:
+                    if old in row:
+                        row[new] = row.pop(old)
+                return True
+            steps.append(apply_rename)
+
+        elif op == OP_DROP:
+            dropped = _fields(node)
+
+            def apply_drop(row, dropped=dropped):
+                for field in dropped:
+                    row.pop(field, None)
+                return True
+            steps.append(apply_drop)
+
+        elif op == OP_FILTER:
+            field = node.get("field")
+            low, high = _number(node, "min"), _number(node, "max")
+            if not isinstance(field, str) or (low is None and high is None):
+                raise ValueError("'filter' needs a 'field' and at least one of 'min' and 'max'")
+
+            def apply_filter(row, field=field, low=low, high=high):
+                value = row.get(field)
+                if value is None:
+                    return False
+                return (low is None or value >= low) and (high is None or value <= high)
+            steps.append(apply_filter)
+    flush_affine()
+
+    def transform(row):
+        # Rows may be shared with the caller (e.g. the dead-letter path), transform a copy
+        row = dict(row)
+        for step in steps:
+            if not step(row):
+                return None
+        return row
+
+    transform.__name__ = "native"
+    return transform
+
+
+def plan_stage(transformations: list) -> list[tuple[int, object]]:
+    """
+    The steps a stage runs as (index, script, list of native nodes, or window or
+    sketch node). Consecutive native nodes are fused into one step, numbered after
+    the first of them; window and sketch nodes are steps of their own.
+    """
+    steps = []
+    for idx, transformation in enumerate(transformations):
+        if is_native(transformation) and not is_window(transformation) and not is_sketch(transformation):
+            if steps and isinstance(steps[-1][1], list):
+                steps[-1][1].append(transformation)
+                continue
+            transformation = [transformation]
+        steps.append((idx, transformation))
+    return steps
+
+
+def step_fingerprint(step) -> str:
+    """
+    script_fingerprint of a script, or of the canonical JSON of native nodes
+    """
+    if not isinstance(step, str):
+        return script_fingerprint(json.dumps(step, sort_keys=True))
+    return script_fingerprint(step)
@@ -0,0 +1,65 @@
+from .windows import percentile_of
+
+# {"op": "sketch", "fields": [...], "sketches": ["quantiles", "distinct"], "interval_ms": 10000}
+OP_SKETCH = "sketch"
+
+SKETCH_QUANTILES = "quantiles"  # t-digest of numeric values
+SKETCH_DISTINCT = "distinct"  # HyperLogLog distinct count
+SKETCH_HEAVY_HITTERS = "heavy_hitters"  # count-min sketch with the most frequent values
+SKETCHES = (SKETCH_QUANTILES, SKETCH_DISTINCT, SKETCH_HEAVY_HITTERS)
+
+# Sketch parameters: (default, minimum, maximum)
+_PARAMETERS = {
+    "interval_ms": (10000, 100, None),  # emit and reset the sketches this often
+    "compression": (200, 10, 1000),  # t-digest size/accuracy, at most compression / 2 centroids
+    "precision": (12, 4, 16),  # HyperLogLog registers: 2^precision
+    "width": (272, 16, 1 << 20),  # count-min counters per row, overestimates within e / width of the total
+    "depth": (5, 1, 16),  # count-min rows, the bound holds with probability 1 - e^-depth
+    "top_k": (10, 1, 1000),  # heavy hitters reported
+}
+
+
+def is_sketch(transformation) -> bool:
+    return isinstance(transformation, dict) and transformation.get("op") == OP_SKETCH
+
+
+def sketch_spec(node: dict) -> dict:
+    """
+    Validated sketch node with its defaults filled in. Raises ValueError for invalid nodes.
+
+    Sketches are kept for each of `fields` (every numeric field when omitted) and emitted
+    every interval_ms as one row per field holding their estimates and mergeable state.
+    With "merge": true the node's input rows are the output of sketch nodes
+    (e.g. of several replicas), whose states are merged instead. A sketch node
+    is the last transformation of its segment.
+    """
+    fields = node.get("fields")
+    if isinstance(fields, str):
+        fields = [fields]
+    if fields is not None and (not isinstance(fields, list) or not fields or not all(isinstance(f, str) for f in fields)):
+        raise ValueError("'sketch' needs 'fields' to be a non-empty list of field names, or omitted for every numeric field")
+
+    sketches = node.get("sketches", [SKETCH_QUANTILES])
+    if isinstance(sketches, str):
+        sketches = [sketches]
+    if not isinstance(sketches, list) or not sketches or not all(s in SKETCHES for s in sketches):
+        raise ValueError(f"'sketch' needs 'sketches', a non-empty list out of {', '.join(SKETCHES)}")
+
+    percentiles = node.get("percentiles", ["p50", "p90", "p99"])
+    if not isinstance(percentiles, list) or not all(isinstance(p, str) and percentile_of(p) is not None for p in percentiles):
+        raise ValueError("'sketch' needs 'percentiles' to be a list like [\"p50\", \"p99\"]")
+
+    spec = {
+        "op": OP_SKETCH,
+        "fields": fields,
+        "sketches": list(dict.fromkeys(sketches)),
+        "percentiles": percentiles,
+        "merge": bool(node.get("merge", False)),
+    }
+    for name, (default, low, high) in _PARAMETERS.items():
+        value = node.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, int) or value < low or (high is not None and value > high):
+            bounds = f"between {low} and {high}" if high is not None else f">= {low}"
+            raise ValueError(f"'sketch' needs '{name}' to be an integer {bounds}")
+        spec[name] = value
+    return spec
@@ -0,0 +1,90 @@
+import re
+
+# {"op": "window", "type": "tumbling", "duration_ms": 1000, "fields": [...], "aggregations": ["mean", "p95"]}
+OP_WINDOW = "window"
+
+WINDOW_TUMBLING = "tumbling"  # fixed, non-overlapping windows of duration_ms
+WINDOW_HOPPING = "hopping"  # windows of duration_ms starting every step_ms
+WINDOW_SLIDING = "sliding"  # a window of duration_ms ending at every message
+WINDOW_TYPES = (WINDOW_TUMBLING, WINDOW_HOPPING, WINDOW_SLIDING)
+
+EMIT_FINAL = "final"  # one row per window, once it closes
+EMIT_CURRENT = "current"  # the running aggregates on every update
+EMIT_MODES = (EMIT_FINAL, EMIT_CURRENT)
+
+STATS = ("count", "sum", "mean", "min", "max")
+# Percentiles are given as "p50", "p99", "p99.9", ...
+_PERCENTILE = re.compile(r"^p(\d{1,2}(\.\d+)?|100)$")
+
+
+def is_window(transformation) -> bool:
+    return isinstance(transformation, dict) and transformation.get("op") == OP_WINDOW
+
+
+def percentile_of(aggregation: str) -> float | None:
+    match = _PERCENTILE.match(aggregation)
+    return float(match.group(1)) if match else None
+
+
+def _milliseconds(node: dict, name: str, required: bool = True, minimum: int = 1) -> int | None:
+    value = node.get(name)
+    if value is None and not required:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ValueError(f"'window' needs '{name}' to be an integer >= {minimum} (milliseconds)")
+    return value
+
+
+def window_spec(node: dict) -> dict:
+    """
+    Validated window node with its defaults filled in. Raises ValueError for invalid nodes.
+
+    Aggregates are kept per message key, for each of `fields` (every numeric
+    field when omitted). Result rows hold the window's "start" and "end" and one
+    "<field>_<aggregation>" per field and aggregation.
+    """
+    window_type = node.get("type", WINDOW_TUMBLING)
+    if window_type not in WINDOW_TYPES:
+        raise ValueError(f"'window' needs 'type' to be one of {', '.join(WINDOW_TYPES)}")
+
+    duration_ms = _milliseconds(node, "duration_ms")
+    step_ms = _milliseconds(node, "step_ms", required=window_type == WINDOW_HOPPING)
+    if step_ms is not None:
+        if window_type != WINDOW_HOPPING:
+            raise ValueError("'step_ms' only applies to hopping windows")
+        if step_ms > duration_ms:
+            raise ValueError("'step_ms' cannot exceed 'duration_ms'")
+    grace_ms = _milliseconds(node, "grace_ms", required=False, minimum=0) or 0
+
+    fields = node.get("fields")
+    if isinstance(fields, str):
+        fields = [fields]
+    if fields is not None and (not isinstance(fields, list) or not fields or not all(isinstance(f, str) for f in fields)):
+        raise ValueError("'window' needs 'fields' to be a non-empty list of field names, or omitted for every numeric field")
+
+    aggregations = node.get("aggregations", ["mean"])
+    if isinstance(aggregations, str):
+        aggregations = [aggregations]
+    if not isinstance(aggregations, list) or not aggregations:
+        raise ValueError("'window' needs 'aggregations', a non-empty list")
+    for aggregation in aggregations:
+        if aggregation not in STATS and (not isinstance(aggregation, str) or percentile_of(aggregation) is None):
+            raise ValueError(f"Unknown aggregation {aggregation!r}, expected one of {', '.join(STATS)} or a percentile like p95")
+
+    emit = node.get("emit", EMIT_FINAL)
+    if emit not in EMIT_MODES:
+        raise ValueError(f"'window' needs 'emit' to be one of {', '.join(EMIT_MODES)}")
+    if emit == EMIT_CURRENT and any(percentile_of(a) is not None for a in aggregations):
+        # Percentiles need every value of the window, which is only read once it closes
+        raise ValueError("Percentiles can only be emitted for closed windows (emit 'final')")
+
+    return {
+        "op": OP_WINDOW,
+        "type": window_type,
+        "duration_ms": duration_ms,
+        "step_ms": step_ms,
+        "grace_ms": grace_ms,
+        "fields": fields,
+        "aggregations": list(dict.fromkeys(aggregations)),
+        "emit": emit,
+    }
@@ -0,0 +1,103 @@
+# backfill.py
+from confluent_kafka import TopicPartition
+
+from shared.logger import get_logger
+
+logger = get_logger("Worker")
+
+MODE_STREAM = "stream"
+MODE_BACKFILL = "backfill"
+
+
+class BackfillRange:
+    def __init__(self, start_offsets: dict[int, int], end_offsets: dict[int, int]):
+        """
+        Progress of a backfill through a fixed offset range of every input partition.
+
+        Parameters
+        ----------
+        start_offsets : dict[int, int]
+            Offset the segment starts consuming at, per partition.
+        end_offsets : dict[int, int]
+            Offset the range ends at (exclusive), per partition.
+        """
+        self.end_offsets = end_offsets
+        self.remaining = {p for p, end in end_offsets.items() if start_offsets.get(p, 0) < end}
+        # Partitions with anything to backfill at all
+        self.ranged = set(self.remaining)
+
+    @property
+    def done(self) -> bool:
+        return not self.remaining
+
+    def in_range(self, partition: int, offset: int) -> bool:
+        return offset < self.end_offsets.get(partition, 0)
+
+    def on_message(self, partition: int, offset: int) -> bool:
+        """
+        Returns True once the last offset of every partition has been consumed
+        """
+        if partition in self.remaining and offset >= self.end_offsets[partition] - 1:
+            self.remaining.discard(partition)
+        return self.done
+
+
+def resolve_backfill_range(app, topic_name: str, end_timestamp: int | None = None) -> BackfillRange:
+    """
+    Fix the range a backfill processes: from the group's (start-position adjusted)
+    offsets up to end_timestamp, or up to the end of each partition right now.
+    """
+    consumer = app.get_consumer(auto_commit_enable=False)
+    try:
+        partitions = consumer.list_topics(topic_name, timeout=10).topics[topic_name].partitions
+        if not partitions:
+            # An empty range would complete the backfill before the upstream produced anything
+            raise ValueError(f"Cannot backfill: input topic '{topic_name}' does not exist yet")
+        committed = consumer.committed([TopicPartition(topic_name, p) for p in partitions], timeout=10)
+        start_offsets, end_offsets = {}, {}
+        for tp in committed:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic_name, tp.partition), timeout=10)
+            # Without a commit the consumer starts at auto_offset_reset="earliest"
+            start_offsets[tp.partition] = tp.offset if tp.offset >= 0 else low
+            end_offsets[tp.partition] = high
+            if end_timestamp is not None:
+                (found,) = consumer.offsets_for_times(
+                    [TopicPartition(topic_name, tp.partition, end_timestamp)], timeout=10
+                )
+                if found.offset >= 0:
+                    end_offsets[tp.partition] = min(found.offset, high)
+    finally:
+        consumer.close()
+
+    logger.info(
+        "Backfill range: "
+        + ", ".join(f"p{p}:{start_offsets[p]}-{end_offsets[p]}" for p in sorted(end_offsets))
+    )
+    return BackfillRange(start_offsets, end_offsets)
+
+
+def rewind_to_backfill_end(app, topic_name: str, backfill: BackfillRange):
+    """
+    Commit the end of the range for every finished partition. Quix commits the
+    offsets of the rows beyond the range it dropped, which a later run would skip.
+    """
+    finished = sorted(backfill.ranged - backfill.remaining)
+    if not finished:
+        return
+    consumer = app.get_consumer(auto_commit_enable=False)
+    try:
+        consumer.commit(
+            offsets=[TopicPartition(topic_name, p, backfill.end_offsets[p]) for p in finished],
+            asynchronous=False,
+        )
+    finally:
+        consumer.close()
+
+
+def pause_partition(consumer, msg, paused: set):
+    """
+    Stop fetching the partition of a message beyond the backfill range
+    """
+    if msg.partition() not in paused:
+        paused.add(msg.partition())
+        consumer.pause([TopicPartition(msg.topic(), msg.partition())])
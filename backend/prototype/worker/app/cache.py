@@ -0,0 +1,187 @@
+# cache.py
+import copy
+import inspect
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from app.scripts import CACHE_KEY_HOOK
+
+CACHE_HITS = "hits"
+CACHE_MISSES = "misses"
+CACHE_EVICTIONS = "evictions"
+
+# Key of rows that cannot be cached
+_UNCACHEABLE = object()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int, ttl: float | None = None, record: Callable[[str], None] | None = None):
+        """
+        Bounded LRU cache of transformation results, with optional expiry.
+
+        Parameters
+        ----------
+        max_entries : int
+            Least recently used entries are evicted beyond this size.
+        ttl : float | None
+            Seconds an entry stays valid, or None to keep entries until evicted.
+        record : Callable[[str], None] | None
+            Called with CACHE_HITS, CACHE_MISSES or CACHE_EVICTIONS on each event.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.record = record or (lambda event: None)
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key) -> tuple[bool, object]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires is None or expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.record(CACHE_HITS)
+                return True, copy.deepcopy(value)
+            del self._entries[key]
+            self.record(CACHE_EVICTIONS)
+        self.record(CACHE_MISSES)
+        return False, None
+
+    def put(self, key, value) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        # Stored and returned as copies, later transformations may modify the rows they get
+        self._entries[key] = (copy.deepcopy(value), expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.record(CACHE_EVICTIONS)
+
+
+def key_selector(module) -> Callable[[dict], object] | None:
+    """
+    The script's `cache_key`: a function of the row, or the names of the row
+    fields the result depends on. None if the script does not declare one.
+    """
+    declared = getattr(module, CACHE_KEY_HOOK, None)
+    if declared is None:
+        return None
+    if callable(declared):
+        return declared
+    if isinstance(declared, str):
+        declared = (declared,)
+    fields = tuple(declared)
+    return lambda row: tuple(row.get(field) for field in fields)
+
+
+class TrackedRow(dict):
+    """
+    Copy of a row that records the fields assigned to it
+    """
+    def __init__(self, row: dict):
+        super().__init__(row)
+        # The values the row was created with, compared by identity
+        self.original = dict(row)
+        self.written: set = set()
+
+    def __setitem__(self, field, value):
+        self.written.add(field)
+        super().__setitem__(field, value)
+
+    def update(self, *args, **kwargs):
+        changes = dict(*args, **kwargs)
+        self.written.update(changes)
+        super().update(changes)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+def result_delta(before, row, output) -> tuple[dict | None, tuple, object]:
+    """
+    (changed, removed, output) of a transformation called with `row`, a TrackedRow
+    of `before`: the fields it assigned or changed, even to the value they had,
+    and the names of those it removed. None and the output itself if either side
+    is not a row (e.g. a filtered row).
+
+    Fields of a new output dict are told apart by identity: one still holding the
+    row's own value object counts as taken over from the row.
+    """
+    if isinstance(before, dict) and isinstance(output, dict):
+        written = row.written if output is row else ()
+        changed = {
+            field: value
+            for field, value in output.items()
+            # Identity catches values a new output dict did not take over from the row
+            if field in written or field not in before or value is not row.original.get(field) or before[field] != value
+        }
+        return changed, tuple(field for field in before if field not in output), None
+    return None, (), output
+
+
+def apply_delta(row, delta: tuple[dict | None, tuple, object]):
+    changed, removed, output = delta
+    if changed is None:
+        return output
+    merged = {field: value for field, value in row.items() if field not in removed}
+    merged.update(changed)
+    return merged
+
+
+def memoize(func, select_key: Callable[[dict], object], cache: ResultCache):
+    """
+    Wrap a deterministic transformation so repeated keys are answered from `cache`
+    without calling it. Rows whose key is not hashable are always transformed.
+
+    Only the fields the transformation assigns or removes are cached and applied
+    to the row at hand, so fields outside the key keep their own values.
+    """
+    def lookup(row):
+        key = select_key(row)
+        try:
+            hash(key)
+        except TypeError:
+            return _UNCACHEABLE, False, None
+        hit, delta = cache.get(key)
+        return key, hit, delta
+
+    if inspect.iscoroutinefunction(func):
+        async def cached_async(row):
+            key, hit, delta = lookup(row)
+            if hit:
+                return apply_delta(row, delta)
+            if key is _UNCACHEABLE:
+                return await func(row)
+            # Transformations may modify the row they get in place
+            before = copy.deepcopy(row)
+            if isinstance(row, dict):
+                row = TrackedRow(row)
+            output = await func(row)
+            cache.put(key, result_delta(before, row, output))
+            return dict(output) if output is row else output
+        return cached_async
+
+    def cached(row):
+        key, hit, delta = lookup(row)
+        if hit:
+            return apply_delta(row, delta)
+        if key is _UNCACHEABLE:
+            return func(row)
+        # Transformations may modify the row they get in place
+        before = copy.deepcopy(row)
+        if isinstance(row, dict):
+            row = TrackedRow(row)
+        output = func(row)
+        cache.put(key, result_delta(before, row, output))
+        return dict(output) if output is row else output
+    return cached
+
+
+def cached_transformation(module, func, max_entries: int, ttl: float | None, record: Callable[[str], None]):
+    """
+    The function to call for a loaded transformation: memoized if its script declares a cache key
+    """
+    select_key = key_selector(module)
+    if select_key is None:
+        return func
+    return memoize(func, select_key, ResultCache(max_entries, ttl, record))
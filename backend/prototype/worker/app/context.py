@@ -0,0 +1,64 @@
+# context.py
+import socket
+
+from app.metrics import transformation_costs
+from shared.events import emit_event
+
+
+class WorkerContext:
+    def __init__(self, pipeline_id: str, stages: list[dict], observation, latency):
+        """
+        The segments a worker runs and the telemetry it reports about them,
+        shared by the inline pipeline and the runners.
+
+        Parameters
+        ----------
+        pipeline_id : str
+            Pipeline the segments belong to.
+        stages : list[dict]
+            The worker's segment, followed by the segments chained into it, each with
+            its segment_index, input_topic, output_topic, transformations,
+            error_policy and dead_letter_topic.
+        observation : ObservationPoller
+            Whether a client is watching the pipeline's stream rows.
+        latency : LatencyTracker
+            Latency histograms of the worker's segment.
+        """
+        self.pipeline_id = pipeline_id
+        self.stages = stages
+        self.segment_index = stages[0]["segment_index"]
+        self.observation = observation
+        self.latency = latency
+
+    def label(self, segment_index: int, idx: int) -> str:
+        # Transformations of segments chained into this worker are prefixed with their segment
+        if segment_index == self.segment_index:
+            return str(idx + 1)
+        return f"{segment_index+1}.{idx+1}"
+
+    def emit(self, category: str, type: str, data, segment_index: int | None = None, topic: str | None = None):
+        emit_event(
+            pipeline_id=self.pipeline_id,
+            segment_index=self.segment_index if segment_index is None else segment_index,
+            category=category,
+            type=type,
+            topic=topic,
+            data=data,
+        )
+
+    def emit_row(self, stage: dict, event_type: str, row):
+        """
+        Stream event of a row entering ("input") or leaving ("output") a stage,
+        only emitted while a client is watching
+        """
+        if self.observation.observed:
+            self.emit("stream", event_type, row, stage["segment_index"], stage[f"{event_type}_topic"])
+
+    def report_latency(self):
+        """
+        Emit the latency histograms and transformation costs once a report is due
+        """
+        if not self.latency.report_due():
+            return
+        self.emit("metrics", "latency", self.latency.flush())
+        self.emit("metrics", "costs", {"worker": socket.gethostname(), "transformations": transformation_costs()})
@@ -0,0 +1,152 @@
+# errors.py
+import sys
+import time
+import traceback
+
+from quixstreams import message_context
+
+from app.context import WorkerContext
+from app.metrics import metrics
+from shared.logger import get_logger
+
+logger = get_logger("Worker")
+
+ERROR_POLICY_FAIL = "fail"
+ERROR_POLICY_SKIP = "skip"
+ERROR_POLICY_DLQ = "dlq"
+
+metrics.counter("transformation_errors_total", "Rows a transformation raised on")
+metrics.counter("deserialization_errors_total", "Input messages that could not be deserialized")
+metrics.counter("dead_letter_rows_total", "Failing rows routed to the dead-letter topic")
+
+
+class ErrorHandler:
+    def __init__(self, context: WorkerContext, producer=None):
+        """
+        Applies the error policy of each stage to the rows failing in it.
+
+        Parameters
+        ----------
+        context : WorkerContext
+            The worker's stages; a stage using "dlq" holds its quixstreams
+            topic under "dead_letter".
+        producer : quixstreams producer | None
+            Shared by the dead-letter topics of all stages, None if no stage uses "dlq".
+        """
+        self.context = context
+        self.producer = producer
+        self.last_error: dict | None = None
+
+    def handle(self, stage, idx, e, row, key, timestamp, headers, source=None, formatted_traceback=None):
+        """
+        Apply the stage's error policy to a row transformation #idx raised on, or
+        to an input message that could not be deserialized if idx is None.
+        Returns normally when the row is to be dropped from the stream.
+
+        `source` and `formatted_traceback` are given for rows failing outside the
+        current message context, e.g. in the process pool.
+        """
+        formatted_traceback = formatted_traceback or traceback.format_exc()
+        segment_index = stage["segment_index"]
+        policy = stage["error_policy"]
+        if idx is None:
+            metrics.inc("deserialization_errors_total")
+            failed_at = "Input deserialization"
+        else:
+            metrics.inc("transformation_errors_total", transformation=self.context.label(segment_index, idx))
+            failed_at = f"Transformation #{idx+1}"
+        self.last_error = {
+            "segment_index": segment_index,
+            "transformation": None if idx is None else idx + 1,
+            "type": type(e).__name__,
+            "message": str(e),
+            "at": time.time(),
+        }
+
+        if policy == ERROR_POLICY_FAIL:
+            logger.error(f"Error in {failed_at.lower()}: {e}\n{formatted_traceback}")
+            self.context.emit(
+                "lifecycle",
+                "failed",
+                {
+                    "message": (
+                        f"[ERROR] Worker crashed at Segment #{segment_index+1}, "
+                        f"{failed_at}:\n\n{type(e).__name__}: {e}"
+                    ),
+                    "traceback": formatted_traceback,
+                },
+                segment_index=segment_index,
+            )
+            sys.exit(1)
+
+        logger.warning(f"Error in {failed_at.lower()} ({policy}): {type(e).__name__}: {e}")
+        if policy != ERROR_POLICY_DLQ:
+            return
+
+        # Rows of the inline dataframe, whose offsets quixstreams' checkpoint commits
+        inline = source is None
+        if inline:
+            ctx = message_context()
+            source = {"topic": ctx.topic, "partition": ctx.partition, "offset": ctx.offset}
+        dead_letter_topic = stage["dead_letter"]
+        message = dead_letter_topic.serialize(
+            key=key,
+            value={
+                "pipeline_id": self.context.pipeline_id,
+                "segment_index": segment_index,
+                "transformation": None if idx is None else idx + 1,
+                "error": {
+                    "type": type(e).__name__,
+                    "message": str(e),
+                    "traceback": formatted_traceback,
+                },
+                "source": source,
+                "row": row,
+            },
+            headers=headers,
+        )
+        self.producer.produce(
+            topic=dead_letter_topic.name,
+            key=message.key,
+            value=message.value,
+            headers=message.headers,
+            timestamp=timestamp,
+        )
+        if inline:
+            # The checkpoint does not flush this producer; deliver the row before its
+            # offset can be committed. Batched runners flush once per batch instead.
+            self.producer.flush()
+        else:
+            self.producer.poll(0)
+        metrics.inc("dead_letter_rows_total")
+
+    def flush(self):
+        if self.producer is not None:
+            self.producer.flush()
+
+    def report_periodically(self, interval: float):
+        """
+        Sample the error counters into telemetry. Runs in its own thread, so errors
+        are reported even while every row fails and nothing reaches the output.
+        """
+        reported = None
+        while True:
+            time.sleep(interval)
+            errors = {dict(k)["transformation"]: int(v) for k, v in metrics.snapshot("transformation_errors_total").items()}
+            undeserializable = int(sum(metrics.snapshot("deserialization_errors_total").values()))
+            dead_lettered = int(sum(metrics.snapshot("dead_letter_rows_total").values()))
+            if not (errors or undeserializable) or (errors, undeserializable, dead_lettered) == reported:
+                continue
+            reported = (errors, undeserializable, dead_lettered)
+            self.context.emit(
+                "metrics",
+                "errors",
+                {
+                    "policy": {stage["segment_index"]: stage["error_policy"] for stage in self.context.stages},
+                    "errors": errors,
+                    "deserialization_errors": undeserializable,
+                    "total": sum(errors.values()) + undeserializable,
+                    "dead_lettered": dead_lettered,
+                    "last_error": self.last_error,
+                },
+            )
@@ -0,0 +1,44 @@
+# metrics.py
+# The worker's metrics, shared by worker.py and the runners it delegates to.
+from shared.metrics import MetricsRegistry, RateMeter
+
+metrics = MetricsRegistry("pipeline_worker")
+metrics.counter("rows_in_total", "Rows consumed from the input topic")
+metrics.counter("rows_out_total", "Rows produced to the output topic")
+metrics.counter("rows_filtered_total", "Rows dropped because a transformation returned None")
+metrics.counter("transformation_calls_total", "Calls per transformation")
+metrics.counter("transformation_seconds_total", "Cumulative time spent per transformation")
+metrics.counter("serialization_seconds_total", "Cumulative time spent (de)serializing rows")
+metrics.counter("produce_errors_total", "Errors raised while producing to the output topic")
+metrics.counter("cache_hits_total", "Rows a deterministic transformation answered from its result cache")
+metrics.counter("cache_misses_total", "Rows a deterministic transformation had to compute")
+metrics.counter("cache_evictions_total", "Cached results dropped for size or age")
+rows_in_rate = RateMeter()
+rows_out_rate = RateMeter()
+metrics.gauge("rows_in_per_second", "Current input rate", rows_in_rate.rate)
+metrics.gauge("rows_out_per_second", "Current output rate", rows_out_rate.rate)
+
+# Transformation label -> fingerprint of its script, to report measured costs per script
+transformation_fingerprints: dict[str, str] = {}
+
+
+def transformation_costs() -> dict:
+    """
+    Cumulative calls and time per transformation, keyed by label, for the
+    manager's placement planner
+    """
+    calls = metrics.snapshot("transformation_calls_total")
+    seconds = metrics.snapshot("transformation_seconds_total")
+    costs = {}
+    for key, count in calls.items():
+        label = dict(key)["transformation"]
+        costs[label] = {
+            "script": transformation_fingerprints.get(label),
+            "calls": int(count),
+            "seconds": round(seconds.get(key, 0), 6),
+        }
+    return costs
+
+
+def rows_total(name: str) -> int:
+    return int(sum(metrics.snapshot(name).values()))
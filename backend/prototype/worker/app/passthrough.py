@@ -0,0 +1,123 @@
+# passthrough.py
+import json
+import os
+import signal
+import threading
+import time
+
+from confluent_kafka import TopicPartition
+
+from app.backfill import pause_partition
+from app.context import WorkerContext
+from app.metrics import metrics, rows_in_rate, rows_out_rate
+from app.termination import StopConditions
+from shared.logger import get_logger
+from shared.metrics import ORIGIN_HEADER, origin_header, read_origin_ns
+
+logger = get_logger("Worker")
+
+PASSTHROUGH_BATCH_SIZE = int(os.environ.get("PASSTHROUGH_BATCH_SIZE", "1000"))
+PASSTHROUGH_SAMPLE_INTERVAL = float(os.environ.get("PASSTHROUGH_SAMPLE_INTERVAL", "0.5"))
+
+
+def run_passthrough(app, input_topic, output_topic, context: WorkerContext, stop: StopConditions):
+    """
+    Relay key/value/header bytes from the input to the output topic in batches,
+    without deserializing them. Stream events come from one sampled message per
+    PASSTHROUGH_SAMPLE_INTERVAL; latency and counters cover every message.
+    Offsets are committed once a batch has been delivered (at-least-once).
+    Returns on SIGTERM or once one of the `stop` conditions is met.
+    """
+    stopping = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stopping.set())
+
+    consumer = app.get_consumer(auto_commit_enable=False)
+    producer = app.get_producer()
+    consumer.subscribe([input_topic.name])
+    latency = context.latency
+    next_sample = 0.0
+    # Partitions past the end of the backfill range, no longer fetched
+    paused = set()
+
+    try:
+        while not stopping.is_set():
+            messages = consumer.consume(num_messages=stop.batch_limit(PASSTHROUGH_BATCH_SIZE), timeout=0.5)
+            if not messages:
+                if stop.check_idle():
+                    break
+                continue
+
+            sample = None
+            if time.monotonic() >= next_sample:
+                sample = messages[0]
+                next_sample = time.monotonic() + PASSTHROUGH_SAMPLE_INTERVAL
+            latency.on_receive_batch([
+                read_origin_ns(msg.headers(), msg.timestamp()[1])
+                for msg in messages
+                if not msg.error() and stop.admits(msg.partition(), msg.offset())
+            ])
+            latency.on_transformed()
+
+            relayed = 0
+            consumed = 0
+            positions = {}
+            for msg in messages:
+                if msg.error():
+                    logger.warning(f"Consumer error: {msg.error()}")
+                    consumed += 1
+                    continue
+                if not stop.admits(msg.partition(), msg.offset()):
+                    pause_partition(consumer, msg, paused)
+                    continue
+                consumed += 1
+
+                _, timestamp = msg.timestamp()
+                headers = msg.headers() or []
+                if not any(name == ORIGIN_HEADER for name, _ in headers):
+                    headers = [*headers, origin_header(timestamp * 1_000_000 if timestamp > 0 else time.time_ns())]
+                try:
+                    producer.produce(
+                        topic=output_topic.name,
+                        key=msg.key(),
+                        value=msg.value(),
+                        headers=headers,
+                        timestamp=timestamp if timestamp > 0 else None,
+                    )
+                except Exception:
+                    metrics.inc("produce_errors_total")
+                    raise
+                relayed += 1
+                positions[msg.partition()] = msg.offset() + 1
+                if stop.on_message(msg.partition(), msg.offset()):
+                    # Leave the rest of the batch uncommitted for the next run
+                    stopping.set()
+                    break
+
+            producer.flush()
+            if positions:
+                consumer.commit(
+                    offsets=[TopicPartition(input_topic.name, p, offset) for p, offset in positions.items()],
+                    asynchronous=True,
+                )
+
+            metrics.inc("rows_in_total", consumed)
+            metrics.inc("rows_out_total", relayed)
+            rows_in_rate.mark(consumed)
+            rows_out_rate.mark(relayed)
+            latency.on_produced()
+            context.report_latency()
+
+            if sample is None or sample.error() or not context.observation.observed:
+                continue
+            try:
+                row = json.loads(sample.value())
+            except (TypeError, ValueError):
+                continue
+            # Chained stages pass rows through unchanged as well
+            for stage in context.stages:
+                context.emit_row(stage, "input", row)
+                context.emit_row(stage, "output", row)
+    finally:
+        producer.flush()
+        consumer.close()
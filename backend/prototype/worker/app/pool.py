@@ -0,0 +1,150 @@
+# pool.py
+# Runs in the processes of a worker's process pool. Kept apart from worker.py,
+# so pool processes load the transformations without the worker's Kafka setup.
+import asyncio
+import inspect
+import os
+import pickle
+import time
+import traceback
+from multiprocessing.util import Finalize
+
+from app.cache import cached_transformation
+from app.scripts import SETUP_HOOK, TEARDOWN_HOOK, load_transformation
+from shared.transforms import compile_native
+
+ROW_OK = "ok"
+ROW_FILTERED = "filtered"
+ROW_ERROR = "error"
+
+# Transformations of every stage as [(index, label, function)], loaded once per process
+_stages: list[list[tuple[int, str, object]]] = []
+_load_error: str | None = None
+# Runs the `async def` transformations of this process, one row at a time
+_loop: asyncio.AbstractEventLoop | None = None
+# Result cache events per transformation since the last chunk, {label: {event: count}}
+_cache_events: dict[str, dict[str, int]] = {}
+
+
+def allotted_cpus() -> int:
+    """
+    Cores this container may use: its cgroup CPU quota if one is set,
+    otherwise the CPUs it is allowed to run on
+    """
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def init_process(stage_steps: list[list[tuple[int, str, object]]], cache_max_entries: int, cache_ttl: float | None):
+    """
+    Pool initializer: load the [(index, label, script or native nodes)] of every
+    stage and run their setup() hooks. Each process keeps its own result caches.
+    """
+    global _load_error
+    teardowns = []
+    # Runs when the pool shuts its processes down
+    Finalize(None, run_teardowns, args=(teardowns,), exitpriority=0)
+    try:
+        for steps in stage_steps:
+            functions = []
+            for idx, label, script in steps:
+                if isinstance(script, list):
+                    functions.append((idx, label, compile_native(script)))
+                    continue
+                module, func = load_transformation(script, label)
+                func = cached_transformation(
+                    module, func, cache_max_entries, cache_ttl,
+                    lambda event, label=label: _count_cache_event(label, event),
+                )
+                setup = getattr(module, SETUP_HOOK, None)
+                if callable(setup):
+                    setup()
+                teardown = getattr(module, TEARDOWN_HOOK, None)
+                if callable(teardown):
+                    teardowns.append(teardown)
+                functions.append((idx, label, func))
+            _stages.append(functions)
+    except Exception as e:
+        # Raised with the first chunk, where the worker can report it
+        _load_error = f"Transformation #{label} failed to load:\n\n{type(e).__name__}: {e}\n{traceback.format_exc()}"
+
+
+def run_teardowns(teardowns: list):
+    for teardown in reversed(teardowns):
+        try:
+            teardown()
+        except Exception:
+            traceback.print_exc()
+
+
+def _count_cache_event(label: str, event: str):
+    events = _cache_events.setdefault(label, {})
+    events[event] = events.get(event, 0) + 1
+
+
+def _picklable(e: Exception) -> Exception:
+    try:
+        pickle.dumps(e)
+        return e
+    except Exception:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+def run_chunk(rows: list) -> tuple[list[tuple], dict[str, list[float]], dict[str, dict[str, int]]]:
+    """
+    Pass a micro-batch of rows through all stages. Returns one result per row,
+    in input order, the [calls, seconds] spent per transformation and the
+    result cache events per transformation. Results are:
+
+    - (ROW_OK, output row)
+    - (ROW_FILTERED, label of the transformation that returned None)
+    - (ROW_ERROR, stage position, transformation index, row it raised on, exception, traceback)
+    """
+    if _load_error:
+        raise RuntimeError(_load_error)
+
+    costs: dict[str, list[float]] = {}
+    results = []
+    for row in rows:
+        result = None
+        for position, functions in enumerate(_stages):
+            for idx, label, func in functions:
+                cost = costs.setdefault(label, [0, 0.0])
+                start = time.perf_counter()
+                try:
+                    output = func(row)
+                    if inspect.isawaitable(output):
+                        output = _event_loop().run_until_complete(output)
+                except Exception as e:
+                    result = (ROW_ERROR, position, idx, row, _picklable(e), traceback.format_exc())
+                    break
+                finally:
+                    cost[0] += 1
+                    cost[1] += time.perf_counter() - start
+                if output is None:
+                    result = (ROW_FILTERED, label)
+                    break
+                row = output
+            if result is not None:
+                break
+        else:
+            result = (ROW_OK, row)
+        results.append(result)
+
+    cache_events = dict(_cache_events)
+    _cache_events.clear()
+    return results, costs, cache_events
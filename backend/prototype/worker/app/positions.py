@@ -0,0 +1,54 @@
+# positions.py
+from confluent_kafka import TopicPartition
+
+from shared.logger import get_logger
+
+logger = get_logger("Worker")
+
+START_COMMITTED = "committed"
+START_LATEST = "latest"
+START_EARLIEST = "earliest"
+START_TIMESTAMP = "timestamp"
+
+
+def apply_start_position(app, topic_name: str, start_position: str, start_timestamp: int | None = None):
+    """
+    Move the segment's consumer group to the requested start position by
+    committing its offsets before the pipeline starts consuming.
+
+    "committed" keeps the group's offsets, so a restarted pipeline resumes where
+    it stopped; partitions without a commit fall back to auto_offset_reset.
+    """
+    if start_position == START_COMMITTED:
+        return
+
+    consumer = app.get_consumer(auto_commit_enable=False)
+    try:
+        partitions = consumer.list_topics(topic_name, timeout=10).topics[topic_name].partitions
+        if not partitions:
+            # Created later by the upstream segment: the group then has no offsets and
+            # starts at auto_offset_reset="earliest", i.e. at rows produced after this start
+            logger.info(f"Input topic '{topic_name}' does not exist yet, starting at its beginning once created")
+            return
+        offsets = []
+        for partition in partitions:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic_name, partition), timeout=10)
+            if start_position == START_EARLIEST:
+                offset = low
+            elif start_position == START_LATEST:
+                offset = high
+            else:
+                (found,) = consumer.offsets_for_times(
+                    [TopicPartition(topic_name, partition, start_timestamp)], timeout=10
+                )
+                # -1: no message at or after the timestamp yet
+                offset = found.offset if found.offset >= 0 else high
+            offsets.append(TopicPartition(topic_name, partition, offset))
+
+        consumer.commit(offsets=offsets, asynchronous=False)
+        logger.info(
+            f"Consumer group positioned at {start_position}: "
+            + ", ".join(f"p{tp.partition}@{tp.offset}" for tp in offsets)
+        )
+    finally:
+        consumer.close()
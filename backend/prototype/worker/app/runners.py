@@ -0,0 +1,315 @@
+# runners.py
+# Batched alternatives to the worker's inline quixstreams pipeline, for
+# transformations that do not fit one row at a time on one core.
+import asyncio
+import inspect
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+from confluent_kafka import TopicPartition
+from quixstreams.utils.json import dumps as json_dumps, loads as json_loads
+
+from app.backfill import pause_partition
+from app.context import WorkerContext
+from app.errors import ErrorHandler
+from app.metrics import metrics, rows_in_rate, rows_out_rate, transformation_fingerprints
+from app.pool import ROW_ERROR, ROW_FILTERED, ROW_OK, init_process, run_chunk
+from app.termination import StopConditions
+from shared.logger import get_logger
+from shared.metrics import ORIGIN_HEADER, origin_header, read_origin_ns
+from shared.transforms import plan_stage, step_fingerprint
+
+logger = get_logger("Worker")
+
+EXECUTION_INLINE = "inline"
+EXECUTION_PROCESS_POOL = "process_pool"
+POOL_BATCH_SIZE = int(os.environ.get("POOL_BATCH_SIZE", "500"))
+# Rows per task sent to a pool process; larger chunks amortize IPC, smaller ones balance load
+POOL_CHUNK_SIZE = int(os.environ.get("POOL_CHUNK_SIZE", "50"))
+ASYNC_BATCH_SIZE = int(os.environ.get("ASYNC_BATCH_SIZE", "500"))
+
+
+def run_batches(
+    app,
+    input_topic,
+    output_topic,
+    context: WorkerContext,
+    errors: ErrorHandler,
+    stop: StopConditions,
+    transform_batch,
+    batch_size: int,
+):
+    """
+    Consume rows in batches and transform each batch at once with
+    `transform_batch(rows) -> (results, costs)`, which returns one app.pool
+    result per row, in input order, and [calls, seconds] per transformation.
+
+    Results are produced in input order, which keeps the order of every
+    partition and key. Offsets are committed once a batch has been delivered
+    (at-least-once). Returns on SIGTERM or once one of the `stop` conditions is met.
+    """
+    stopping = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stopping.set())
+
+    consumer = app.get_consumer(auto_commit_enable=False)
+    producer = app.get_producer()
+    consumer.subscribe([input_topic.name])
+    latency = context.latency
+    # Partitions past the end of the backfill range, no longer fetched
+    paused = set()
+
+    try:
+        while not stopping.is_set():
+            messages = consumer.consume(num_messages=stop.batch_limit(batch_size), timeout=0.5)
+            if not messages:
+                if stop.check_idle():
+                    break
+                continue
+
+            batch = []
+            rows = []
+            positions = {}
+            start = time.perf_counter()
+            for msg in messages:
+                if msg.error():
+                    logger.warning(f"Consumer error: {msg.error()}")
+                    continue
+                if not stop.admits(msg.partition(), msg.offset()):
+                    pause_partition(consumer, msg, paused)
+                    continue
+                try:
+                    row = json_loads(msg.value())
+                except (TypeError, ValueError) as e:
+                    # Dropped or dead-lettered like a failing row, and committed with the batch
+                    value = msg.value()
+                    errors.handle(
+                        context.stages[0], None, e,
+                        value.decode("utf-8", "backslashreplace") if value is not None else None,
+                        msg.key(), msg.timestamp()[1], msg.headers(),
+                        source={"topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset()},
+                    )
+                    positions[msg.partition()] = msg.offset() + 1
+                else:
+                    batch.append(msg)
+                    rows.append(row)
+                if stop.on_message(msg.partition(), msg.offset()):
+                    # Leave the rest of the batch uncommitted for the next run
+                    stopping.set()
+                    break
+            metrics.inc("serialization_seconds_total", time.perf_counter() - start, direction="deserialize")
+            metrics.inc("rows_in_total", len(batch))
+            rows_in_rate.mark(len(batch))
+
+            origins = [read_origin_ns(msg.headers(), msg.timestamp()[1]) for msg in batch]
+            latency.on_receive_batch(origins)
+            results, costs = transform_batch(rows) if batch else ([], {})
+            for label, (calls, seconds) in costs.items():
+                metrics.inc("transformation_calls_total", calls, transformation=label)
+                metrics.inc("transformation_seconds_total", seconds, transformation=label)
+            latency.on_transformed([origin for origin, result in zip(origins, results) if result[0] == ROW_OK])
+
+            produced = 0
+            for msg, row, result in zip(batch, rows, results):
+                positions[msg.partition()] = msg.offset() + 1
+                _, timestamp = msg.timestamp()
+                headers = msg.headers() or []
+                context.emit_row(context.stages[0], "input", row)
+
+                if result[0] == ROW_FILTERED:
+                    metrics.inc("rows_filtered_total", transformation=result[1])
+                    continue
+                if result[0] == ROW_ERROR:
+                    _, position, idx, failed_row, e, formatted_traceback = result
+                    errors.handle(
+                        context.stages[position], idx, e, failed_row, msg.key(), timestamp, headers,
+                        source={"topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset()},
+                        formatted_traceback=formatted_traceback,
+                    )
+                    continue
+
+                output = result[1]
+                if not any(name == ORIGIN_HEADER for name, _ in headers):
+                    headers = [*headers, origin_header(timestamp * 1_000_000 if timestamp > 0 else time.time_ns())]
+                start = time.perf_counter()
+                value = json_dumps(output)
+                metrics.inc("serialization_seconds_total", time.perf_counter() - start, direction="serialize")
+                try:
+                    producer.produce(
+                        topic=output_topic.name,
+                        key=msg.key(),
+                        value=value,
+                        headers=headers,
+                        timestamp=timestamp if timestamp > 0 else None,
+                    )
+                except Exception:
+                    metrics.inc("produce_errors_total")
+                    raise
+                produced += 1
+                context.emit_row(context.stages[-1], "output", output)
+
+            if not positions:
+                continue
+            producer.flush()
+            errors.flush()
+            consumer.commit(
+                offsets=[TopicPartition(input_topic.name, p, offset) for p, offset in positions.items()],
+                asynchronous=True,
+            )
+
+            metrics.inc("rows_out_total", produced)
+            rows_out_rate.mark(produced)
+            latency.on_produced()
+            context.report_latency()
+    finally:
+        producer.flush()
+        consumer.close()
+
+
+def run_process_pool(
+    app,
+    input_topic,
+    output_topic,
+    context: WorkerContext,
+    errors: ErrorHandler,
+    stop: StopConditions,
+    pool_workers: int,
+    cache_max_entries: int,
+    cache_ttl: float | None,
+):
+    """
+    Run the transformations of all stages in a pool of pool_workers processes,
+    so CPU-bound scripts use every core of the container. Batches are sent to
+    the pool in micro-batches of POOL_CHUNK_SIZE rows to amortize IPC.
+    """
+    stage_steps = [
+        [(idx, context.label(stage["segment_index"], idx), step) for idx, step in plan_stage(stage["transformations"])]
+        for stage in context.stages
+    ]
+    for steps in stage_steps:
+        for _, label, step in steps:
+            transformation_fingerprints[label] = step_fingerprint(step)
+
+    # Pool processes are spawned rather than forked, the Kafka clients' threads do not survive a fork
+    pool = ProcessPoolExecutor(
+        max_workers=pool_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_process,
+        initargs=(stage_steps, cache_max_entries, cache_ttl),
+    )
+
+    def transform_batch(rows):
+        chunks = [rows[i:i + POOL_CHUNK_SIZE] for i in range(0, len(rows), POOL_CHUNK_SIZE)]
+        results, costs = [], {}
+        for chunk_results, chunk_costs, cache_events in pool.map(run_chunk, chunks):
+            results += chunk_results
+            for label, events in cache_events.items():
+                for event, count in events.items():
+                    metrics.inc(f"cache_{event}_total", count, transformation=label)
+            for label, (calls, seconds) in chunk_costs.items():
+                cost = costs.setdefault(label, [0, 0.0])
+                cost[0] += calls
+                cost[1] += seconds
+        return results, costs
+
+    logger.info(f"Running transformations in {pool_workers} process(es)")
+    try:
+        run_batches(app, input_topic, output_topic, context, errors, stop, transform_batch, POOL_BATCH_SIZE)
+    finally:
+        # Lets the pool processes run their teardown() hooks
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+@types.coroutine
+def cpu_timed(awaitable, cost: list):
+    """
+    Await `awaitable`, adding the thread CPU time of its own steps to cost[1].
+    While it is suspended, other rows run on the thread and are not counted.
+    """
+    steps = awaitable.__await__()
+    value, error = None, None
+    while True:
+        start = time.thread_time()
+        try:
+            yielded = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as done:
+            return done.value
+        finally:
+            cost[1] += time.thread_time() - start
+        try:
+            value, error = (yield yielded), None
+        except BaseException as e:
+            value, error = None, e
+
+
+def run_async(
+    app,
+    input_topic,
+    output_topic,
+    context: WorkerContext,
+    errors: ErrorHandler,
+    stop: StopConditions,
+    load,
+    max_in_flight: int,
+):
+    """
+    Run the transformations on an event loop, so `async def` transformations of
+    different rows overlap their waits. At most max_in_flight rows are in
+    transformation at a time; plain functions among them run inline.
+    Costs are CPU time, so a transformation waiting on I/O does not look expensive.
+
+    `load(idx, script, segment_index, label)` returns the function of a transformation.
+    """
+    stage_functions = []
+    for stage in context.stages:
+        functions = []
+        for idx, step in plan_stage(stage["transformations"]):
+            label = context.label(stage["segment_index"], idx)
+            functions.append((idx, label, load(idx, step, stage["segment_index"], label)))
+        stage_functions.append(functions)
+    loop = asyncio.new_event_loop()
+
+    async def transform_row(row, in_flight, costs):
+        async with in_flight:
+            for position, functions in enumerate(stage_functions):
+                for idx, label, func in functions:
+                    cost = costs.setdefault(label, [0, 0.0])
+                    cost[0] += 1
+                    try:
+                        start = time.thread_time()
+                        try:
+                            output = func(row)
+                        finally:
+                            cost[1] += time.thread_time() - start
+                        if inspect.isawaitable(output):
+                            output = await cpu_timed(output, cost)
+                    except Exception as e:
+                        return (ROW_ERROR, position, idx, row, e, traceback.format_exc())
+                    if output is None:
+                        return (ROW_FILTERED, label)
+                    row = output
+            return (ROW_OK, row)
+
+    async def transform_rows(rows):
+        in_flight = asyncio.Semaphore(max_in_flight)
+        costs = {}
+        # gather keeps input order, whatever order the rows complete in
+        results = await asyncio.gather(*(transform_row(row, in_flight, costs) for row in rows))
+        return list(results), costs
+
+    logger.info(f"Running transformations on an event loop, up to {max_in_flight} row(s) in flight")
+    try:
+        run_batches(
+            app, input_topic, output_topic, context, errors, stop,
+            lambda rows: loop.run_until_complete(transform_rows(rows)),
+            ASYNC_BATCH_SIZE,
+        )
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
@@ -0,0 +1,59 @@
+# scripts.py
+import ast
+import linecache
+import types
+
+# Optional per-script hooks, run once per worker rather than once per row
+SETUP_HOOK = "setup"
+TEARDOWN_HOOK = "teardown"
+# Declares a deterministic transformation: a function of the row, or the names of
+# the fields its result depends on. Results are then cached by that key.
+CACHE_KEY_HOOK = "cache_key"
+
+
+def transformation_filename(label: str) -> str:
+    return f"<transformation #{label}>"
+
+
+def find_transformation(tree: ast.Module) -> ast.FunctionDef | ast.AsyncFunctionDef | None:
+    """
+    The transformation of a script: its first top-level def that is not a hook
+    """
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name not in (SETUP_HOOK, TEARDOWN_HOOK, CACHE_KEY_HOOK):
+            return node
+    return None
+
+
+def is_async_script(transformation_script: str) -> bool:
+    try:
+        return isinstance(find_transformation(ast.parse(transformation_script)), ast.AsyncFunctionDef)
+    except SyntaxError:
+        # Reported when the script is loaded
+        return False
+
+
+def load_transformation(transformation_script: str, label: str):
+    """
+    Load a transformation script as a module and return (module, transformation function)
+    """
+    tree = ast.parse(transformation_script)
+    node = find_transformation(tree)
+    if node is None:
+        raise ValueError("No function definition found in script.")
+    function_name = node.name
+
+    # Load the script as a real module, so module-level imports, constants
+    # and lookup tables are globals the transformation function can see
+    filename = transformation_filename(label)
+    module = types.ModuleType(f"transformation_{label.replace('.', '_')}")
+    module.__file__ = filename
+    source_lines = transformation_script.splitlines(keepends=True)
+    # Lets tracebacks and the profiler show the script's source lines
+    linecache.cache[filename] = (len(transformation_script), None, source_lines, filename)
+    exec(compile(tree, filename, "exec"), module.__dict__)
+
+    user_func = getattr(module, function_name, None)
+    if not callable(user_func):
+        raise ValueError(f"Function '{function_name}' not found or not callable after execution.")
+    return module, user_func
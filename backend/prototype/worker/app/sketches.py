@@ -0,0 +1,182 @@
+# sketches.py
+import time
+
+from app.windows import numeric, selected
+from shared.sketches import CountMinSketch, HyperLogLog, TDigest, stable_hash
+from shared.transforms import percentile_of
+from shared.transforms.sketches import SKETCH_DISTINCT, SKETCH_HEAVY_HITTERS, SKETCH_QUANTILES
+
+_SKETCH_TYPES = {
+    SKETCH_QUANTILES: TDigest,
+    SKETCH_DISTINCT: HyperLogLog,
+    SKETCH_HEAVY_HITTERS: CountMinSketch,
+}
+
+
+class IntervalSketches:
+    def __init__(self, spec: dict):
+        """
+        The sketches of every field over one interval.
+
+        Parameters
+        ----------
+        spec : dict
+            Sketch node, see shared.transforms.sketch_spec.
+        """
+        self.spec = spec
+        # field -> sketch name -> sketch, and values counted per field
+        self.sketches: dict[str, dict[str, object]] = {}
+        self.counts: dict[str, int] = {}
+
+    def _new(self, name: str):
+        if name == SKETCH_QUANTILES:
+            return TDigest(self.spec["compression"])
+        if name == SKETCH_DISTINCT:
+            return HyperLogLog(self.spec["precision"])
+        return CountMinSketch(self.spec["width"], self.spec["depth"], self.spec["top_k"])
+
+    def _field(self, field: str) -> dict:
+        sketches = self.sketches.get(field)
+        if sketches is None:
+            sketches = self.sketches[field] = {name: self._new(name) for name in self.spec["sketches"]}
+        return sketches
+
+    def record(self, row: dict) -> None:
+        fields = self.spec["fields"]
+        if fields is None:
+            values = selected(row, None)
+        else:
+            # Distinct counts and heavy hitters also apply to non-numeric values
+            values = ((field, row[field]) for field in fields if row.get(field) is not None)
+        hashing = SKETCH_DISTINCT in self.spec["sketches"] or SKETCH_HEAVY_HITTERS in self.spec["sketches"]
+        for field, value in values:
+            self.counts[field] = self.counts.get(field, 0) + 1
+            # One hash of the value serves both hashed sketches
+            hashed = stable_hash(value) if hashing else None
+            for name, sketch in self._field(field).items():
+                if name == SKETCH_QUANTILES:
+                    if numeric(value):
+                        sketch.record(value)
+                else:
+                    sketch.record(value, hashed=hashed)
+
+    def merge(self, row: dict) -> None:
+        """
+        Merge the states of a row emitted by another sketch node
+        """
+        field = row.get("field")
+        if field is None or (self.spec["fields"] is not None and field not in self.spec["fields"]):
+            return
+        self.counts[field] = self.counts.get(field, 0) + row.get("count", 0)
+        states = row.get("state", {})
+        for name, sketch in self._field(field).items():
+            if name in states:
+                sketch.merge(_SKETCH_TYPES[name].from_dict(states[name]))
+
+    def summary(self, start_ms: int, end_ms: int, source: str, percentiles: list[tuple[str, float]]) -> list[dict]:
+        rows = []
+        for field, field_sketches in self.sketches.items():
+            emitted = {
+                "start": start_ms,
+                "end": end_ms,
+                "source": source,
+                "field": field,
+                "count": self.counts.get(field, 0),
+                "state": {},
+            }
+            for name, sketch in field_sketches.items():
+                if name == SKETCH_QUANTILES:
+                    emitted[name] = {label: sketch.percentile(p) for label, p in percentiles}
+                elif name == SKETCH_DISTINCT:
+                    emitted[name] = sketch.count()
+                else:
+                    emitted[name] = sketch.heavy_hitters()
+                emitted["state"][name] = sketch.to_dict()
+            rows.append(emitted)
+        return rows
+
+
+class SketchOperator:
+    def __init__(self, spec: dict, source: str):
+        """
+        Streaming sketches of many fields, emitted and reset every interval_ms as
+        one row per field, which keeps rows small however many fields there are.
+        Memory is fixed per field and sketch, whatever the throughput.
+
+        Intervals are aligned to the wall clock, so the rows emitted by replicas
+        cover the same intervals and can be merged by a downstream node with
+        "merge": true. Rows are emitted when the first row after an interval
+        arrives, and for the interval in progress by flush() when the worker stops.
+
+        A merging node combines the rows of each interval by their "start" and
+        "end", and emits an interval once a row of a later interval arrives, which
+        gives every upstream node about one interval to deliver its rows. Rows
+        arriving after that are emitted as another row of the same interval.
+
+        Parameters
+        ----------
+        spec : dict
+            Sketch node, see shared.transforms.sketch_spec.
+        source : str
+            Identifies this worker in the emitted rows.
+        """
+        self.spec = spec
+        self.source = source
+        self.interval_ms = spec["interval_ms"]
+        self.percentiles = [(p, percentile_of(p)) for p in spec["percentiles"]]
+        self._reset(time.time() * 1000)
+        # (start, end) -> merged sketches of the intervals not emitted yet
+        self.pending: dict[tuple[int, int], IntervalSketches] = {}
+        # Start of the latest interval seen in merged rows
+        self.latest_start: int | None = None
+
+    def _reset(self, now_ms: float) -> None:
+        self.start_ms = int(now_ms // self.interval_ms * self.interval_ms)
+        self.current = IntervalSketches(self.spec)
+
+    def merge(self, row: dict) -> list[dict]:
+        start, end = row.get("start"), row.get("end")
+        if not isinstance(start, int) or not isinstance(end, int):
+            return []
+        interval = self.pending.get((start, end))
+        if interval is None:
+            interval = self.pending[(start, end)] = IntervalSketches(self.spec)
+        interval.merge(row)
+
+        self.latest_start = start if self.latest_start is None else max(self.latest_start, start)
+        result = []
+        for start, end in sorted(self.pending):
+            if end > self.latest_start:
+                break
+            result.extend(self.pending.pop((start, end)).summary(start, end, self.source, self.percentiles))
+        return result
+
+    def flush(self) -> list[dict]:
+        """
+        Rows of the intervals not emitted yet, for when the worker stops
+        """
+        if self.spec["merge"]:
+            result = []
+            for start, end in sorted(self.pending):
+                result.extend(self.pending[(start, end)].summary(start, end, self.source, self.percentiles))
+            self.pending.clear()
+            return result
+        result = self.current.summary(self.start_ms, self.start_ms + self.interval_ms, self.source, self.percentiles)
+        self._reset(time.time() * 1000)
+        return result
+
+    def __call__(self, row: dict) -> list[dict]:
+        """
+        Add a row to the sketches; returns the rows summarizing the previous
+        interval once it is over, otherwise none
+        """
+        if self.spec["merge"]:
+            return self.merge(row)
+
+        now_ms = time.time() * 1000
+        result = []
+        if now_ms >= self.start_ms + self.interval_ms:
+            result = self.current.summary(self.start_ms, self.start_ms + self.interval_ms, self.source, self.percentiles)
+            self._reset(now_ms)
+        self.current.record(row)
+        return result
@@ -0,0 +1,75 @@
+# termination.py
+import time
+
+from app.backfill import BackfillRange
+
+STOP_END_OF_RANGE = "end_of_range"
+STOP_MESSAGE_COUNT = "message_count"
+STOP_IDLE_TIMEOUT = "idle_timeout"
+
+
+class StopConditions:
+    def __init__(
+        self,
+        backfill: BackfillRange | None = None,
+        max_messages: int | None = None,
+        idle_timeout: float | None = None,
+    ):
+        """
+        Conditions under which a segment stops itself before its runtime is over.
+
+        Parameters
+        ----------
+        backfill : BackfillRange | None
+            Stop once the end of the backfill range is reached.
+        max_messages : int | None
+            Stop after this many input messages.
+        idle_timeout : float | None
+            Stop after this many seconds without input.
+        """
+        self.backfill = backfill
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.messages = 0
+        self.last_input = time.monotonic()
+        # Set once a condition is met
+        self.reason: str | None = None
+
+    def on_message(self, partition: int, offset: int) -> bool:
+        """
+        Account for one input message; returns True once the segment should stop
+        """
+        self.messages += 1
+        self.last_input = time.monotonic()
+        if self.reason is None:
+            if self.backfill is not None and self.backfill.on_message(partition, offset):
+                self.reason = STOP_END_OF_RANGE
+            elif self.max_messages and self.messages >= self.max_messages:
+                self.reason = STOP_MESSAGE_COUNT
+        return self.reason is not None
+
+    def admits(self, partition: int, offset: int) -> bool:
+        """
+        False for messages beyond the backfill range, which are neither transformed nor committed
+        """
+        return self.backfill is None or self.backfill.in_range(partition, offset)
+
+    def check_idle(self) -> bool:
+        if self.reason is None and self.idle_timeout and time.monotonic() - self.last_input >= self.idle_timeout:
+            self.reason = STOP_IDLE_TIMEOUT
+        return self.reason is not None
+
+    def batch_limit(self, batch_size: int) -> int:
+        # Never fetch beyond the message count, so the last batch does not overshoot it
+        if self.max_messages:
+            return max(1, min(batch_size, self.max_messages - self.messages))
+        return batch_size
+
+
+def stop_when_idle(app, stop: StopConditions):
+    """
+    Stop the app once the segment has been without input for idle_timeout
+    """
+    while not stop.check_idle():
+        time.sleep(min(1.0, stop.idle_timeout))
+    app.stop()
@@ -0,0 +1,160 @@
+# windows.py
+import hashlib
+import json
+import math
+from collections.abc import Iterable
+
+from quixstreams.dataframe.windows.aggregations import BaseAggregator, BaseCollector
+
+from shared.transforms import STATS, percentile_of
+from shared.transforms.windows import EMIT_CURRENT, WINDOW_HOPPING, WINDOW_SLIDING
+
+# Index of each statistic in the per-field state: [count, sum, min, max]
+_COUNT, _SUM, _MIN, _MAX = range(4)
+
+
+def numeric(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def selected(row: dict, fields: list[str] | None) -> Iterable[tuple[str, float]]:
+    """
+    (field, value) of the numeric values of `fields` in a row, or of all its numeric values
+    """
+    if fields is None:
+        return ((field, value) for field, value in row.items() if numeric(value))
+    return ((field, row[field]) for field in fields if numeric(row.get(field)))
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """
+    Linearly interpolated percentile of sorted values
+    """
+    rank = (len(ordered) - 1) * p / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _suffix(name: str, fields: list[str] | None, aggregations: list[str]) -> str:
+    # Changes with the parameters, so a changed window starts from fresh state
+    digest = hashlib.blake2b(json.dumps([fields, aggregations]).encode(), digest_size=6).hexdigest()
+    return f"{name}/{digest}"
+
+
+class ChannelStats(BaseAggregator):
+    def __init__(self, fields: list[str] | None, aggregations: list[str]):
+        """
+        count/sum/mean/min/max of many fields at once. The whole row is one
+        aggregation, so a window update is one state write however wide the row is.
+
+        Parameters
+        ----------
+        fields : list[str] | None
+            Fields to aggregate, or None for every numeric field.
+        aggregations : list[str]
+            Statistics to report, out of shared.transforms.STATS.
+        """
+        self.fields = fields
+        self.aggregations = [a for a in aggregations if a in STATS]
+
+    @property
+    def state_suffix(self) -> str:
+        return _suffix("ChannelStats", self.fields, self.aggregations)
+
+    def initialize(self) -> dict:
+        return {}
+
+    def agg(self, old: dict, new: dict, timestamp: int) -> dict:
+        for field, value in selected(new, self.fields):
+            stats = old.get(field)
+            if stats is None:
+                old[field] = [1, value, value, value]
+                continue
+            stats[_COUNT] += 1
+            stats[_SUM] += value
+            stats[_MIN] = min(stats[_MIN], value)
+            stats[_MAX] = max(stats[_MAX], value)
+        return old
+
+    def result(self, value: dict) -> dict:
+        results = {}
+        for field, stats in value.items():
+            for aggregation in self.aggregations:
+                if aggregation == "count":
+                    results[f"{field}_count"] = stats[_COUNT]
+                elif aggregation == "sum":
+                    results[f"{field}_sum"] = stats[_SUM]
+                elif aggregation == "mean":
+                    results[f"{field}_mean"] = stats[_SUM] / stats[_COUNT]
+                elif aggregation == "min":
+                    results[f"{field}_min"] = stats[_MIN]
+                else:
+                    results[f"{field}_max"] = stats[_MAX]
+        return results
+
+
+class ChannelPercentiles(BaseCollector):
+    def __init__(self, fields: list[str] | None, aggregations: list[str]):
+        """
+        Exact percentiles of many fields, computed from every row of the window
+        once it closes. Memory grows with the rows per window.
+
+        Parameters
+        ----------
+        fields : list[str] | None
+            Fields to aggregate, or None for every numeric field.
+        aggregations : list[str]
+            Percentiles to report, such as "p50" and "p99".
+        """
+        self.fields = fields
+        self.percentiles = [(a, percentile_of(a)) for a in aggregations if percentile_of(a) is not None]
+
+    @property
+    def column(self) -> None:
+        # The whole row
+        return None
+
+    def result(self, items: Iterable[dict]) -> dict:
+        values: dict[str, list[float]] = {}
+        for row in items:
+            for field, value in selected(row, self.fields):
+                values.setdefault(field, []).append(value)
+
+        results = {}
+        for field, field_values in values.items():
+            field_values.sort()
+            for name, p in self.percentiles:
+                results[f"{field}_{name}"] = percentile(field_values, p)
+        return results
+
+
+def apply_window(sdf, spec: dict, name: str):
+    """
+    Replace the rows of `sdf` with the aggregates of the window described by
+    `spec` (see shared.transforms.window_spec), kept in the app's state store
+    under `name`, which must stay the same across restarts.
+    """
+    if spec["type"] == WINDOW_HOPPING:
+        window = sdf.hopping_window(spec["duration_ms"], spec["step_ms"], grace_ms=spec["grace_ms"], name=name)
+    elif spec["type"] == WINDOW_SLIDING:
+        window = sdf.sliding_window(spec["duration_ms"], grace_ms=spec["grace_ms"], name=name)
+    else:
+        window = sdf.tumbling_window(spec["duration_ms"], grace_ms=spec["grace_ms"], name=name)
+
+    operations = {}
+    if any(a in STATS for a in spec["aggregations"]):
+        operations["stats"] = ChannelStats(spec["fields"], spec["aggregations"])
+    if any(percentile_of(a) is not None for a in spec["aggregations"]):
+        operations["percentiles"] = ChannelPercentiles(spec["fields"], spec["aggregations"])
+    window = window.agg(**operations)
+    sdf = window.current() if spec["emit"] == EMIT_CURRENT else window.final()
+
+    def flatten(result):
+        return {
+            "start": result["start"],
+            "end": result["end"],
+            **result.get("stats", {}),
+            **result.get("percentiles", {}),
+        }
+    return sdf.apply(flatten)
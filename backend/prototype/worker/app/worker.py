@@ -1,36 +1,188 @@
 # worker.py
+import functools
 import os
 import json
+import socket
 import sys
 import traceback
-import uuid
-import ast
-from quixstreams import Application
+import threading
+import time
+from quixstreams import Application, message_context
+from quixstreams.models.serializers.exceptions import SerializationError
+from quixstreams.models.serializers.json import JSONDeserializer, JSONSerializer
+from app.backfill import MODE_BACKFILL, MODE_STREAM, resolve_backfill_range, rewind_to_backfill_end
+from app.cache import cached_transformation
+from app.context import WorkerContext
+from app.errors import ERROR_POLICY_DLQ, ERROR_POLICY_FAIL, ErrorHandler
+from app.metrics import metrics, rows_in_rate, rows_out_rate, rows_total, transformation_fingerprints
+from app.passthrough import run_passthrough
+from app.pool import allotted_cpus
+from app.positions import START_COMMITTED, apply_start_position
+from app.runners import EXECUTION_INLINE, EXECUTION_PROCESS_POOL, run_async, run_process_pool
+from app.scripts import SETUP_HOOK, TEARDOWN_HOOK, is_async_script, load_transformation, transformation_filename
+from app.sketches import SketchOperator
+from app.termination import STOP_END_OF_RANGE, StopConditions, stop_when_idle
+from app.windows import apply_window
 from shared.logger import get_logger
-from shared.events import emit_event
+from shared.events import emit_event, ObservationPoller
+from shared.metrics import (
+    LatencyTracker,
+    ORIGIN_HEADER,
+    SamplingProfiler,
+    origin_header,
+    read_origin_ns,
+    start_metrics_server,
+)
+from shared.transforms import (
+    compile_native,
+    is_native,
+    is_sketch,
+    is_window,
+    plan_stage,
+    sketch_spec,
+    step_fingerprint,
+    window_spec,
+)
 
 logger = get_logger("Worker")
 
-def get_callable_function_for_transformation(idx, transformation_script):
-    local_scope = {}
+# --------------------
+# METRICS
+# --------------------
+# Seconds between two reports of the cumulative row counts, archived with the run
+THROUGHPUT_REPORT_INTERVAL = float(os.environ.get("THROUGHPUT_REPORT_INTERVAL", "5"))
+
+
+class TimedJSONDeserializer(JSONDeserializer):
+    def __call__(self, value, ctx):
+        start = time.perf_counter()
+        try:
+            return super().__call__(value, ctx)
+        finally:
+            metrics.inc("serialization_seconds_total", time.perf_counter() - start, direction="deserialize")
+
+
+class TimedJSONSerializer(JSONSerializer):
+    def __call__(self, value, ctx):
+        start = time.perf_counter()
+        try:
+            return super().__call__(value, ctx)
+        finally:
+            metrics.inc("serialization_seconds_total", time.perf_counter() - start, direction="serialize")
+
+
+def on_producer_error(exc, row, logger) -> bool:
+    # Count the error, then keep quixstreams' default behaviour of re-raising it
+    metrics.inc("produce_errors_total")
+    return False
+
+
+# --------------------
+# ON-DEMAND PROFILING
+# --------------------
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = 300
+
+# Pseudo filename of each loaded transformation -> its source lines, so profiler
+# samples can be attributed to transformations and lines
+transformation_sources: dict[str, list[str]] = {}
+profiling_lock = threading.Lock()
+
+
+def start_profiling(params: dict) -> dict:
+    """
+    Control hook of the metrics server: profile the running transformations for N seconds
+    """
+    seconds = float(params.get("seconds", "10"))
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise ValueError(f"seconds must be in (0, {PROFILE_MAX_SECONDS}]")
+    if execution == EXECUTION_PROCESS_POOL:
+        # The sampler only sees this process's main thread, not the pool processes
+        return {"status": "unsupported", "reason": "profiling is not supported with process_pool execution"}
+    if not profiling_lock.acquire(blocking=False):
+        return {"status": "already_profiling"}
+
+    threading.Thread(target=run_profiling, args=(seconds,), name="profiling", daemon=True).start()
+    return {"status": "profiling", "seconds": seconds}
+
+
+def run_profiling(seconds: float):
+    try:
+        calls_before = metrics.snapshot("transformation_calls_total")
+        time_before = metrics.snapshot("transformation_seconds_total")
+
+        # Transformations run on the main thread, inside app.run()
+        profiler = SamplingProfiler(
+            threading.main_thread().ident,
+            include=transformation_sources.__contains__,
+            interval=PROFILE_SAMPLE_INTERVAL,
+        ).start()
+        time.sleep(seconds)
+        profiler.stop()
+
+        calls_after = metrics.snapshot("transformation_calls_total")
+        time_after = metrics.snapshot("transformation_seconds_total")
+        timings = []
+        for key, calls in sorted(calls_after.items()):
+            calls -= calls_before.get(key, 0)
+            total = time_after.get(key, 0) - time_before.get(key, 0)
+            timings.append({
+                "transformation": dict(key)["transformation"],
+                "calls": int(calls),
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total * 1000 / calls, 4) if calls else None,
+            })
+
+        emit_event(
+            pipeline_id=PIPELINE_ID,
+            segment_index=SEGMENT_INDEX,
+            category="metrics",
+            type="profile",
+            data={
+                "duration_s": seconds,
+                "transformations": timings,
+                **profiler.report(transformation_sources),
+            },
+        )
+        logger.info(f"Profiling finished after {seconds}s ({profiler.samples} samples)")
+    except Exception as e:
+        logger.exception(f"Profiling failed: {e}")
+    finally:
+        profiling_lock.release()
+
+
+# (label, teardown) of the loaded transformations, run when the worker stops
+teardown_hooks: list[tuple[str, object]] = []
+
+
+def get_callable_function_for_transformation(idx, transformation_script, segment_index, label):
     try:
-        tree = ast.parse(transformation_script)
-        function_name = None
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                function_name = node.name
-                break
-        if not function_name:
-            raise ValueError("No function definition found in script.")
-        
-        exec(transformation_script, {}, local_scope)
-        user_func = local_scope.get(function_name)
-        
-        if not user_func:
-            raise ValueError(f"Function '{function_name}' not found or not callable after execution.")
-        
-        logger.info(f"Loaded transformation function: {function_name}")
-        return user_func
+        transformation_fingerprints[label] = step_fingerprint(transformation_script)
+        if isinstance(transformation_script, list):
+            # Fused native transforms, see shared.transforms
+            logger.info(f"Compiled {len(transformation_script)} native transform(s) as transformation #{label}")
+            return compile_native(transformation_script)
+
+        module, user_func = load_transformation(transformation_script, label)
+        transformation_sources[transformation_filename(label)] = transformation_script.splitlines()
+        transformation = cached_transformation(
+            module, user_func, cache_max_entries, cache_ttl,
+            lambda event, label=label: metrics.inc(f"cache_{event}_total", transformation=label),
+        )
+        if transformation is not user_func:
+            logger.info(f"Transformation #{label} is deterministic, caching up to {cache_max_entries} result(s)")
+
+        setup = getattr(module, SETUP_HOOK, None)
+        if callable(setup):
+            logger.info(f"Running setup() of transformation #{label}")
+            setup()
+
+        teardown = getattr(module, TEARDOWN_HOOK, None)
+        if callable(teardown):
+            teardown_hooks.append((label, teardown))
+
+        logger.info(f"Loaded transformation function: {user_func.__name__}")
+        return transformation
     except Exception as e:
         logger.exception(f"Script compile error: {e}")
         emit_event(
@@ -40,103 +192,340 @@ def get_callable_function_for_transformation(idx, transformation_script):
             type="failed",
             data={
                 "message": (
-                    f"[ERROR] Worker crashed at Segment #{SEGMENT_INDEX+1}, "
+                    f"[ERROR] Worker crashed at Segment #{segment_index+1}, "
                     f"Transformation #{idx+1}:\n\n{type(e).__name__}: {e}"
                 ),
                 "traceback": traceback.format_exc(),
             },
         )
+        run_teardown_hooks()
         sys.exit(1)
 
+def run_teardown_hooks():
+    # Reverse order, so later transformations can still rely on earlier ones
+    for label, teardown in reversed(teardown_hooks):
+        try:
+            teardown()
+        except Exception as e:
+            logger.exception(f"teardown() of transformation #{label} failed: {e}")
+    teardown_hooks.clear()
+
+
+def report_throughput():
+    """
+    Cumulative rows in and out of this worker; the manager archives the rows
+    entering the pipeline's first segment and leaving its last one
+    """
+    emit_event(
+        pipeline_id=PIPELINE_ID,
+        segment_index=SEGMENT_INDEX,
+        category="metrics",
+        type="throughput",
+        data={
+            "worker": socket.gethostname(),
+            "rows_in": rows_total("rows_in_total"),
+            "rows_out": rows_total("rows_out_total"),
+            # Rows leave the worker from the last segment chained into it
+            "last_segment": stages[-1]["segment_index"],
+        },
+    )
+
+
+def report_throughput_periodically(interval: float):
+    while True:
+        time.sleep(interval)
+        report_throughput()
+
+
+def flush_sketches(app, output_topic, operators: list[SketchOperator]):
+    """
+    Produce the rows of the intervals the sketch nodes have not emitted yet.
+    A sketch node is the last transformation of its segment, so nothing else
+    would have transformed them.
+    """
+    rows = [row for operator in operators for row in operator.flush()]
+    if not rows:
+        return
+    producer = app.get_producer()
+    for row in rows:
+        message = output_topic.serialize(value=row, headers=[origin_header(time.time_ns())])
+        producer.produce(
+            topic=output_topic.name,
+            key=message.key,
+            value=message.value,
+            headers=message.headers,
+            timestamp=int(time.time() * 1000),
+        )
+    producer.flush()
+    metrics.inc("rows_out_total", len(rows))
+    logger.info(f"Flushed {len(rows)} sketch row(s) of unfinished intervals")
+
+
+def emit_segment_summary(reason: str, started: float):
+    """
+    Report what a self-terminating segment achieved before it exits
+    """
+    duration = time.monotonic() - started
+    rows_in = rows_total("rows_in_total")
+    rows_out = rows_total("rows_out_total")
+    logger.info(f"Segment finished ({reason}): {rows_in} rows in {duration:.1f}s")
+    emit_event(
+        pipeline_id=PIPELINE_ID,
+        segment_index=SEGMENT_INDEX,
+        category="metrics",
+        type="segment_summary",
+        data={
+            "reason": reason,
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+            "duration_s": round(duration, 3),
+            "rows_per_s": round(rows_in / duration, 3) if duration > 0 else None,
+        },
+    )
+
+
 def main():
     try:
         logger.info(
             f"Worker starting | input={input_topic_name} -> output={output_topic_name}"
         )
         logger.info(f"Loaded {len(transformations)} transformation(s)")
+        for stage in stages[1:]:
+            logger.info(
+                f"Chained segment #{stage['segment_index']+1} in memory | "
+                f"{len(stage['transformations'])} transformation(s) -> output={stage['output_topic']}"
+            )
 
         # ------------------------------------
-        # QUIX SETUP - Unique Consumer Group
+        # QUIX SETUP - Stable Consumer Group
         # ------------------------------------
-        consumer_group = f"worker_{uuid.uuid4().hex[:8]}"
-        
+        # Derived from the pipeline and segment, so a restarted segment resumes
+        # from its committed offsets instead of replaying the whole topic
+        consumer_group = f"worker_{PIPELINE_ID}_{SEGMENT_INDEX}"
+
+        def on_consumer_error(exc, msg, logger) -> bool:
+            # Kafka errors come without a message, keep quixstreams' default of raising them
+            if msg is None or not isinstance(exc, SerializationError):
+                return False
+            value = msg.value()
+            errors.handle(
+                stages[0], None, exc,
+                value.decode("utf-8", "backslashreplace") if value is not None else None,
+                msg.key(), msg.timestamp()[1], msg.headers(),
+                source={"topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset()},
+            )
+            # Delivered before the offsets of the rows after it can be committed
+            errors.flush()
+            return True
+
         app = Application(
             broker_address=broker_address,
             auto_offset_reset="earliest",
-            consumer_group=consumer_group
+            consumer_group=consumer_group,
+            on_consumer_error=on_consumer_error,
+            on_producer_error=on_producer_error,
         )
 
-        input_topic = app.topic(input_topic_name, value_deserializer="json")
-        output_topic = app.topic(output_topic_name, value_serializer="json")
+        input_topic = app.topic(input_topic_name, value_deserializer=TimedJSONDeserializer())
+        # Chained stages pass rows in memory, only the last stage's output goes to Kafka
+        output_topic = app.topic(stages[-1]["output_topic"], value_serializer=TimedJSONSerializer())
+        apply_start_position(app, input_topic.name, start_position, start_timestamp)
+
+        # Stream events are only emitted while a client is watching this pipeline
+        observation = ObservationPoller(PIPELINE_ID).start()
+
+        # Per-stage latency histograms, reported to the backend every interval
+        latency = LatencyTracker(report_interval=latency_report_interval)
+
+        context = WorkerContext(PIPELINE_ID, stages, observation, latency)
+
+        dead_letter_producer = None
+        for stage in stages:
+            if stage["error_policy"] != ERROR_POLICY_DLQ:
+                continue
+            stage["dead_letter"] = app.topic(
+                stage["dead_letter_topic"],
+                key_serializer="bytes",
+                # Failing rows are not guaranteed to be JSON, keep them readable anyway
+                value_serializer=JSONSerializer(dumps=lambda value: json.dumps(value, default=str)),
+            )
+            if dead_letter_producer is None:
+                # Shared by the dead-letter topics of all stages
+                dead_letter_producer = app.get_producer()
+            logger.info(f"Routing failing rows to dead-letter topic '{stage['dead_letter_topic']}'")
+        errors = ErrorHandler(context, dead_letter_producer)
+
+        threading.Thread(
+            target=errors.report_periodically,
+            args=(latency_report_interval,),
+            name="error-reporter",
+            daemon=True,
+        ).start()
+        threading.Thread(
+            target=report_throughput_periodically,
+            args=(THROUGHPUT_REPORT_INTERVAL,),
+            name="throughput-reporter",
+            daemon=True,
+        ).start()
+
+        # Scraped by the manager through the container's metrics_port label
+        start_metrics_server(metrics, actions={"/profile": start_profiling})
+
+        started = time.monotonic()
+        stop = StopConditions(max_messages=max_messages, idle_timeout=idle_timeout)
+        if mode == MODE_BACKFILL:
+            stop.backfill = resolve_backfill_range(app, input_topic.name, end_timestamp)
+            if stop.backfill.done:
+                emit_segment_summary(STOP_END_OF_RANGE, started)
+                return
+
+        if not any(stage["transformations"] for stage in stages):
+            logger.info("No transformations provided — relaying raw messages unchanged")
+            run_passthrough(app, input_topic, output_topic, context, stop)
+            if stop.reason:
+                emit_segment_summary(stop.reason, started)
+            return
+
+        runner = None
+        if execution == EXECUTION_PROCESS_POOL:
+            runner = functools.partial(
+                run_process_pool,
+                pool_workers=pool_workers,
+                cache_max_entries=cache_max_entries,
+                cache_ttl=cache_ttl,
+            )
+        elif any(
+            is_async_script(transformation)
+            for stage in stages
+            for transformation in stage["transformations"]
+            if not is_native(transformation)
+        ):
+            runner = functools.partial(run_async, load=get_callable_function_for_transformation, max_in_flight=max_in_flight)
+        if runner and any(is_window(t) or is_sketch(t) for stage in stages for t in stage["transformations"]):
+            # Window and sketch state lives in the quixstreams pipeline below, which runs rows one at a time
+            raise ValueError("Window and sketch nodes cannot run with process_pool execution or async transformations")
+        if runner:
+            try:
+                runner(app, input_topic, output_topic, context, errors, stop)
+            finally:
+                errors.flush()
+                run_teardown_hooks()
+            if stop.reason:
+                emit_segment_summary(stop.reason, started)
+            return
 
         # Build DataFrame
         sdf = app.dataframe(input_topic)
 
-        def handle_input(row):
+        def handle_input(row, key, timestamp, headers):
+            latency.on_receive(read_origin_ns(headers, timestamp))
+            metrics.inc("rows_in_total")
+            rows_in_rate.mark()
             logger.info(f"INPUT ROW: {row}")
 
+            ctx = message_context()
+            if stop.on_message(ctx.partition, ctx.offset):
+                # The current row is still processed and committed before the app stops
+                app.stop()
+
             # emit event to backend
-            emit_event(
-                pipeline_id=PIPELINE_ID,
-                segment_index=SEGMENT_INDEX,
-                category="stream",
-                type="input",
-                topic=input_topic_name,
-                data=row,
-            )
+            context.emit_row(stages[0], "input", row)
             return row
 
-        sdf = sdf.update(handle_input)
-        
+        if stop.backfill is not None:
+            # Finished partitions keep delivering rows beyond the range, drop them
+            sdf = sdf.filter(lambda row: stop.admits(message_context().partition, message_context().offset))
+        sdf = sdf.update(handle_input, metadata=True)
+        sketch_operators = []
+
+        def stage_events(stage, event_type):
+            # Stream events at the in-memory boundaries of chained stages, so they
+            # show up exactly as if the stages ran in their own workers
+            def handle_boundary(row):
+                context.emit_row(stage, event_type, row)
+            return handle_boundary
+
         # --------------------
         # APPLY TRANSFORMATIONS
         # --------------------
-        if not transformations:
-            logger.info("No transformations provided — passing stream through unchanged")
-        else:
-            for idx, script in enumerate(transformations):
-                logger.info(f"Applying transformation #{idx+1}")
-                func = get_callable_function_for_transformation(idx, script)
-                def safe_func(row, func=func, idx=idx):
+        for position, stage in enumerate(stages):
+            if position > 0:
+                sdf = sdf.update(stage_events(stage, "input"))
+
+            for idx, script in plan_stage(stage["transformations"]):
+                label = context.label(stage["segment_index"], idx)
+                logger.info(f"Applying transformation #{label}")
+                if is_window(script):
+                    # Aggregates are kept per message key in the app's state store, backed
+                    # by a changelog topic, so open windows survive restarts
+                    sdf = apply_window(sdf, window_spec(script), f"window_{stage['segment_index']}_{idx}")
+                    continue
+                if is_sketch(script):
+                    # Emits one row per field and interval, rows in between are absorbed
+                    sketches = SketchOperator(sketch_spec(script), socket.gethostname())
+                    sketch_operators.append(sketches)
+                    sdf = sdf.apply(sketches, expand=True)
+                    continue
+                func = get_callable_function_for_transformation(idx, script, stage["segment_index"], label)
+                def safe_func(row, key, timestamp, headers, func=func, idx=idx, stage=stage, label=label):
+                    start = time.perf_counter()
                     try:
-                        return func(row)
+                        result = func(row)
                     except Exception as e:
-                        logger.exception(f"Error in transformation #{idx+1}: {e}")
-                        emit_event(
-                            pipeline_id=PIPELINE_ID,
-                            segment_index=SEGMENT_INDEX,
-                            category="lifecycle",
-                            type="failed",
-                            data={
-                                "message": (
-                                    f"[ERROR] Worker crashed at Segment #{SEGMENT_INDEX+1}, "
-                                    f"Transformation #{idx+1}:\n\n{type(e).__name__}: {e}"
-                                ),
-                                "traceback": traceback.format_exc(),
-                            },
-                        )
-                        sys.exit(1)
-                sdf = sdf.apply(safe_func).filter(lambda x: x is not None)
+                        errors.handle(stage, idx, e, row, key, timestamp, headers)
+                        return None
+                    finally:
+                        metrics.inc("transformation_calls_total", transformation=label)
+                        metrics.inc("transformation_seconds_total", time.perf_counter() - start, transformation=label)
+                    if result is None:
+                        metrics.inc("rows_filtered_total", transformation=label)
+                    return result
+                sdf = sdf.apply(safe_func, metadata=True).filter(lambda x: x is not None)
+
+            if position < len(stages) - 1:
+                sdf = sdf.update(stage_events(stage, "output"))
 
         def handle_output(row):
+            latency.on_transformed()
             logger.info(f"OUTPUT ROW: {row}")
 
             # emit event to backend
-            emit_event(
-                pipeline_id=PIPELINE_ID,
-                segment_index=SEGMENT_INDEX,
-                category="stream",
-                type="output",
-                topic=output_topic_name,
-                data=row,
-            )
+            context.emit_row(stages[-1], "output", row)
             return row
 
+        def ensure_origin_header(row, key, timestamp, headers):
+            # Keep the origin of rows entering the pipeline here, so downstream
+            # segments measure latency from the same point in time
+            if any(name == ORIGIN_HEADER for name, _ in headers):
+                return headers
+            return [*headers, origin_header(latency.current_origin_ns)]
+
+        def handle_produced(row):
+            latency.on_produced()
+            metrics.inc("rows_out_total")
+            rows_out_rate.mark()
+            context.report_latency()
+
         sdf = sdf.apply(handle_output)    
-        sdf.to_topic(output_topic)
+        sdf = sdf.set_headers(ensure_origin_header)
+        sdf = sdf.to_topic(output_topic)
+        sdf.update(handle_produced)
+
+        if idle_timeout:
+            threading.Thread(target=stop_when_idle, args=(app, stop), name="idle-watch", daemon=True).start()
 
         logger.info("Worker pipeline initialized — running")
-        app.run()
+        try:
+            app.run()
+        finally:
+            errors.flush()
+            run_teardown_hooks()
+        flush_sketches(app, output_topic, sketch_operators)
+        if stop.backfill is not None:
+            rewind_to_backfill_end(app, input_topic.name, stop.backfill)
+
+        if stop.reason:
+            emit_segment_summary(stop.reason, started)
 
     except Exception as e:
         logger.error(f"Worker crashed with fatal error: {e}")
@@ -152,6 +541,9 @@ def main():
             },
         )
         sys.exit(1)
+    finally:
+        # The rows since the last periodic report count towards the archived run as well
+        report_throughput()
 
 if __name__ == "__main__":
     # --------------------
@@ -163,4 +555,30 @@ if __name__ == "__main__":
     input_topic_name = os.environ["INPUT_TOPIC"]
     output_topic_name = os.environ["OUTPUT_TOPIC"]
     transformations = json.loads(os.environ.get("TRANSFORMATIONS", "[]"))
+    latency_report_interval = float(os.environ.get("LATENCY_REPORT_INTERVAL", "5"))
+    error_policy = os.environ.get("ERROR_POLICY", ERROR_POLICY_FAIL)
+    dead_letter_topic_name = os.environ.get("DEAD_LETTER_TOPIC", f"{output_topic_name}-dlq")
+    start_position = os.environ.get("START_POSITION", START_COMMITTED)
+    start_timestamp = int(os.environ["START_TIMESTAMP"]) if "START_TIMESTAMP" in os.environ else None
+    mode = os.environ.get("MODE", MODE_STREAM)
+    end_timestamp = int(os.environ["END_TIMESTAMP"]) if "END_TIMESTAMP" in os.environ else None
+    max_messages = int(os.environ["MAX_MESSAGES"]) if "MAX_MESSAGES" in os.environ else None
+    idle_timeout = float(os.environ["IDLE_TIMEOUT"]) if "IDLE_TIMEOUT" in os.environ else None
+    execution = os.environ.get("EXECUTION", EXECUTION_INLINE)
+    pool_workers = int(os.environ.get("POOL_WORKERS") or allotted_cpus())
+    max_in_flight = int(os.environ.get("MAX_IN_FLIGHT", "64"))
+    cache_max_entries = int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))
+    cache_ttl = float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None
+    # This segment, followed by the segments chained into this worker (if any)
+    stages = [
+        {
+            "segment_index": SEGMENT_INDEX,
+            "input_topic": input_topic_name,
+            "output_topic": output_topic_name,
+            "transformations": transformations,
+            "error_policy": error_policy,
+            "dead_letter_topic": dead_letter_topic_name,
+        },
+        *json.loads(os.environ.get("CHAINED_STAGES", "[]")),
+    ]
     main()
\ No newline at end of file